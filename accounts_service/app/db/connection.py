@@ -4,7 +4,9 @@ from pydantic_core import MultiHostUrl
 from dotenv import load_dotenv
 import os
 
+from app.db.pool import engine_options
 from app.models.account_models import Account, AccountCreate
+from app.models.idempotency_models import IdempotencyKey
 from app.services.account_service import create_account
 load_dotenv()
 
@@ -25,7 +27,7 @@ DATABASE_URL = MultiHostUrl.build(
     path=DATABASE_NAME,
 )
 
-engine = create_engine(str(DATABASE_URL))
+engine = create_engine(str(DATABASE_URL), **engine_options())
 
 
 def init_db(session: Session) -> None:
@@ -0,0 +1,96 @@
+from typing import Any
+from dotenv import load_dotenv
+from sqlalchemy import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import Pool, QueuePool
+import threading
+import time
+import os
+
+load_dotenv()
+
+DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", "5"))
+DATABASE_MAX_OVERFLOW = int(os.getenv("DATABASE_MAX_OVERFLOW", "10"))
+DATABASE_POOL_TIMEOUT = float(os.getenv("DATABASE_POOL_TIMEOUT", "30"))
+DATABASE_POOL_RECYCLE = int(os.getenv("DATABASE_POOL_RECYCLE", "1800"))
+DATABASE_POOL_PRE_PING = os.getenv(
+    "DATABASE_POOL_PRE_PING", "true").lower() == "true"
+DATABASE_POOL_PREFILL = os.getenv(
+    "DATABASE_POOL_PREFILL", "false").lower() == "true"
+# PgBouncer in transaction mode cannot route server-side prepared
+# statements back to the backend that prepared them.
+DATABASE_PGBOUNCER = os.getenv("DATABASE_PGBOUNCER", "false").lower() == "true"
+
+
+class WaitTimingMixin:
+    """
+    Records how long callers wait to check a connection out of the pool.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._wait_lock = threading.Lock()
+        self.wait_count = 0
+        self.wait_total_seconds = 0.0
+        self.wait_max_seconds = 0.0
+        self.wait_timeouts = 0
+
+    def _do_get(self) -> Any:
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self._record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        self._record_wait(time.perf_counter() - started)
+        return connection
+
+    def _record_wait(self, seconds: float, timed_out: bool = False) -> None:
+        with self._wait_lock:
+            self.wait_count += 1
+            self.wait_total_seconds += seconds
+            self.wait_max_seconds = max(self.wait_max_seconds, seconds)
+            if timed_out:
+                self.wait_timeouts += 1
+
+
+class InstrumentedQueuePool(WaitTimingMixin, QueuePool):
+    pass
+
+
+def engine_options() -> dict[str, Any]:
+    options = {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": DATABASE_POOL_SIZE,
+        "max_overflow": DATABASE_MAX_OVERFLOW,
+        "pool_timeout": DATABASE_POOL_TIMEOUT,
+        "pool_recycle": DATABASE_POOL_RECYCLE,
+        "pool_pre_ping": DATABASE_POOL_PRE_PING,
+    }
+    if DATABASE_PGBOUNCER:
+        options["connect_args"] = {"prepare_threshold": None}
+    return options
+
+
+def prefill_pool(engine: Engine) -> None:
+    connections = [engine.connect() for _ in range(DATABASE_POOL_SIZE)]
+    for connection in connections:
+        connection.close()
+
+
+def pool_stats(pool: Pool) -> dict[str, Any]:
+    wait_count = getattr(pool, "wait_count", 0)
+    wait_total_seconds = getattr(pool, "wait_total_seconds", 0.0)
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": DATABASE_MAX_OVERFLOW,
+        "wait_count": wait_count,
+        "wait_avg_ms": (
+            wait_total_seconds / wait_count * 1000 if wait_count else 0.0
+        ),
+        "wait_max_ms": getattr(pool, "wait_max_seconds", 0.0) * 1000,
+        "wait_timeouts": getattr(pool, "wait_timeouts", 0),
+    }
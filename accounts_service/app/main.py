@@ -1,8 +1,22 @@
 from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from app.db.connection import engine
+from app.db.pool import DATABASE_POOL_PREFILL, prefill_pool
+from app.routers import health
 from app.routers.v1 import auth, accounts
+from app.services.idempotency_service import IdempotencyMiddleware
+
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if DATABASE_POOL_PREFILL:
+        prefill_pool(engine)
+    yield
 
-app = FastAPI(title="Accounts API")
+app = FastAPI(title="Accounts API", lifespan=lifespan)
+app.add_middleware(IdempotencyMiddleware)
 
+app.include_router(health.router, prefix="")
 app.include_router(auth.router, prefix="/api/v1")
 app.include_router(accounts.router, prefix="/api/v1")
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Depends
+
+from app.db.connection import engine
+from app.db.pool import pool_stats
+from app.dependencies.dependencies import admin_required
+
+router = APIRouter(tags=["health"])
+
+
+@router.get("/health/db-pool", dependencies=[Depends(admin_required)])
+def get_db_pool_stats():
+    return {"sync": pool_stats(engine.pool)}
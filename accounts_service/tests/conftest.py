@@ -1,18 +1,23 @@
 from collections.abc import Generator
 
 import pytest
+from sqlalchemy.pool import StaticPool
 from sqlmodel import Session, SQLModel, create_engine
 from fastapi.testclient import TestClient
 
 from app.main import app
 from app.dependencies.dependencies import get_db
+from app.services.idempotency_service import idempotency_keys
 from app.services.account_service import create_account, get_account_by_email
 from app.models.account_models import AccountCreate, Account
 from app.utils.security import create_access_token
 
 engine_test = create_engine(
     "sqlite:///:memory:",
-    connect_args={"check_same_thread": False}
+    connect_args={"check_same_thread": False},
+    # One connection for every thread, so sessions opened outside the
+    # request see the same in-memory database.
+    poolclass=StaticPool
 )
 
 
@@ -40,6 +45,11 @@ def test_account(create_test_db) -> Account:
         return account
 
 
+@pytest.fixture(scope="session", autouse=True)
+def idempotency_keys_test_db(create_test_db) -> None:
+    idempotency_keys.session_factory = lambda: Session(engine_test)
+
+
 @pytest.fixture(scope="session", autouse=True)
 def db() -> Generator[Session, None, None]:
     with Session(engine_test) as session:
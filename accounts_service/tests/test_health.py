@@ -0,0 +1,32 @@
+from fastapi.testclient import TestClient
+
+
+def test_db_pool_stats(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str]
+) -> None:
+    response = client.get(
+        "/health/db-pool", headers=admin_account_token_headers)
+    assert response.status_code == 200
+    assert {
+        "size",
+        "checked_out",
+        "idle",
+        "overflow",
+        "max_overflow",
+        "wait_count",
+        "wait_avg_ms",
+        "wait_max_ms",
+        "wait_timeouts",
+    } <= set(response.json()["sync"])
+
+
+def test_db_pool_stats_requires_admin(
+    client: TestClient,
+    normal_account_token_headers: dict[str, str]
+) -> None:
+    response = client.get("/health/db-pool")
+    assert response.status_code == 403
+    response = client.get(
+        "/health/db-pool", headers=normal_account_token_headers)
+    assert response.status_code == 403
@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta, timezone
+import hashlib
+from fastapi.testclient import TestClient
+from sqlmodel import Session, func, select
+
+from app.models.idempotency_models import IdempotencyKey
+from app.models.account_models import Account
+
+
+def test_create_account_retry_is_replayed(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+    db: Session
+) -> None:
+    headers = {**admin_account_token_headers, "Idempotency-Key": "create-1"}
+    data = {"email": "idempotent@example.com", "password": "password"}
+    first = client.post("/api/v1/accounts", headers=headers, json=data)
+    assert first.status_code == 200
+
+    retry = client.post("/api/v1/accounts", headers=headers, json=data)
+    assert retry.status_code == 200
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.json() == first.json()
+    assert db.exec(select(func.count()).select_from(Account).where(
+        Account.email == "idempotent@example.com")).one() == 1
+
+
+def test_idempotency_key_reused_for_another_request(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+) -> None:
+    headers = {**admin_account_token_headers, "Idempotency-Key": "create-2"}
+    data = {"email": "idempotent_other@example.com", "password": "password"}
+    response = client.post("/api/v1/accounts", headers=headers, json=data)
+    assert response.status_code == 200
+
+    response = client.post(
+        "/api/v1/accounts",
+        headers=headers,
+        json={**data, "email": "idempotent_changed@example.com"}
+    )
+    assert response.status_code == 422
+
+
+def test_idempotency_key_reused_with_another_if_match(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+) -> None:
+    headers = {**admin_account_token_headers, "Idempotency-Key": "create-3"}
+    data = {"email": "idempotent_if_match@example.com", "password": "password"}
+    response = client.post(
+        "/api/v1/accounts", headers={**headers, "If-Match": '"1"'}, json=data)
+    assert response.status_code == 200
+
+    response = client.post(
+        "/api/v1/accounts", headers={**headers, "If-Match": '"2"'}, json=data)
+    assert response.status_code == 422
+
+
+def fingerprint(path: str, body: bytes) -> str:
+    # Method, path, If-Match and query string, one per line.
+    digest = hashlib.sha256(b"POST\n" + path.encode() + b"\n\n\n")
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def reserve_abandoned_key(
+    db: Session,
+    key: str,
+    body: bytes,
+    locked_for: timedelta
+) -> None:
+    """A reservation left behind by a request that never finished."""
+    now = datetime.now(timezone.utc)
+    db.add(IdempotencyKey(
+        principal="admin_account@example.com",
+        key=key,
+        fingerprint=fingerprint("/api/v1/accounts", body),
+        lease="abandoned",
+        locked_until=now + locked_for,
+        expires_at=now + timedelta(days=1)
+    ))
+    db.commit()
+
+
+def test_abandoned_idempotency_key_is_taken_over(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+    db: Session
+) -> None:
+    body = b'{"email": "idempotent_taken_over@example.com", "password": "password"}'
+    reserve_abandoned_key(db, "abandoned", body, timedelta(seconds=-1))
+    headers = {
+        **admin_account_token_headers,
+        "Idempotency-Key": "abandoned",
+        "Content-Type": "application/json"
+    }
+    response = client.post("/api/v1/accounts", headers=headers, content=body)
+    assert response.status_code == 200
+    assert "idempotent-replayed" not in response.headers
+
+    retry = client.post("/api/v1/accounts", headers=headers, content=body)
+    assert retry.headers["idempotent-replayed"] == "true"
+
+
+def test_locked_idempotency_key_is_in_progress(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+    db: Session
+) -> None:
+    body = b'{"email": "idempotent_locked@example.com", "password": "password"}'
+    reserve_abandoned_key(db, "locked", body, timedelta(minutes=1))
+    headers = {
+        **admin_account_token_headers,
+        "Idempotency-Key": "locked",
+        "Content-Type": "application/json"
+    }
+    response = client.post("/api/v1/accounts", headers=headers, content=body)
+    assert response.status_code == 409
@@ -1,18 +1,28 @@
 from fastapi import FastAPI
 import threading
+import os
 from contextlib import asynccontextmanager
 
 from app.routers import health
-from app.services.notification_services import consume
+from app.services.notification_services import notification_consumer
+
+# Turn off when messages are consumed by the standalone worker,
+# python -m app.worker, instead of this process.
+CONSUME_IN_API = os.getenv("CONSUME_IN_API", "true").lower() == "true"
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    thread = threading.Thread(target=consume, daemon=True)
+    if not CONSUME_IN_API:
+        yield
+        return
+    thread = threading.Thread(target=notification_consumer.run, daemon=True)
     thread.start()
     print("Worker thread started")
     yield
     print("App shutting down")
+    notification_consumer.stop()
+    thread.join(timeout=30)
 
 app = FastAPI(
     title="Notification service",
@@ -1,9 +1,14 @@
 from typing import Any
 from datetime import datetime
 from pydantic import BaseModel
+import uuid
 
 
 class AuditEvent(BaseModel):
+    # Events from before schema version 2 have no id and list every field
+    # in changes, not only the changed ones.
+    event_id: uuid.UUID | None = None
+    schema_version: int = 1
     user: str
     action: str
     timestamp: datetime
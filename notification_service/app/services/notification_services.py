@@ -1,7 +1,14 @@
-from jinja2 import Environment, FileSystemLoader
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 from dotenv import load_dotenv
+from pika.exceptions import AMQPError
+from pathlib import Path
 from typing import Dict
+import threading
 import requests
+import msgpack
 import resend
 import pika
 import os
@@ -15,48 +22,348 @@ RABBITMQ_HOST = os.getenv("RABBITMQ_HOST")
 RABBITMQ_PORT = os.getenv("RABBITMQ_PORT")
 RABBITMQ_USER = os.getenv("RABBITMQ_USER")
 RABBITMQ_PASS = os.getenv("RABBITMQ_PASS")
-RABBITMQ_QUEUE = os.getenv("RABBITMQ_QUEUE")
+RABBITMQ_EXCHANGE = os.getenv("RABBITMQ_EXCHANGE", "audit_events")
+RABBITMQ_QUEUE = os.getenv("RABBITMQ_QUEUE", "notification_queue")
+# Comma separated topic patterns this service is notified about.
+RABBITMQ_BINDING_KEYS = [
+    key.strip()
+    for key in os.getenv("RABBITMQ_BINDING_KEYS", "product.#").split(",")
+    if key.strip()
+]
+RABBITMQ_PREFETCH_COUNT = int(os.getenv("RABBITMQ_PREFETCH_COUNT", "10"))
+# A message that fails is dead-lettered into the retry queue and comes back
+# after the delay, up to RABBITMQ_MAX_ATTEMPTS deliveries in all. Then it is
+# parked in the dead letter queue, where it stays until someone looks at it.
+RABBITMQ_MAX_ATTEMPTS = int(os.getenv("RABBITMQ_MAX_ATTEMPTS", "5"))
+RABBITMQ_RETRY_DELAY_SECONDS = float(
+    os.getenv("RABBITMQ_RETRY_DELAY_SECONDS", "60"))
+RABBITMQ_RETRY_QUEUE = f"{RABBITMQ_QUEUE}.retry"
+RABBITMQ_DEAD_LETTER_QUEUE = f"{RABBITMQ_QUEUE}.dead"
+RABBITMQ_RECONNECT_DELAY_SECONDS = float(
+    os.getenv("RABBITMQ_RECONNECT_DELAY_SECONDS", "5"))
+# Messages handled at the same time. Keep RABBITMQ_PREFETCH_COUNT at least
+# as high, or workers sit idle waiting for deliveries.
+NOTIFICATION_WORKERS = int(os.getenv("NOTIFICATION_WORKERS", "4"))
 RESEND_API_KEY = os.getenv("RESEND_API_KEY")
 ACCOUNTS_HOST = os.getenv("ACCOUNTS_HOST")
 ACCOUNTS_PORT = os.getenv("ACCOUNTS_PORT")
 ACCOUNTS_PATH = os.getenv("ACCOUNTS_PATH")
 ACCOUNTS_API_URL = f"http://{ACCOUNTS_HOST}:{ACCOUNTS_PORT}/{ACCOUNTS_PATH}?role=admin"
 
+TEMPLATES_DIR = Path(__file__).resolve().parent.parent / "templates"
+# Re-read templates changed on disk, for development only.
+TEMPLATES_AUTO_RELOAD = os.getenv("TEMPLATES_AUTO_RELOAD", "false").lower() == "true"
+# Compiled templates are cached here when set, which saves compiling them
+# again in every new worker process.
+TEMPLATES_BYTECODE_CACHE_DIR = os.getenv("TEMPLATES_BYTECODE_CACHE_DIR")
+ACTIVITY_TEMPLATE = "activity_notification.html"
+
+CONTENT_TYPE_JSON = "application/json"
+CONTENT_TYPE_MSGPACK = "application/msgpack"
+
 resend.api_key = RESEND_API_KEY
 
 
-def consume():
+def create_template_environment(
+    *,
+    auto_reload: bool = TEMPLATES_AUTO_RELOAD,
+    bytecode_cache_dir: str | None = TEMPLATES_BYTECODE_CACHE_DIR
+) -> Environment:
+    """
+    Templates are compiled on first use and kept in the environment's
+    cache. Without auto_reload, later lookups never touch the disk.
+    """
+    bytecode_cache = None
+    if bytecode_cache_dir:
+        os.makedirs(bytecode_cache_dir, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(bytecode_cache_dir)
+    return Environment(
+        loader=FileSystemLoader(TEMPLATES_DIR),
+        auto_reload=auto_reload,
+        bytecode_cache=bytecode_cache
+    )
+
+
+templates = create_template_environment()
+# Compile at startup rather than on the first message.
+templates.get_template(ACTIVITY_TEMPLATE)
+
+
+def decode_event(body: bytes, content_type: str | None) -> AuditEvent:
+    """
+    Decode a message by its AMQP content_type. Messages without one are
+    JSON, as sent by publishers that predate msgpack support.
+    """
+    if content_type in (None, CONTENT_TYPE_JSON):
+        return AuditEvent.model_validate_json(body)
+    if content_type == CONTENT_TYPE_MSGPACK:
+        return AuditEvent.model_validate(msgpack.unpackb(body))
+    raise ValueError(f"Unsupported content type {content_type}")
+
+
+def handle_message(body: bytes, content_type: str | None) -> None:
+    event = decode_event(body, content_type)
+    print(f"[x] Received {event.action} on {event.model} {event.event_id}")
+    send_mail(event)
+
+
+def connect() -> pika.BlockingConnection:
     rabbitmq_url = f"amqp://{RABBITMQ_USER}:{RABBITMQ_PASS}@{RABBITMQ_HOST}:{RABBITMQ_PORT}/"
-    connection_params = pika.URLParameters(rabbitmq_url)
-    connection = pika.BlockingConnection(connection_params)
+    return pika.BlockingConnection(pika.URLParameters(rabbitmq_url))
+
+
+class NotificationConsumer:
+    """
+    Consumes audit events and hands each one to a pool of worker threads,
+    so deliveries wait on the accounts service and Resend in parallel.
+
+    pika connections are not thread safe: workers never touch the channel,
+    they schedule the ack or nack back onto the connection's I/O thread
+    with add_callback_threadsafe. A message is acked only once handled,
+    anything unacked when the process dies is redelivered by the broker.
+    Failed messages are retried later through the retry queue, then moved
+    to the dead letter queue after max_attempts deliveries.
+    """
+
+    def __init__(
+        self,
+        *,
+        connection_factory: Callable[[], pika.BlockingConnection],
+        handler: Callable[[bytes, str | None], None],
+        workers: int,
+        prefetch_count: int,
+        reconnect_delay: float,
+        max_attempts: int
+    ) -> None:
+        self.connection_factory = connection_factory
+        self.handler = handler
+        self.workers = workers
+        self.prefetch_count = prefetch_count
+        self.reconnect_delay = reconnect_delay
+        self.max_attempts = max_attempts
+        self._stopping = threading.Event()
+        self._connection: pika.BlockingConnection | None = None
+        self._channel = None
+        # Only written on the I/O thread.
+        self._in_flight = 0
+        self.handled = 0
+        self.failed = 0
+
+    def run(self) -> None:
+        """Consume until stop() is called, reconnecting on broker errors."""
+        self._stopping.clear()
+        while not self._stopping.is_set():
+            try:
+                connection = self.connection_factory()
+            except AMQPError as exc:
+                print(f"[!] Could not connect to the broker: {exc}")
+                self._stopping.wait(self.reconnect_delay)
+                continue
+            try:
+                self._consume(connection)
+            except AMQPError as exc:
+                print(f"[!] Lost the broker connection: {exc}")
+                self._stopping.wait(self.reconnect_delay)
+            finally:
+                self._connection = self._channel = None
+                if connection.is_open:
+                    connection.close()
+
+    @property
+    def is_consuming(self) -> bool:
+        """Whether a channel to the broker is open and consuming."""
+        channel = self._channel
+        return channel is not None and channel.is_open
+
+    def stop(self) -> None:
+        """
+        Stop taking deliveries. run() returns once the messages already
+        being handled are acked.
+        """
+        self._stopping.set()
+        connection = self._connection
+        if connection is None:
+            return
+        try:
+            connection.add_callback_threadsafe(self._stop_consuming)
+        except AMQPError:
+            pass
+
+    def _consume(self, connection: pika.BlockingConnection) -> None:
+        # Settlements for a previous connection never arrive.
+        self._in_flight = 0
+        channel = connection.channel()
+        declare_queue(channel, prefetch_count=self.prefetch_count)
+        # Moving a message to the dead letter queue is only acked once the
+        # broker confirmed it has the copy.
+        channel.confirm_delivery()
+        with ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix="notification-worker"
+        ) as executor:
+            channel.basic_consume(
+                queue=RABBITMQ_QUEUE,
+                on_message_callback=partial(
+                    self._on_message, connection, executor)
+            )
+            self._connection, self._channel = connection, channel
+            if self._stopping.is_set():
+                return
+            channel.start_consuming()
+            # start_consuming returns once stop() cancelled the consumer,
+            # which requeues deliveries no worker picked up yet.
+            while self._in_flight:
+                connection.process_data_events(time_limit=1)
+
+    def _stop_consuming(self) -> None:
+        if self._channel is not None and self._channel.is_open:
+            self._channel.stop_consuming()
+
+    def _on_message(
+        self,
+        connection: pika.BlockingConnection,
+        executor: ThreadPoolExecutor,
+        channel,
+        method,
+        properties,
+        body: bytes
+    ) -> None:
+        self._in_flight += 1
+        future = executor.submit(self.handler, body, properties.content_type)
+        future.add_done_callback(partial(
+            self._on_handled, connection, channel, method, properties, body))
+
+    def _on_handled(
+        self,
+        connection: pika.BlockingConnection,
+        channel,
+        method,
+        properties,
+        body: bytes,
+        future: Future
+    ) -> None:
+        # Runs on a worker thread.
+        try:
+            connection.add_callback_threadsafe(partial(
+                self._settle, channel, method, properties, body, future))
+        except AMQPError:
+            # The connection is gone, the broker redelivers the message.
+            pass
+
+    def _settle(
+        self,
+        channel,
+        method,
+        properties,
+        body: bytes,
+        future: Future
+    ) -> None:
+        self._in_flight -= 1
+        if not channel.is_open:
+            return
+        exc = future.exception()
+        if exc is None:
+            self.handled += 1
+            channel.basic_ack(delivery_tag=method.delivery_tag)
+            return
+        self.failed += 1
+        attempts = delivery_attempts(properties)
+        if attempts < self.max_attempts:
+            print(
+                f"[!] Could not handle {method.routing_key} "
+                f"(attempt {attempts}), retrying later: {exc}"
+            )
+            # Dead-lettered into the retry queue.
+            channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            return
+        print(
+            f"[!] Could not handle {method.routing_key} after {attempts} "
+            f"attempts, moving it to {RABBITMQ_DEAD_LETTER_QUEUE}: {exc}"
+        )
+        # Raises if the broker does not take the copy, the connection is
+        # then reopened and the message redelivered.
+        channel.basic_publish(
+            exchange="",
+            routing_key=RABBITMQ_DEAD_LETTER_QUEUE,
+            body=body,
+            properties=properties,
+            mandatory=True
+        )
+        channel.basic_ack(delivery_tag=method.delivery_tag)
 
-    channel = connection.channel()
-    channel.queue_declare(queue=RABBITMQ_QUEUE, durable=True)
 
-    def callback(ch, method, properties, body):
-        print(f"[x] Received {body.decode()}")
-        send_mail(AuditEvent.parse_raw(body))
+def delivery_attempts(properties) -> int:
+    """
+    Deliveries of a message so far, this one included, counted from the
+    x-death header the broker updates each time the message is rejected
+    from the consumer queue. Unlike the redelivered flag, this is not set
+    by a crashed worker's redelivery and survives the retry queue.
+    """
+    for death in (properties.headers or {}).get("x-death", []):
+        if death.get("queue") == RABBITMQ_QUEUE and death.get(
+                "reason") == "rejected":
+            return int(death.get("count", 0)) + 1
+    return 1
 
-    channel.basic_consume(
+
+notification_consumer = NotificationConsumer(
+    connection_factory=connect,
+    handler=handle_message,
+    workers=NOTIFICATION_WORKERS,
+    prefetch_count=RABBITMQ_PREFETCH_COUNT,
+    reconnect_delay=RABBITMQ_RECONNECT_DELAY_SECONDS,
+    max_attempts=RABBITMQ_MAX_ATTEMPTS
+)
+
+
+def declare_queue(
+    channel,
+    *,
+    prefetch_count: int = RABBITMQ_PREFETCH_COUNT
+) -> None:
+    """
+    Declare the audit exchange and this service's own queue, bound to the
+    routing keys it handles. At most prefetch_count messages are delivered
+    before being acknowledged.
+
+    Messages rejected from the queue are dead-lettered through the default
+    exchange into the retry queue. When their TTL there expires they are
+    dead-lettered back into the queue.
+    """
+    channel.exchange_declare(
+        exchange=RABBITMQ_EXCHANGE,
+        exchange_type="topic",
+        durable=True
+    )
+    channel.queue_declare(
+        queue=RABBITMQ_RETRY_QUEUE,
+        durable=True,
+        arguments={
+            "x-message-ttl": int(RABBITMQ_RETRY_DELAY_SECONDS * 1000),
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": RABBITMQ_QUEUE,
+        }
+    )
+    channel.queue_declare(queue=RABBITMQ_DEAD_LETTER_QUEUE, durable=True)
+    channel.queue_declare(
         queue=RABBITMQ_QUEUE,
-        on_message_callback=callback,
-        auto_ack=True
+        durable=True,
+        arguments={
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": RABBITMQ_RETRY_QUEUE,
+        }
     )
-    channel.start_consuming()
+    for binding_key in RABBITMQ_BINDING_KEYS:
+        channel.queue_bind(
+            queue=RABBITMQ_QUEUE,
+            exchange=RABBITMQ_EXCHANGE,
+            routing_key=binding_key
+        )
+    channel.basic_qos(prefetch_count=prefetch_count)
 
 
 def send_mail(event: AuditEvent) -> Dict:
-    env = Environment(loader=FileSystemLoader('app/templates'))
-    template = env.get_template('activity_notification.html')
-
-    html_content = template.render(
-        user=event.user,
-        action=event.action,
-        model=event.model,
-        record_id=event.record_id,
-        changes=event.changes or {},
-        timestamp=event.timestamp
-    )
+    html_content = render_notification(event)
     admin_emails = get_admin_emails()
     params: resend.Emails.SendParams = {
         "from": "onboarding@resend.dev",
@@ -70,6 +377,21 @@ def send_mail(event: AuditEvent) -> Dict:
     return email
 
 
+def render_notification(
+    event: AuditEvent,
+    environment: Environment = templates
+) -> str:
+    template = environment.get_template(ACTIVITY_TEMPLATE)
+    return template.render(
+        user=event.user,
+        action=event.action,
+        model=event.model,
+        record_id=event.record_id,
+        changes=event.changes or {},
+        timestamp=event.timestamp
+    )
+
+
 def get_admin_emails() -> list[str]:
     access_token = create_access_token(
         subject="admin_account@example.com",
@@ -0,0 +1,255 @@
+from collections.abc import Callable
+from multiprocessing.context import BaseContext
+from multiprocessing.process import BaseProcess
+from dotenv import load_dotenv
+from typing import Dict
+import multiprocessing
+import threading
+import signal
+import time
+import sys
+import os
+
+from app.services.notification_services import notification_consumer
+
+load_dotenv()
+
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", str(os.cpu_count() or 1)))
+# Dead consumer processes are noticed at this interval.
+WORKER_CHECK_INTERVAL_SECONDS = float(
+    os.getenv("WORKER_CHECK_INTERVAL_SECONDS", "1"))
+# A process that keeps exiting is restarted after a delay that doubles
+# with each exit, up to the maximum. One that ran for at least the maximum
+# delay starts over from the initial delay.
+WORKER_RESTART_DELAY_SECONDS = float(
+    os.getenv("WORKER_RESTART_DELAY_SECONDS", "1"))
+WORKER_MAX_RESTART_DELAY_SECONDS = float(
+    os.getenv("WORKER_MAX_RESTART_DELAY_SECONDS", "60"))
+WORKER_HEARTBEAT_SECONDS = float(os.getenv("WORKER_HEARTBEAT_SECONDS", "1"))
+WORKER_HEARTBEAT_TIMEOUT_SECONDS = float(
+    os.getenv("WORKER_HEARTBEAT_TIMEOUT_SECONDS", "10"))
+WORKER_SHUTDOWN_TIMEOUT_SECONDS = float(
+    os.getenv("WORKER_SHUTDOWN_TIMEOUT_SECONDS", "30"))
+
+# Per process slots in WorkerStats.
+HANDLED, FAILED, HEARTBEAT = range(3)
+
+
+class WorkerStats:
+    """
+    Counters shared between the supervisor and its worker processes. Each
+    process only writes its own slot: messages handled and failed, and the
+    wall clock time of its last heartbeat, sent while it is connected to
+    the broker.
+    """
+
+    def __init__(self, context: BaseContext, processes: int) -> None:
+        self._values = context.Array("d", processes * 3)
+
+    def update(
+        self,
+        index: int,
+        *,
+        handled: int,
+        failed: int,
+        heartbeat: bool = True
+    ) -> None:
+        with self._values.get_lock():
+            offset = index * 3
+            self._values[offset + HANDLED] = handled
+            self._values[offset + FAILED] = failed
+            if heartbeat:
+                self._values[offset + HEARTBEAT] = time.time()
+
+    def read(self, index: int) -> tuple[int, int, float]:
+        with self._values.get_lock():
+            offset = index * 3
+            handled, failed, heartbeat = self._values[offset:offset + 3]
+        return int(handled), int(failed), heartbeat
+
+    def reset(self, index: int) -> None:
+        with self._values.get_lock():
+            self._values[index * 3:index * 3 + 3] = [0.0, 0.0, 0.0]
+
+
+def run_consumer_process(index: int, stats: WorkerStats) -> None:
+    """
+    Worker process entry point. Consumes until SIGTERM, then stops taking
+    deliveries and exits once the messages in flight are acked. Exits with
+    status 1 if the consumer dies, so the supervisor starts a new process.
+    """
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    # Ctrl-C reaches the whole process group, the supervisor drains us.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    consumer = notification_consumer
+    thread = threading.Thread(target=consumer.run, name="consumer")
+    thread.start()
+    while not stopping.wait(WORKER_HEARTBEAT_SECONDS):
+        if not thread.is_alive():
+            sys.exit(1)
+        # No heartbeat while reconnecting, so health reports the outage.
+        stats.update(
+            index,
+            handled=consumer.handled,
+            failed=consumer.failed,
+            heartbeat=consumer.is_consuming
+        )
+    consumer.stop()
+    thread.join(timeout=WORKER_SHUTDOWN_TIMEOUT_SECONDS)
+    stats.update(
+        index,
+        handled=consumer.handled,
+        failed=consumer.failed,
+        heartbeat=False
+    )
+
+
+class WorkerSupervisor:
+    """
+    Runs one consumer per process, so delivery uses every core instead of
+    sharing one interpreter with the API. Processes that exit are started
+    again, with exponential backoff. On stop() every process gets SIGTERM
+    and shutdown_timeout seconds to drain before it is killed.
+    """
+
+    def __init__(
+        self,
+        *,
+        target: Callable[[int, WorkerStats], None],
+        processes: int,
+        check_interval: float,
+        restart_delay: float,
+        max_restart_delay: float,
+        heartbeat_timeout: float,
+        shutdown_timeout: float,
+        context: BaseContext | None = None
+    ) -> None:
+        self.target = target
+        self.processes = processes
+        self.check_interval = check_interval
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.heartbeat_timeout = heartbeat_timeout
+        self.shutdown_timeout = shutdown_timeout
+        # Children start from a fresh interpreter instead of a fork of
+        # the supervisor and its threads.
+        self.context = context or multiprocessing.get_context("spawn")
+        self.stats = WorkerStats(self.context, processes)
+        self._workers: list[BaseProcess | None] = [None] * processes
+        self._restarts = [0] * processes
+        # Exits in a row of processes that did not stay up.
+        self._failures = [0] * processes
+        self._started_at = [0.0] * processes
+        self._next_start_at = [0.0] * processes
+        # Counts of processes that exited, so totals survive restarts.
+        self._retired = [(0, 0)] * processes
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def run(self) -> None:
+        """Supervise worker processes until stop() is called."""
+        self._stopping.clear()
+        with self._lock:
+            for index in range(self.processes):
+                self._start(index)
+        while not self._stopping.wait(self.check_interval):
+            self._restart_exited()
+        self._shutdown()
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def health(self) -> Dict:
+        now = time.time()
+        workers = []
+        with self._lock:
+            for index, process in enumerate(self._workers):
+                handled, failed, heartbeat = self.stats.read(index)
+                retired_handled, retired_failed = self._retired[index]
+                alive = process is not None and process.is_alive()
+                workers.append({
+                    "pid": process.pid if process is not None else None,
+                    "healthy": (
+                        alive and now - heartbeat <= self.heartbeat_timeout),
+                    "restarts": self._restarts[index],
+                    "handled": retired_handled + handled,
+                    "failed": retired_failed + failed
+                })
+        healthy = sum(worker["healthy"] for worker in workers)
+        if healthy == len(workers):
+            status = "ok"
+        elif healthy:
+            status = "degraded"
+        else:
+            status = "down"
+        return {
+            "status": status,
+            "processes": len(workers),
+            "healthy": healthy,
+            "handled": sum(worker["handled"] for worker in workers),
+            "failed": sum(worker["failed"] for worker in workers),
+            "restarts": sum(self._restarts),
+            "workers": workers
+        }
+
+    def backoff(self, failures: int) -> float:
+        """Delay before restarting a process that exited failures times."""
+        return min(self.restart_delay * 2 ** failures, self.max_restart_delay)
+
+    def _start(self, index: int) -> None:
+        self._started_at[index] = time.monotonic()
+        process = self.context.Process(
+            target=self.target,
+            args=(index, self.stats),
+            name=f"notification-consumer-{index}"
+        )
+        process.start()
+        self._workers[index] = process
+
+    def _restart_exited(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for index, process in enumerate(self._workers):
+                if process is not None and process.is_alive():
+                    continue
+                if process is not None:
+                    self._retire(index, process, now)
+                if (
+                    not self._stopping.is_set()
+                    and now >= self._next_start_at[index]
+                ):
+                    self._restarts[index] += 1
+                    self._start(index)
+
+    def _retire(self, index: int, process: BaseProcess, now: float) -> None:
+        handled, failed, _ = self.stats.read(index)
+        retired_handled, retired_failed = self._retired[index]
+        self._retired[index] = (
+            retired_handled + handled, retired_failed + failed)
+        self.stats.reset(index)
+        self._workers[index] = None
+        if now - self._started_at[index] >= self.max_restart_delay:
+            self._failures[index] = 0
+        delay = self.backoff(self._failures[index])
+        self._failures[index] += 1
+        self._next_start_at[index] = now + delay
+        print(
+            f"[!] {process.name} exited with {process.exitcode}, "
+            f"restarting in {delay:g}s"
+        )
+
+    def _shutdown(self) -> None:
+        with self._lock:
+            workers = [p for p in self._workers if p is not None]
+        for process in workers:
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + self.shutdown_timeout
+        for process in workers:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                print(f"[!] {process.name} did not drain, killing it")
+                process.kill()
+                process.join()
@@ -0,0 +1,83 @@
+"""
+Standalone notification worker: python -m app.worker
+
+Runs WORKER_PROCESSES consumer processes under a supervisor, apart from
+the API. Health and metrics are served over HTTP only when
+WORKER_HEALTH_PORT is set.
+"""
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from dotenv import load_dotenv
+import threading
+import signal
+import os
+
+from app.services.worker_supervisor import (
+    WORKER_CHECK_INTERVAL_SECONDS,
+    WORKER_HEARTBEAT_TIMEOUT_SECONDS,
+    WORKER_MAX_RESTART_DELAY_SECONDS,
+    WORKER_PROCESSES,
+    WORKER_RESTART_DELAY_SECONDS,
+    WORKER_SHUTDOWN_TIMEOUT_SECONDS,
+    WorkerSupervisor,
+    run_consumer_process
+)
+
+load_dotenv()
+
+WORKER_HEALTH_HOST = os.getenv("WORKER_HEALTH_HOST", "0.0.0.0")
+WORKER_HEALTH_PORT = os.getenv("WORKER_HEALTH_PORT")
+
+
+def create_health_app(supervisor: WorkerSupervisor) -> FastAPI:
+    app = FastAPI(title="Notification worker")
+
+    @app.get("/health")
+    def health():
+        report = supervisor.health()
+        status_code = 503 if report["status"] == "down" else 200
+        return JSONResponse(report, status_code=status_code)
+
+    @app.get("/metrics")
+    def metrics():
+        report = supervisor.health()
+        return {
+            key: report[key]
+            for key in ("processes", "healthy", "handled", "failed", "restarts")
+        }
+
+    return app
+
+
+def main() -> None:
+    supervisor = WorkerSupervisor(
+        target=run_consumer_process,
+        processes=WORKER_PROCESSES,
+        check_interval=WORKER_CHECK_INTERVAL_SECONDS,
+        restart_delay=WORKER_RESTART_DELAY_SECONDS,
+        max_restart_delay=WORKER_MAX_RESTART_DELAY_SECONDS,
+        heartbeat_timeout=WORKER_HEARTBEAT_TIMEOUT_SECONDS,
+        shutdown_timeout=WORKER_SHUTDOWN_TIMEOUT_SECONDS
+    )
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda signum, frame: supervisor.stop())
+
+    server = None
+    if WORKER_HEALTH_PORT:
+        import uvicorn
+        server = uvicorn.Server(uvicorn.Config(
+            create_health_app(supervisor),
+            host=WORKER_HEALTH_HOST,
+            port=int(WORKER_HEALTH_PORT)
+        ))
+        threading.Thread(target=server.run, daemon=True).start()
+
+    print(f"Supervising {WORKER_PROCESSES} consumer processes")
+    supervisor.run()
+    if server is not None:
+        server.should_exit = True
+    print("Worker shut down")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Render benchmark for the notification template.
+
+    python -m benchmarks.render_benchmark [iterations]
+
+Compares building a new Environment for every message, which parses and
+compiles the template each time, with the shared compiled template.
+"""
+from datetime import datetime, timezone
+import timeit
+import uuid
+import sys
+
+from app.schemas.schemas import AuditEvent
+from app.services.notification_services import (
+    create_template_environment,
+    render_notification,
+    templates
+)
+
+event = AuditEvent(
+    event_id=uuid.uuid4(),
+    schema_version=2,
+    user="admin@example.com",
+    action="update",
+    timestamp=datetime.now(timezone.utc),
+    model="Product",
+    record_id="8c3ab99e-df43-4c71-9adf-25bf84d03c8d",
+    changes={
+        "price": {"old": 10.5, "new": 12.0},
+        "name": {"old": "Old name", "new": "New name"}
+    }
+)
+
+
+def report(name: str, seconds: float, iterations: int) -> None:
+    print(f"{name:<28}{seconds / iterations * 1e6:10.1f} us/message")
+
+
+def main(iterations: int) -> None:
+    uncached = timeit.timeit(
+        lambda: render_notification(
+            event, create_template_environment(bytecode_cache_dir=None)),
+        number=iterations
+    )
+    cached = timeit.timeit(
+        lambda: render_notification(event, templates), number=iterations)
+    report("environment per message", uncached, iterations)
+    report("compiled once", cached, iterations)
+    print(f"speedup {uncached / cached:.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
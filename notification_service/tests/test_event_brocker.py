@@ -12,7 +12,7 @@ RABBITMQ_HOST = os.getenv("RABBITMQ_HOST")
 RABBITMQ_PORT = os.getenv("RABBITMQ_PORT")
 RABBITMQ_USER = os.getenv("RABBITMQ_USER")
 RABBITMQ_PASS = os.getenv("RABBITMQ_PASS")
-RABBITMQ_QUEUE = os.getenv("RABBITMQ_QUEUE")
+RABBITMQ_EXCHANGE = os.getenv("RABBITMQ_EXCHANGE", "audit_events")
 
 
 event = AuditEvent(
@@ -36,8 +36,9 @@ def test_send_email():
     channel = connection.channel()
     message = event.model_dump_json()
     channel.basic_publish(
-        exchange='',
-        routing_key=RABBITMQ_QUEUE,
-        body=message
+        exchange=RABBITMQ_EXCHANGE,
+        routing_key="product.update",
+        body=message,
+        properties=pika.BasicProperties(content_type="application/json")
     )
     connection.close()
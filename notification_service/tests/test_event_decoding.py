@@ -0,0 +1,45 @@
+from datetime import datetime, timezone
+import json
+import uuid
+
+import msgpack
+import pytest
+
+from app.services.notification_services import decode_event
+
+payload = {
+    "event_id": str(uuid.uuid4()),
+    "schema_version": 2,
+    "user": "admin@example.com",
+    "action": "update",
+    "timestamp": datetime.now(timezone.utc).isoformat(),
+    "model": "Product",
+    "record_id": "8c3ab99e-df43-4c71-9adf-25bf84d03c8d",
+    "changes": {"price": {"old": 10.5, "new": 12.0}}
+}
+
+
+def test_decode_json_event() -> None:
+    event = decode_event(json.dumps(payload).encode(), "application/json")
+    assert str(event.event_id) == payload["event_id"]
+    assert event.changes == payload["changes"]
+
+
+def test_decode_msgpack_event() -> None:
+    event = decode_event(msgpack.packb(payload), "application/msgpack")
+    assert event == decode_event(json.dumps(payload).encode(), None)
+
+
+def test_decode_event_without_schema_version() -> None:
+    legacy = {
+        key: value for key, value in payload.items()
+        if key not in ("event_id", "schema_version")
+    }
+    event = decode_event(json.dumps(legacy).encode(), None)
+    assert event.schema_version == 1
+    assert event.event_id is None
+
+
+def test_decode_event_unsupported_content_type() -> None:
+    with pytest.raises(ValueError):
+        decode_event(b"<event/>", "application/xml")
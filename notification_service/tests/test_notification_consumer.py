@@ -0,0 +1,175 @@
+from types import SimpleNamespace
+import queue
+import threading
+
+from app.services.notification_services import (
+    RABBITMQ_DEAD_LETTER_QUEUE,
+    RABBITMQ_QUEUE,
+    NotificationConsumer
+)
+
+
+class FakeConnection:
+    """Runs threadsafe callbacks when the I/O loop processes events."""
+
+    def __init__(self, deliveries: list[bytes], headers: dict | None = None):
+        self.callbacks: queue.Queue = queue.Queue()
+        self.is_open = True
+        self._channel = FakeChannel(self, deliveries, headers)
+
+    def channel(self) -> "FakeChannel":
+        return self._channel
+
+    def add_callback_threadsafe(self, callback) -> None:
+        self.callbacks.put(callback)
+
+    def process_data_events(self, time_limit: float = 0) -> None:
+        try:
+            self.callbacks.get(timeout=time_limit)()
+        except queue.Empty:
+            pass
+
+    def close(self) -> None:
+        self.is_open = False
+
+
+class FakeChannel:
+    def __init__(self, connection, deliveries, headers):
+        self.connection = connection
+        self.deliveries = deliveries
+        self.headers = headers
+        self.is_open = True
+        self.consuming = False
+        self.io_thread: threading.Thread | None = None
+        self.acks: list[int] = []
+        self.nacks: list[tuple[int, bool]] = []
+        self.published: list[tuple[str, bytes]] = []
+
+    def exchange_declare(self, **kwargs) -> None:
+        pass
+
+    def queue_declare(self, **kwargs) -> None:
+        pass
+
+    def queue_bind(self, **kwargs) -> None:
+        pass
+
+    def basic_qos(self, **kwargs) -> None:
+        pass
+
+    def confirm_delivery(self) -> None:
+        pass
+
+    def basic_consume(self, queue, on_message_callback) -> None:
+        self.on_message = on_message_callback
+
+    def start_consuming(self) -> None:
+        self.consuming = True
+        self.io_thread = threading.current_thread()
+        for tag, body in enumerate(self.deliveries, start=1):
+            method = SimpleNamespace(
+                delivery_tag=tag,
+                redelivered=False,
+                routing_key="product.update"
+            )
+            properties = SimpleNamespace(
+                content_type="application/json", headers=self.headers)
+            self.on_message(self, method, properties, body)
+        while self.consuming and len(self.acks) + len(self.nacks) < len(
+            self.deliveries
+        ):
+            self.connection.process_data_events(time_limit=0.05)
+
+    def stop_consuming(self) -> None:
+        self.consuming = False
+
+    def basic_ack(self, delivery_tag: int) -> None:
+        assert threading.current_thread() is self.io_thread
+        self.acks.append(delivery_tag)
+
+    def basic_nack(self, delivery_tag: int, requeue: bool) -> None:
+        assert threading.current_thread() is self.io_thread
+        self.nacks.append((delivery_tag, requeue))
+
+    def basic_publish(
+        self,
+        exchange: str,
+        routing_key: str,
+        body: bytes,
+        properties,
+        mandatory: bool
+    ) -> None:
+        assert threading.current_thread() is self.io_thread
+        assert exchange == ""
+        self.published.append((routing_key, body))
+
+
+def make_consumer(handler, workers: int = 2) -> NotificationConsumer:
+    return NotificationConsumer(
+        connection_factory=lambda: None,
+        handler=handler,
+        workers=workers,
+        prefetch_count=workers,
+        reconnect_delay=0,
+        max_attempts=3
+    )
+
+
+def test_messages_are_handled_concurrently() -> None:
+    # Both handlers must be running at once to get past the barrier.
+    barrier = threading.Barrier(2, timeout=5)
+    consumer = make_consumer(lambda body, content_type: barrier.wait())
+    connection = FakeConnection([b"first", b"second"])
+
+    consumer._consume(connection)
+
+    assert sorted(connection.channel().acks) == [1, 2]
+    assert connection.channel().nacks == []
+
+
+def rejected(count: int) -> dict:
+    """Headers of a message the broker dead-lettered count times."""
+    return {"x-death": [
+        {"queue": f"{RABBITMQ_QUEUE}.retry", "reason": "expired",
+         "count": count},
+        {"queue": RABBITMQ_QUEUE, "reason": "rejected", "count": count},
+    ]}
+
+
+def test_failed_message_is_dead_lettered() -> None:
+    def handler(body: bytes, content_type: str | None) -> None:
+        raise ValueError(body)
+
+    # Dead-lettered into the retry queue until the last attempt.
+    for headers in (None, rejected(1)):
+        connection = FakeConnection([b"broken"], headers)
+        make_consumer(handler)._consume(connection)
+        assert connection.channel().nacks == [(1, False)]
+        assert connection.channel().published == []
+
+    connection = FakeConnection([b"broken"], rejected(2))
+    make_consumer(handler)._consume(connection)
+    channel = connection.channel()
+    assert channel.published == [(RABBITMQ_DEAD_LETTER_QUEUE, b"broken")]
+    assert channel.acks == [1]
+    assert channel.nacks == []
+
+
+def test_stop_acks_messages_in_flight() -> None:
+    release = threading.Event()
+    handled: list[bytes] = []
+
+    def handler(body: bytes, content_type: str | None) -> None:
+        if body == b"slow":
+            release.wait(timeout=5)
+        else:
+            consumer.stop()
+            release.set()
+        handled.append(body)
+
+    consumer = make_consumer(handler)
+    connection = FakeConnection([b"slow", b"stop"])
+    consumer._consume(connection)
+
+    assert sorted(handled) == [b"slow", b"stop"]
+    assert sorted(connection.channel().acks) == [1, 2]
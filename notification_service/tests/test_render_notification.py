@@ -0,0 +1,36 @@
+from datetime import datetime, timezone
+
+from app.schemas.schemas import AuditEvent
+from app.services.notification_services import (
+    ACTIVITY_TEMPLATE,
+    create_template_environment,
+    render_notification,
+    templates
+)
+
+event = AuditEvent(
+    user="admin@example.com",
+    action="update",
+    timestamp=datetime.now(timezone.utc),
+    model="Product",
+    record_id="8c3ab99e-df43-4c71-9adf-25bf84d03c8d",
+    changes={"price": {"old": 10.5, "new": 12.0}}
+)
+
+
+def test_template_is_compiled_once() -> None:
+    assert not templates.auto_reload
+    assert templates.get_template(ACTIVITY_TEMPLATE) is templates.get_template(
+        ACTIVITY_TEMPLATE)
+
+
+def test_render_notification() -> None:
+    html = render_notification(event)
+    assert "admin@example.com" in html
+    assert "Product" in html
+
+
+def test_render_with_bytecode_cache(tmp_path) -> None:
+    environment = create_template_environment(bytecode_cache_dir=str(tmp_path))
+    assert render_notification(event, environment) == render_notification(event)
+    assert list(tmp_path.iterdir())
@@ -0,0 +1,118 @@
+import os
+import signal
+import sys
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app.services.worker_supervisor import WorkerStats, WorkerSupervisor
+from app.worker import create_health_app
+
+
+def crashing_worker(index: int, stats: WorkerStats) -> None:
+    stats.update(index, handled=1, failed=0)
+    sys.exit(1)
+
+
+def draining_worker(index: int, stats: WorkerStats) -> None:
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    stats.update(index, handled=0, failed=0)
+    stopping.wait()
+    # Pretend the in-flight message was acked while draining.
+    stats.update(index, handled=1, failed=0)
+
+
+def disconnected_worker(index: int, stats: WorkerStats) -> None:
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    while not stopping.wait(0.05):
+        stats.update(index, handled=0, failed=0, heartbeat=False)
+
+
+def make_supervisor(target, processes: int = 2) -> WorkerSupervisor:
+    return WorkerSupervisor(
+        target=target,
+        processes=processes,
+        check_interval=0.05,
+        restart_delay=0.05,
+        max_restart_delay=1,
+        heartbeat_timeout=10,
+        shutdown_timeout=10
+    )
+
+
+def wait_for(condition, timeout: float = 20) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def test_exited_workers_are_restarted() -> None:
+    supervisor = make_supervisor(crashing_worker, processes=1)
+    thread = threading.Thread(target=supervisor.run)
+    thread.start()
+    try:
+        wait_for(lambda: supervisor.health()["restarts"] >= 2)
+    finally:
+        supervisor.stop()
+        thread.join()
+    assert supervisor.health()["handled"] >= 2
+
+
+def test_restart_delay_backs_off() -> None:
+    supervisor = make_supervisor(crashing_worker)
+    assert [supervisor.backoff(failures) for failures in range(6)] == [
+        0.05, 0.1, 0.2, 0.4, 0.8, 1]
+
+
+def test_disconnected_workers_are_unhealthy() -> None:
+    supervisor = make_supervisor(disconnected_worker, processes=1)
+    thread = threading.Thread(target=supervisor.run)
+    thread.start()
+    try:
+        wait_for(lambda: supervisor.health()["workers"][0]["pid"] is not None)
+        time.sleep(0.5)
+        report = supervisor.health()
+    finally:
+        supervisor.stop()
+        thread.join()
+    assert report["status"] == "down"
+    assert report["restarts"] == 0
+
+
+def test_stop_lets_workers_drain() -> None:
+    supervisor = make_supervisor(draining_worker)
+    thread = threading.Thread(target=supervisor.run)
+    thread.start()
+    wait_for(lambda: supervisor.health()["healthy"] == 2)
+    pids = [worker["pid"] for worker in supervisor.health()["workers"]]
+
+    supervisor.stop()
+    thread.join()
+
+    report = supervisor.health()
+    assert report["status"] == "down"
+    assert report["handled"] == 2
+    assert report["restarts"] == 0
+    for pid in pids:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            continue
+        raise AssertionError(f"worker {pid} is still running")
+
+
+def test_health_app_reports_down_before_start() -> None:
+    client = TestClient(create_health_app(make_supervisor(draining_worker)))
+    response = client.get("/health")
+    assert response.status_code == 503
+    assert response.json()["status"] == "down"
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.json() == {
+        "processes": 2, "healthy": 0, "handled": 0, "failed": 0, "restarts": 0
+    }
@@ -1,11 +1,16 @@
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import create_engine, SQLModel
 
 from pydantic_core import MultiHostUrl
 from dotenv import load_dotenv
 import os
 
+from app.db.pool import engine_options
 from app.models.product_models import Product
 from app.models.product_analytics_models import ProductAnalytics
+from app.models.outbox_models import OutboxEvent
+from app.models.import_models import ImportJob
+from app.models.idempotency_models import IdempotencyKey
 
 load_dotenv()
 
@@ -24,7 +29,9 @@ DATABASE_URL = MultiHostUrl.build(
     path=DATABASE_NAME,
 )
 
-engine = create_engine(str(DATABASE_URL))
+engine = create_engine(str(DATABASE_URL), **engine_options())
+async_engine = create_async_engine(
+    str(DATABASE_URL), **engine_options(is_async=True))
 
 
 def init_db() -> None:
@@ -0,0 +1,13 @@
+from collections.abc import Callable
+from sqlalchemy import Table
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session
+
+
+def dialect_insert(session: Session) -> Callable[[Table], postgresql.Insert]:
+    """
+    INSERT construct supporting ON CONFLICT for the session's database.
+    """
+    if session.get_bind().dialect.name == "postgresql":
+        return postgresql.insert
+    return sqlite.insert
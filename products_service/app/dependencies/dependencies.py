@@ -1,7 +1,9 @@
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
 from typing import Annotated
 from fastapi import Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from fastapi.security import (
     HTTPBearer,
@@ -12,7 +14,13 @@ from pydantic import ValidationError
 import jwt
 
 from app.utils.security import SECRET_KEY, ALGORITHM
-from app.db.connection import engine
+from app.db.connection import engine, async_engine
+
+async_session_factory = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    expire_on_commit=False
+)
 
 
 def get_db() -> Generator[Session, None, None]:
@@ -20,7 +28,21 @@ def get_db() -> Generator[Session, None, None]:
         yield session
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with async_session_factory() as session:
+        yield session
+
+
+def get_async_session_factory() -> async_sessionmaker[AsyncSession]:
+    return async_session_factory
+
+
 SessionDep = Annotated[Session, Depends(get_db)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_db)]
+AsyncSessionFactoryDep = Annotated[
+    async_sessionmaker[AsyncSession],
+    Depends(get_async_session_factory)
+]
 
 bearer_scheme = HTTPBearer()
 
@@ -1,8 +1,39 @@
 from fastapi import FastAPI
+from contextlib import asynccontextmanager
 
+from app.db.connection import async_engine, engine
+from app.db.pool import (
+    DATABASE_POOL_PREFILL,
+    prefill_async_pool,
+    prefill_pool
+)
+from app.routers import health
 from app.routers.v1 import products, products_analytics
+from app.services.event_publisher_service import event_publisher
+from app.services.idempotency_service import IdempotencyMiddleware
+from app.services.outbox_service import outbox_relay
+from app.services.product_import_service import import_job_runner
+from app.services.product_analytics_service import query_count_buffer
 
-app = FastAPI(title="Products API")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if DATABASE_POOL_PREFILL:
+        prefill_pool(engine)
+        await prefill_async_pool(async_engine)
+    query_count_buffer.start()
+    event_publisher.start()
+    outbox_relay.start()
+    yield
+    import_job_runner.stop()
+    outbox_relay.stop()
+    event_publisher.stop()
+    query_count_buffer.stop()
+    await async_engine.dispose()
+
+app = FastAPI(title="Products API", lifespan=lifespan)
+app.add_middleware(IdempotencyMiddleware)
+
+app.include_router(health.router, prefix="")
 app.include_router(products.router, prefix="/api/v1")
 app.include_router(products_analytics.router, prefix="/api/v1")
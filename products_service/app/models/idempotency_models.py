@@ -0,0 +1,36 @@
+from datetime import datetime, timezone
+from sqlalchemy import JSON, DateTime, LargeBinary
+from sqlmodel import Field, SQLModel
+
+
+class IdempotencyKey(SQLModel, table=True):
+    """
+    A request made with an Idempotency-Key header and, once it finished,
+    its response. status_code is None while the request is in progress:
+    the request holding lease keeps the key until locked_until, then a
+    retry may take it over.
+    """
+    __tablename__ = "idempotency_key"
+
+    # Keys are scoped to the token subject that used them.
+    principal: str = Field(primary_key=True, max_length=255)
+    key: str = Field(primary_key=True, max_length=255)
+    fingerprint: str = Field(max_length=64, nullable=False)
+    status_code: int | None = Field(default=None)
+    headers: list[list[str]] = Field(default_factory=list, sa_type=JSON)
+    body: bytes | None = Field(default=None, sa_type=LargeBinary)
+    lease: str | None = Field(default=None, max_length=32)
+    locked_until: datetime | None = Field(
+        default=None,
+        sa_type=DateTime(timezone=True)
+    )
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),
+        nullable=False
+    )
+    expires_at: datetime = Field(
+        sa_type=DateTime(timezone=True),
+        nullable=False,
+        index=True
+    )
@@ -0,0 +1,54 @@
+from datetime import datetime, timezone
+from typing import Any, Literal
+import uuid
+from sqlalchemy import JSON, DateTime, Text
+from sqlmodel import Field, SQLModel
+
+ImportJobStatus = Literal["pending", "staging", "merging", "succeeded", "failed"]
+
+
+class ImportRowError(SQLModel):
+    # The record's position after the header, counted in CSV records, which
+    # may span several lines of the file.
+    row: int
+    sku: str | None = None
+    message: str
+
+
+class ImportJobBase(SQLModel):
+    status: str = Field(default="pending", max_length=20)
+    filename: str | None = Field(default=None, max_length=255)
+    created_by: str | None = Field(default=None, max_length=255)
+    bytes_total: int = Field(default=0)
+    bytes_read: int = Field(default=0)
+    rows_staged: int = Field(default=0)
+    rows_created: int = Field(default=0)
+    rows_updated: int = Field(default=0)
+    rows_rejected: int = Field(default=0)
+    error: str | None = Field(default=None, sa_type=Text)
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),
+        nullable=False
+    )
+    started_at: datetime | None = Field(
+        default=None,
+        sa_type=DateTime(timezone=True)
+    )
+    finished_at: datetime | None = Field(
+        default=None,
+        sa_type=DateTime(timezone=True)
+    )
+
+
+class ImportJob(ImportJobBase, table=True):
+    __tablename__ = "product_import_job"
+
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    errors: list[dict[str, Any]] = Field(default_factory=list, sa_type=JSON)
+
+
+class ImportJobPublic(ImportJobBase):
+    id: uuid.UUID
+    status: ImportJobStatus
+    errors: list[ImportRowError]
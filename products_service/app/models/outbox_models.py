@@ -0,0 +1,38 @@
+from datetime import datetime, timezone
+import uuid
+from sqlalchemy import DateTime, Index, Text, text
+from sqlmodel import Field, SQLModel
+
+
+class OutboxEvent(SQLModel, table=True):
+    __tablename__ = "event_outbox"
+    __table_args__ = (
+        Index(
+            "ix_event_outbox_pending",
+            "created_at",
+            postgresql_where=text("sent_at IS NULL"),
+            sqlite_where=text("sent_at IS NULL")
+        ),
+        # Finds the sent events past retention.
+        Index(
+            "ix_event_outbox_sent",
+            "sent_at",
+            postgresql_where=text("sent_at IS NOT NULL"),
+            sqlite_where=text("sent_at IS NOT NULL")
+        ),
+    )
+
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    payload: str = Field(sa_type=Text, nullable=False)
+    # Topic the event is published under, e.g. product.update.
+    routing_key: str | None = Field(default=None, max_length=255)
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),
+        nullable=False
+    )
+    sent_at: datetime | None = Field(
+        default=None,
+        sa_type=DateTime(timezone=True)
+    )
+    attempts: int = Field(default=0, nullable=False)
@@ -5,7 +5,7 @@ from datetime import datetime
 
 class ProductAnalyticsBase(SQLModel):
     product_id: uuid.UUID = Field(
-        foreign_key="product.id", nullable=False, index=True)
+        foreign_key="product.id", nullable=False, index=True, unique=True)
     query_count: int = Field(default=0, nullable=False)
     last_queried_at: datetime | None = Field(default=None)
 
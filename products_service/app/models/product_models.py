@@ -1,6 +1,28 @@
+from datetime import datetime, timezone
+from typing import Any, Literal
+from dotenv import load_dotenv
 import uuid
+import os
+from sqlalchemy import (
+    DDL,
+    BigInteger,
+    DateTime,
+    Index,
+    event,
+    literal_column,
+    text
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlmodel import Field, SQLModel
 
+load_dotenv()
+
+PRODUCT_BATCH_MAX_ITEMS = int(os.getenv("PRODUCT_BATCH_MAX_ITEMS", "1000"))
+PRODUCT_SEARCH_CONFIG = os.getenv("PRODUCT_SEARCH_CONFIG", "english")
+PRODUCT_SEARCH_MAX_QUERY_LENGTH = 200
+
+ProductSort = Literal["id", "price", "-price", "name"]
+
 
 class ProductBase(SQLModel):
     name: str = Field(min_length=1, max_length=255)
@@ -23,14 +45,179 @@ class ProductUpdate(ProductBase):
     is_discontinued: bool | None = Field(default=None)
 
 
+class ProductUpsert(ProductUpdate):
+    """
+    Batch item matched by sku. Only the fields sent are written to an
+    existing product, a new one needs every ProductCreate field.
+    """
+    sku: str = Field(min_length=1, max_length=100)
+
+
 class ProductPublic(ProductBase):
     id: uuid.UUID
+    version: int
 
 
 class ProductsPublic(SQLModel):
     data: list[ProductPublic]
     count: int
+    next_cursor: str | None = None
+
+
+class ProductsPartialPublic(SQLModel):
+    data: list[dict[str, Any]]
+    count: int
+    next_cursor: str | None = None
+
+
+class ProductsBatchPublic(SQLModel):
+    data: list[ProductPublic]
+    missing: list[uuid.UUID]
+
+
+class ProductFilters(SQLModel):
+    brand: str | None = Field(default=None, min_length=1, max_length=100)
+    min_price: float | None = Field(default=None, ge=0)
+    max_price: float | None = Field(default=None, ge=0)
+    sku_prefix: str | None = Field(default=None, min_length=1, max_length=100)
+
+
+class ProductSearchResults(SQLModel):
+    data: list[ProductPublic]
+    next_cursor: str | None = None
+
+
+class ProductBatchCreate(SQLModel):
+    items: list[ProductUpsert] = Field(
+        min_length=1, max_length=PRODUCT_BATCH_MAX_ITEMS)
+
+
+class ProductBatchItemResult(SQLModel):
+    index: int
+    sku: str
+    id: uuid.UUID | None = None
+    # not_found: a partial item for a sku that does not exist.
+    status: Literal["created", "updated", "duplicate", "not_found"]
+
+
+class ProductBatchResult(SQLModel):
+    results: list[ProductBatchItemResult]
+    created: int
+    updated: int
+
+
+class ProductBulkUpdate(SQLModel):
+    """
+    Change applied to every product matching filters and ids, active or
+    not. Prices change by price_percent or by price_amount.
+    """
+    filters: ProductFilters = Field(default_factory=ProductFilters)
+    ids: list[uuid.UUID] | None = Field(
+        default=None, min_length=1, max_length=PRODUCT_BATCH_MAX_ITEMS)
+    price_percent: float | None = Field(default=None, gt=-100)
+    price_amount: float | None = Field(default=None)
+    is_discontinued: bool | None = Field(default=None)
+
+
+class ProductBulkUpdateResult(SQLModel):
+    updated: int
+
+
+def active_product_index(name: str, *columns: str, **kwargs) -> Index:
+    """
+    Index over the products the list endpoint can return.
+    """
+    return Index(
+        name,
+        *columns,
+        postgresql_where=text("NOT is_discontinued"),
+        sqlite_where=text("is_discontinued = 0"),
+        **kwargs
+    )
 
 
 class Product(ProductBase, table=True):
+    __table_args__ = (
+        active_product_index("ix_product_active_id", "id"),
+        # GET /products filters and sorts, each ending in id for the keyset
+        # cursor. Equality on brand combines with any sort. A price range
+        # or sku prefix sorted by another column cannot be served by one
+        # btree: the planner walks the sort index and filters, or reads the
+        # range and sorts it.
+        active_product_index("ix_product_active_brand_id", "brand", "id"),
+        active_product_index(
+            "ix_product_active_brand_price", "brand", "price", "id"),
+        active_product_index(
+            "ix_product_active_brand_name", "brand", "name", "id"),
+        active_product_index("ix_product_active_price", "price", "id"),
+        active_product_index("ix_product_active_name", "name", "id"),
+        # LIKE 'prefix%' only uses a btree index with the pattern operator
+        # class unless the database collation is C.
+        active_product_index(
+            "ix_product_active_sku_pattern",
+            "sku",
+            postgresql_ops={"sku": "text_pattern_ops"}
+        ),
+        active_product_index(
+            "ix_product_active_brand_sku_pattern",
+            "brand",
+            "sku",
+            postgresql_ops={"sku": "text_pattern_ops"}
+        ),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    updated_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),
+        nullable=False,
+        index=True
+    )
+    # Incremented by every write, exposed as the product's ETag.
+    version: int = Field(
+        default=1,
+        nullable=False,
+        sa_column_kwargs={"server_default": text("1")}
+    )
+
+
+# Full-text search document over name, brand and description, weighted in
+# that order. It only exists on PostgreSQL and is deliberately not mapped on
+# Product, so it is never loaded with the rows.
+PRODUCT_SEARCH_VECTOR = literal_column("product.search_vector", TSVECTOR)
+
+event.listen(
+    Product.__table__,
+    "after_create",
+    DDL(
+        "ALTER TABLE product ADD COLUMN search_vector tsvector "
+        "GENERATED ALWAYS AS ("
+        f"setweight(to_tsvector('{PRODUCT_SEARCH_CONFIG}', "
+        "coalesce(name, '')), 'A') || "
+        f"setweight(to_tsvector('{PRODUCT_SEARCH_CONFIG}', "
+        "coalesce(brand, '')), 'B') || "
+        f"setweight(to_tsvector('{PRODUCT_SEARCH_CONFIG}', "
+        "coalesce(description, '')), 'C')"
+        ") STORED"
+    ).execute_if(dialect="postgresql")
+)
+event.listen(
+    Product.__table__,
+    "after_create",
+    DDL(
+        "CREATE INDEX ix_product_search_vector ON product "
+        "USING gin (search_vector)"
+    ).execute_if(dialect="postgresql")
+)
+
+
+class CatalogGeneration(SQLModel, table=True):
+    """
+    Single row counting catalog writes. Writers increment it in their own
+    transaction, so it only moves once their changes are visible and never
+    depends on the clocks of the servers doing the writes.
+    """
+    __tablename__ = "catalog_generation"
+
+    id: int = Field(default=1, primary_key=True)
+    value: int = Field(default=0, sa_type=BigInteger, nullable=False)
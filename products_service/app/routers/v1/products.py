@@ -1,30 +1,82 @@
-from typing import Any
-from fastapi import APIRouter, Depends, HTTPException
+from collections.abc import AsyncIterator
+from typing import Any, Literal
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response
+)
+from fastapi.responses import StreamingResponse
 from datetime import datetime, timezone
 import uuid
+import json
+import os
 
-from app.services import product_service
+from app.services import (
+    async_product_service,
+    product_cache_service,
+    product_import_service,
+    product_service
+)
 from app.dependencies.dependencies import (
+    AsyncSessionDep,
+    AsyncSessionFactoryDep,
     SessionDep,
     admin_required,
     get_current_token_data
 )
+from app.models.import_models import ImportJobPublic
 from app.models.product_models import (
     Product,
+    ProductBatchCreate,
+    ProductBatchItemResult,
+    ProductBatchResult,
+    ProductBulkUpdate,
+    ProductBulkUpdateResult,
+    PRODUCT_SEARCH_MAX_QUERY_LENGTH,
     ProductCreate,
+    ProductFilters,
     ProductPublic,
+    ProductSearchResults,
+    ProductSort,
     ProductUpdate,
+    ProductsBatchPublic,
+    ProductsPartialPublic,
     ProductsPublic
 )
-from app.schemas.schemas import Message, AuditEvent
-from app.services.event_publisher_service import emit_crud_event
+from app.schemas.schemas import Message, AuditEvent, CacheStats
+from app.utils.export import (
+    EXPORT_MEDIA_TYPES,
+    csv_chunks,
+    ndjson_chunks
+)
+from app.utils.http_cache import (
+    PRODUCT_CACHE_CONTROL,
+    PRODUCTS_LIST_CACHE_CONTROL,
+    etag_matches,
+    if_match_version,
+    make_etag,
+    version_etag
+)
+from app.utils.fieldsets import InvalidFieldsError, parse_fields
+from app.utils.pagination import (
+    InvalidCursorError,
+    decode_cursor,
+    encode_cursor
+)
 from app.services.product_analytics_service import (
-    init_product_analytics,
-    increment_anonymous_query_count
+    increment_anonymous_query_count,
+    increment_anonymous_query_counts
 )
 
 router = APIRouter(prefix="/products", tags=["products"])
 
+# Bookkeeping columns every write changes, left out of audit events.
+UNAUDITED_FIELDS = {"updated_at", "version"}
+
 
 @router.post(
     path="",
@@ -34,6 +86,7 @@ router = APIRouter(prefix="/products", tags=["products"])
 def create_product(
     *,
     session: SessionDep,
+    response: Response,
     product_in: ProductCreate,
     token_data: dict = Depends(get_current_token_data)
 ) -> ProductPublic:
@@ -41,31 +94,185 @@ def create_product(
     Create new product.
     """
 
-    product = product_service.get_product_by_sku(
+    product = product_service.create_product(
         session=session,
-        sku=product_in.sku
+        product_create=product_in,
+        event_builder=audit_event_builder(
+            user=token_data.get("sub"),
+            action="create"
+        )
     )
-    if product:
+    if not product:
         raise HTTPException(
             status_code=400,
             detail="The product with this sku already exists in the system.",
         )
+    product_cache_service.invalidate_product(product.id)
+    response.headers["ETag"] = version_etag(product.version)
+    return product
 
-    product = product_service.create_product(
+
+@router.post(
+    path="/batch",
+    dependencies=[Depends(admin_required)],
+    response_model=ProductBatchResult
+)
+def upsert_products(
+    *,
+    session: SessionDep,
+    batch_in: ProductBatchCreate,
+    token_data: dict = Depends(get_current_token_data)
+) -> Any:
+    """
+    Create or update many products by sku. Existing products only change
+    in the fields an item sends.
+    """
+
+    # A sku may only be written once per statement, the last occurrence wins.
+    last_index = {item.sku: index for index, item in enumerate(batch_in.items)}
+    changes = product_service.upsert_products(
         session=session,
-        product_create=product_in
-    )
-    event = AuditEvent(
-        user=token_data.get("sub"),
-        action="create",
-        timestamp=datetime.now(timezone.utc),
-        model="Product",
-        record_id=product.id,
-        changes=get_changes(original=None, updated=product)
-    )
-    emit_crud_event(event)
-    init_product_analytics(session=session, product_id=product.id)
-    return product
+        products_in=[
+            item for index, item in enumerate(batch_in.items)
+            if last_index[item.sku] == index
+        ],
+        event_builder=batch_audit_event_builder(
+            user=token_data.get("sub"),
+            action="batch upsert"
+        )
+    )
+    written = {updated.sku: (original, updated) for original, updated in changes}
+    for _, updated in changes:
+        product_cache_service.invalidate_product(updated.id)
+
+    results = []
+    for index, item in enumerate(batch_in.items):
+        if item.sku not in written:
+            results.append(ProductBatchItemResult(
+                index=index, sku=item.sku, status="not_found"))
+            continue
+        original, updated = written[item.sku]
+        if last_index[item.sku] != index:
+            status = "duplicate"
+        elif original is None:
+            status = "created"
+        else:
+            status = "updated"
+        results.append(ProductBatchItemResult(
+            index=index, sku=item.sku, id=updated.id, status=status))
+    return ProductBatchResult(
+        results=results,
+        created=sum(original is None for original, _ in changes),
+        updated=sum(original is not None for original, _ in changes)
+    )
+
+
+@router.post(
+    path=":bulk-update",
+    dependencies=[Depends(admin_required)],
+    response_model=ProductBulkUpdateResult
+)
+def bulk_update_products(
+    *,
+    session: SessionDep,
+    bulk_in: ProductBulkUpdate,
+    token_data: dict = Depends(get_current_token_data)
+) -> Any:
+    """
+    Change the price or discontinue every product matching a filter.
+    """
+
+    if bulk_in.ids is None and not bulk_in.filters.model_dump(
+            exclude_none=True):
+        raise HTTPException(status_code=400, detail="A filter is required")
+    if bulk_in.price_percent is not None and bulk_in.price_amount is not None:
+        raise HTTPException(
+            status_code=400,
+            detail="Use either price_percent or price_amount"
+        )
+    if (bulk_in.price_percent is None and bulk_in.price_amount is None
+            and bulk_in.is_discontinued is None):
+        raise HTTPException(status_code=400, detail="No change requested")
+
+    try:
+        changes = product_service.bulk_update_products(
+            session=session,
+            bulk_in=bulk_in,
+            event_builder=batch_audit_event_builder(
+                user=token_data.get("sub"),
+                action="bulk update"
+            )
+        )
+    except product_service.BulkUpdateTooLargeError as exc:
+        raise HTTPException(
+            status_code=422,
+            detail=(
+                f"The update would change more than {exc.args[0]} "
+                "products, narrow the filter"
+            )
+        )
+    for _, updated in changes:
+        product_cache_service.invalidate_product(updated.id)
+    return ProductBulkUpdateResult(updated=len(changes))
+
+
+@router.post(
+    path="/imports",
+    dependencies=[Depends(admin_required)],
+    response_model=ImportJobPublic,
+    status_code=202
+)
+async def import_products(
+    *,
+    session: AsyncSessionDep,
+    request: Request,
+    filename: str | None = Query(default=None, max_length=255),
+    token_data: dict = Depends(get_current_token_data)
+) -> Any:
+    """
+    Upload a CSV catalog as the request body and import it in the background.
+    """
+
+    path, size = await product_import_service.spool_upload(request.stream())
+    if size == 0:
+        os.unlink(path)
+        raise HTTPException(status_code=400, detail="The file is empty.")
+
+    job = await product_import_service.create_import_job(
+        session=session,
+        filename=filename,
+        created_by=token_data.get("sub"),
+        bytes_total=size
+    )
+    product_import_service.import_job_runner.submit(
+        job_id=job.id,
+        path=path,
+        user=token_data.get("sub")
+    )
+    return job
+
+
+@router.get(
+    "/imports/{job_id}",
+    dependencies=[Depends(admin_required)],
+    response_model=ImportJobPublic
+)
+async def get_import_job(
+    *,
+    session: AsyncSessionDep,
+    job_id: uuid.UUID
+) -> Any:
+    """
+    Get the progress of an import job.
+    """
+
+    job = await product_import_service.get_import_job(
+        session=session,
+        job_id=job_id
+    )
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
 
 
 @router.patch(
@@ -76,46 +283,42 @@ def create_product(
 def update_product(
     *,
     session: SessionDep,
+    response: Response,
     product_id: uuid.UUID,
     product_in: ProductUpdate,
+    if_match: str | None = Header(default=None),
     token_data: dict = Depends(get_current_token_data)
 ) -> Any:
     """
-    Update existing product.
+    Update existing product. Requires an If-Match header with the product's
+    current ETag, or "*".
     """
 
-    db_product = session.get(Product, product_id)
+    try:
+        db_product = product_service.update_product(
+            session=session,
+            product_id=product_id,
+            product_in=product_in,
+            expected_version=expected_version(if_match),
+            event_builder=audit_event_builder(
+                user=token_data.get("sub"),
+                action="update"
+            )
+        )
+    except product_service.SkuConflictError:
+        raise HTTPException(
+            status_code=409,
+            detail="Product with this sku already exists"
+        )
+    except product_service.VersionConflictError:
+        raise precondition_failed()
     if not db_product:
         raise HTTPException(
             status_code=404,
             detail="The product with this id does not exist in the system",
         )
-    if product_in.sku:
-        existing_product = product_service.get_product_by_sku(
-            session=session,
-            sku=product_in.sku
-        )
-        if existing_product and existing_product.id != product_id:
-            raise HTTPException(
-                status_code=409,
-                detail="Product with this sku already exists"
-            )
-
-    original_db_product = db_product.model_copy()
-    db_product = product_service.update_product(
-        session=session,
-        db_product=db_product,
-        product_in=product_in
-    )
-    event = AuditEvent(
-        user=token_data.get("sub"),
-        action="update",
-        timestamp=datetime.now(timezone.utc),
-        model="Product",
-        record_id=db_product.id,
-        changes=get_changes(original=original_db_product, updated=db_product)
-    )
-    emit_crud_event(event)
+    product_cache_service.invalidate_product(db_product.id)
+    response.headers["ETag"] = version_etag(db_product.version)
     return db_product
 
 
@@ -126,72 +329,451 @@ def update_product(
 )
 def delete_product(
     session: SessionDep,
+    response: Response,
     product_id: uuid.UUID,
+    if_match: str | None = Header(default=None),
     token_data: dict = Depends(get_current_token_data)
 ) -> Message:
     """
-    Delete a product.
+    Delete a product. Requires an If-Match header like update.
     """
 
-    db_product = session.get(Product, product_id)
+    try:
+        db_product = product_service.delete_product(
+            session=session,
+            product_id=product_id,
+            expected_version=expected_version(if_match),
+            event_builder=audit_event_builder(
+                user=token_data.get("sub"),
+                action="soft delete"
+            )
+        )
+    except product_service.VersionConflictError:
+        raise precondition_failed()
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
+    product_cache_service.invalidate_product(db_product.id)
+    response.headers["ETag"] = version_etag(db_product.version)
+    return Message(message="Product soft deleted successfully")
+
+
+@router.get(
+    "",
+    response_model=ProductsPublic | ProductsPartialPublic
+)
+async def list_products(
+    *,
+    session: AsyncSessionDep,
+    request: Request,
+    response: Response,
+    if_none_match: str | None = Header(default=None),
+    limit: int = Query(
+        default=product_service.DEFAULT_PAGE_SIZE,
+        ge=1,
+        le=product_service.MAX_PAGE_SIZE,
+        description="Maximum number of products per page"
+    ),
+    cursor: str | None = Query(
+        default=None,
+        description="Opaque cursor taken from a previous page's next_cursor"
+    ),
+    brand: str | None = Query(default=None, min_length=1, max_length=100),
+    min_price: float | None = Query(default=None, ge=0),
+    max_price: float | None = Query(default=None, ge=0),
+    sku_prefix: str | None = Query(
+        default=None, min_length=1, max_length=100),
+    sort: ProductSort = Query(
+        default="id",
+        description="Sort order, prefix with - for descending"
+    ),
+    exact_count: bool = Query(
+        default=False,
+        description=(
+            "Return an exact count instead of an estimate. Filtered lists "
+            "are counted exactly on the first page, later pages repeat "
+            "that count"
+        )
+    ),
+    fields: str | None = Query(
+        default=None,
+        description="Comma separated product fields to return, all by default"
+    )
+) -> Any:
+    """
+    Retrieve products, filtered and sorted, paginated by cursor.
+    """
 
-    original_db_product = db_product.model_copy()
-    db_product = product_service.delete_product(
-        session=session, db_product=db_product)
+    generation = await async_product_service.get_catalog_generation(
+        session=session)
+    etag = make_etag(f"{generation}|{request.url.query}".encode())
+    cache_headers = {"ETag": etag, "Cache-Control": PRODUCTS_LIST_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=cache_headers)
 
-    event = AuditEvent(
-        user=token_data.get("sub"),
-        action="soft delete",
-        timestamp=datetime.now(timezone.utc),
-        model="Product",
-        record_id=db_product.id,
-        changes=get_changes(original=original_db_product, updated=db_product)
+    selected_fields = requested_fields(fields)
+    filters = ProductFilters(
+        brand=brand,
+        min_price=min_price,
+        max_price=max_price,
+        sku_prefix=sku_prefix
     )
-    emit_crud_event(event)
-    return Message(message="Product soft deleted successfully")
+    after = None
+    carried_count = None
+    if cursor:
+        try:
+            after, carried_count = product_service.parse_page_cursor(
+                decode_cursor(cursor), sort)
+        except (InvalidCursorError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    products = await async_product_service.get_products(
+        session=session,
+        limit=limit + 1,
+        filters=filters,
+        sort=sort,
+        after=after,
+        fields=selected_fields
+    )
+    filtered = bool(filters.model_dump(exclude_none=True))
+    if exact_count or (filtered and carried_count is None):
+        count = await async_product_service.count_products(
+            session=session,
+            filters=filters
+        )
+    elif filtered:
+        count = carried_count
+    else:
+        count = await async_product_service.estimate_products_count(
+            session=session)
+
+    next_cursor = None
+    if len(products) > limit:
+        products = products[:limit]
+        next_cursor = encode_cursor(product_service.page_cursor_values(
+            products[-1], sort, count if filtered else None))
+    response.headers.update(cache_headers)
+    if selected_fields is not None:
+        return ProductsPartialPublic(
+            data=[
+                {field: row._mapping[field] for field in selected_fields}
+                for row in products
+            ],
+            count=count,
+            next_cursor=next_cursor
+        )
+    return ProductsPublic(data=products, count=count, next_cursor=next_cursor)
 
 
 @router.get(
-    "",
-    response_model=ProductsPublic
+    "/search",
+    response_model=ProductSearchResults
+)
+async def search_products(
+    *,
+    session: AsyncSessionDep,
+    request: Request,
+    response: Response,
+    if_none_match: str | None = Header(default=None),
+    q: str = Query(
+        min_length=1,
+        max_length=PRODUCT_SEARCH_MAX_QUERY_LENGTH,
+        description="Words to look for in the name, brand and description"
+    ),
+    limit: int = Query(
+        default=product_service.DEFAULT_PAGE_SIZE,
+        ge=1,
+        le=product_service.MAX_PAGE_SIZE,
+        description="Maximum number of products per page"
+    ),
+    cursor: str | None = Query(
+        default=None,
+        description="Opaque cursor taken from a previous page's next_cursor"
+    )
+) -> Any:
+    """
+    Search products, best matches first, paginated by cursor.
+    """
+
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Empty search query")
+
+    generation = await async_product_service.get_catalog_generation(
+        session=session)
+    etag = make_etag(f"{generation}|{request.url.query}".encode())
+    cache_headers = {"ETag": etag, "Cache-Control": PRODUCTS_LIST_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=cache_headers)
+
+    after = None
+    if cursor:
+        try:
+            after_rank, after_id = decode_cursor(cursor)
+            after = (float(after_rank), uuid.UUID(after_id))
+        except (InvalidCursorError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    rows = await async_product_service.search_products(
+        session=session,
+        query=q,
+        limit=limit + 1,
+        after=after
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_product, last_rank = rows[-1]
+        next_cursor = encode_cursor([last_rank, str(last_product.id)])
+
+    response.headers.update(cache_headers)
+    return ProductSearchResults(
+        data=[product for product, _ in rows],
+        next_cursor=next_cursor
+    )
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {
+        media_type: {} for media_type in EXPORT_MEDIA_TYPES.values()}}}
+)
+async def export_products(
+    *,
+    session_factory: AsyncSessionFactoryDep,
+    export_format: Literal["ndjson", "csv"] = Query(
+        default="ndjson", alias="format"),
+    brand: str | None = Query(default=None),
+    updated_since: datetime | None = Query(default=None)
+) -> StreamingResponse:
+    """
+    Stream the active catalog as NDJSON or CSV.
+    """
+
+    serialize = csv_chunks if export_format == "csv" else ndjson_chunks
+
+    async def chunks() -> AsyncIterator[str]:
+        # The session lives as long as the response body, not the request
+        # handler, so the server-side cursor stays open while streaming.
+        async with session_factory() as session:
+            batches = async_product_service.stream_products(
+                session=session,
+                brand=brand,
+                updated_since=updated_since
+            )
+            async for chunk in serialize(batches):
+                yield chunk
+
+    return StreamingResponse(
+        chunks(),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition":
+                f'attachment; filename="products.{export_format}"'
+        }
+    )
+
+
+@router.get(
+    "/cache/stats",
+    dependencies=[Depends(admin_required)],
+    response_model=CacheStats
 )
-def list_products(*, session: SessionDep) -> Any:
+async def get_product_cache_stats() -> Any:
     """
-    Retrieve products.
+    Get product cache counters.
     """
 
-    products = product_service.get_products(session=session)
-    return ProductsPublic(data=products, count=len(products))
+    return product_cache_service.get_cache_stats()
+
+
+@router.get(
+    ":batch",
+    response_model=ProductsBatchPublic
+)
+async def get_products_batch(
+    *,
+    session: AsyncSessionDep,
+    ids: list[str] = Query(
+        description="Product ids, repeated or comma separated"
+    ),
+    if_none_match: str | None = Header(default=None),
+    fields: str | None = Query(
+        default=None,
+        description="Comma separated product fields to return, all by default"
+    )
+) -> Any:
+    """
+    Get several products by ID in the requested order.
+    """
+
+    try:
+        product_ids = list(dict.fromkeys(
+            uuid.UUID(product_id)
+            for value in ids
+            for product_id in value.split(",")
+            if product_id.strip()
+        ))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid product id")
+    if not product_ids:
+        raise HTTPException(status_code=400, detail="No product ids")
+    if len(product_ids) > product_service.MAX_PAGE_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {product_service.MAX_PAGE_SIZE} ids per request"
+        )
+
+    payloads = await product_cache_service.get_product_payloads(
+        session=session,
+        product_ids=product_ids,
+        fields=requested_fields(fields)
+    )
+    increment_anonymous_query_counts(product_ids=payloads.keys())
+
+    # The cached payloads are already serialized, join them as they are.
+    content = b"".join([
+        b'{"data":[',
+        b",".join(
+            payloads[product_id]
+            for product_id in product_ids if product_id in payloads
+        ),
+        b'],"missing":',
+        json.dumps([
+            str(product_id)
+            for product_id in product_ids if product_id not in payloads
+        ]).encode(),
+        b"}",
+    ])
+    etag = make_etag(content)
+    cache_headers = {"ETag": etag, "Cache-Control": PRODUCT_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=cache_headers)
+    return Response(
+        content=content,
+        media_type="application/json",
+        headers=cache_headers
+    )
 
 
 @router.get(
     "/{product_id}",
     response_model=ProductPublic
 )
-def get_product(
+async def get_product(
     *,
-    session: SessionDep,
+    session: AsyncSessionDep,
     product_id: uuid.UUID,
+    if_none_match: str | None = Header(default=None),
+    fields: str | None = Query(
+        default=None,
+        description="Comma separated product fields to return, all by default"
+    )
 ) -> Any:
     """
     Get product by ID.
     """
 
-    product = product_service.get_product_by_id(
+    selected_fields = requested_fields(fields)
+    cached = await product_cache_service.get_product_payload(
         session=session,
-        product_id=product_id
+        product_id=product_id,
+        fields=selected_fields
     )
-    if not product:
+    if cached is None:
         raise HTTPException(status_code=404, detail="Product not found")
-    increment_anonymous_query_count(session=session, product_id=product.id)
-    return product
+    increment_anonymous_query_count(product_id=product_id)
+
+    payload = cached.payload
+    # The full representation is tagged with the version, which is what
+    # If-Match expects. Sparse ones need a tag of their own.
+    etag = (
+        version_etag(cached.version) if selected_fields is None
+        else make_etag(payload)
+    )
+    cache_headers = {"ETag": etag, "Cache-Control": PRODUCT_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=cache_headers)
+    return Response(
+        content=payload,
+        media_type="application/json",
+        headers=cache_headers
+    )
+
+
+def requested_fields(fields: str | None) -> list[str] | None:
+    try:
+        return parse_fields(fields, list(ProductPublic.model_fields))
+    except InvalidFieldsError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+def expected_version(if_match: str | None) -> int | None:
+    if if_match is None:
+        raise HTTPException(
+            status_code=428,
+            detail="If-Match header is required"
+        )
+    try:
+        return if_match_version(if_match)
+    except ValueError:
+        raise precondition_failed()
+
+
+def precondition_failed() -> HTTPException:
+    return HTTPException(
+        status_code=412,
+        detail="The product has been modified, fetch it again"
+    )
+
+
+def audit_event_builder(
+    *,
+    user: str | None,
+    action: str
+) -> product_service.AuditEventBuilder:
+    def build(original: Product | None, updated: Product) -> AuditEvent:
+        return AuditEvent(
+            user=user,
+            action=action,
+            timestamp=datetime.now(timezone.utc),
+            model="Product",
+            record_id=updated.id,
+            changes=get_changes(original=original, updated=updated)
+        )
+    return build
+
+
+def batch_audit_event_builder(
+    *,
+    user: str | None,
+    action: str
+) -> product_service.BatchAuditEventBuilder:
+    def build(changes: product_service.ProductChanges) -> AuditEvent:
+        return AuditEvent(
+            user=user,
+            action=action,
+            timestamp=datetime.now(timezone.utc),
+            model="Product",
+            record_id=None,
+            changes={
+                f"{updated.id}.{field}": change
+                for original, updated in changes
+                for field, change in get_changes(
+                    original=original, updated=updated).items()
+            }
+        )
+    return build
 
 
 def get_changes(*, original: Product | None, updated: Product) -> dict:
+    """
+    Old and new value of every field the write changed. A created product
+    has no old values.
+    """
     changes = {}
-    for field, updated_value in updated.model_dump().items():
+    for field, updated_value in updated.model_dump(
+            exclude=UNAUDITED_FIELDS).items():
         original_value = getattr(original, field) if original else None
-        changes[field] = {"old": original_value, "new": updated_value}
+        if original_value != updated_value:
+            changes[field] = {"old": original_value, "new": updated_value}
     return changes
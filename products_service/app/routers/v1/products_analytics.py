@@ -3,9 +3,12 @@ from fastapi import APIRouter, HTTPException, Depends
 import uuid
 
 from app.models.product_analytics_models import ProductAnalyticsPublic
-from app.services import product_analytics_service
+from app.services import (
+    async_product_analytics_service,
+    product_analytics_service
+)
 from app.dependencies.dependencies import (
-    SessionDep,
+    AsyncSessionDep,
     admin_required
 )
 
@@ -18,19 +21,24 @@ router = APIRouter(prefix="/products", tags=["products"])
     response_model=ProductAnalyticsPublic,
     dependencies=[Depends(admin_required)]
 )
-def get_product_analytics(
+async def get_product_analytics(
     *,
-    session: SessionDep,
+    session: AsyncSessionDep,
     product_id: uuid.UUID
 ) -> Any:
     """
     Get product analytics by ID.
     """
 
-    product_analytics = product_analytics_service.get_product_analytics_by_product_id(
+    product_analytics = await async_product_analytics_service.get_product_analytics_by_product_id(
         session=session,
         product_id=product_id
     )
     if not product_analytics:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product_analytics
+    pending_count = product_analytics_service.query_count_buffer.pending(
+        product_id)
+    return ProductAnalyticsPublic.model_validate(
+        product_analytics,
+        update={"query_count": product_analytics.query_count + pending_count}
+    )
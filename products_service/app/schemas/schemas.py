@@ -1,6 +1,10 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import Any
+import uuid
+
+# 2: changes only hold the fields that changed.
+AUDIT_EVENT_SCHEMA_VERSION = 2
 
 
 class Message(BaseModel):
@@ -8,9 +12,20 @@ class Message(BaseModel):
 
 
 class AuditEvent(BaseModel):
+    event_id: uuid.UUID = Field(default_factory=uuid.uuid4)
+    schema_version: int = AUDIT_EVENT_SCHEMA_VERSION
     user: str
     action: str
     timestamp: datetime
     model: str
     record_id: Any
     changes: dict[str, Any]
+
+
+class CacheStats(BaseModel):
+    entries: int
+    size_bytes: int
+    max_bytes: int
+    hits: int
+    misses: int
+    evictions: int
@@ -0,0 +1,16 @@
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+import uuid
+
+from app.models.product_analytics_models import ProductAnalytics
+
+
+async def get_product_analytics_by_product_id(
+    *,
+    session: AsyncSession,
+    product_id: uuid.UUID
+) -> ProductAnalytics | None:
+    statement = select(ProductAnalytics).where(
+        ProductAnalytics.product_id == product_id)
+    product_analytics = (await session.exec(statement)).first()
+    return product_analytics
@@ -0,0 +1,130 @@
+from collections.abc import AsyncIterator
+from datetime import datetime
+from typing import Any
+from sqlalchemy import Row
+from sqlmodel.ext.asyncio.session import AsyncSession
+import uuid
+
+from app.models.product_models import Product, ProductFilters, ProductSort
+from app.services.product_service import (
+    DEFAULT_PAGE_SIZE,
+    ESTIMATE_PRODUCTS_COUNT_SQL,
+    EXPORT_BATCH_SIZE,
+    catalog_generation_statement,
+    count_products_statement,
+    export_products_statement,
+    product_fields_statement,
+    products_by_ids_statement,
+    products_page_statement,
+    search_products_statement
+)
+
+
+async def get_products(
+    *,
+    session: AsyncSession,
+    limit: int = DEFAULT_PAGE_SIZE,
+    filters: ProductFilters | None = None,
+    sort: ProductSort = "id",
+    after: list[Any] | None = None,
+    fields: list[str] | None = None
+) -> list[Product] | list[Row]:
+    statement = products_page_statement(
+        limit=limit,
+        filters=filters,
+        sort=sort,
+        after=after,
+        fields=fields
+    )
+    products = (await session.exec(statement)).all()
+    return products
+
+
+async def search_products(
+    *,
+    session: AsyncSession,
+    query: str,
+    limit: int = DEFAULT_PAGE_SIZE,
+    after: tuple[float, uuid.UUID] | None = None
+) -> list[tuple[Product, float]]:
+    statement = search_products_statement(
+        query=query,
+        dialect_name=session.bind.dialect.name,
+        limit=limit,
+        after=after
+    )
+    return (await session.exec(statement)).all()
+
+
+async def stream_products(
+    *,
+    session: AsyncSession,
+    brand: str | None = None,
+    updated_since: datetime | None = None,
+    batch_size: int = EXPORT_BATCH_SIZE
+) -> AsyncIterator[list[Product]]:
+    """
+    Yield the catalog in batches read from a server-side cursor, so memory
+    stays bounded by batch_size instead of the catalog size.
+    """
+    statement = export_products_statement(
+        brand=brand,
+        updated_since=updated_since,
+        batch_size=batch_size
+    )
+    result = await session.stream_scalars(statement)
+    async for batch in result.partitions():
+        yield batch
+
+
+async def get_catalog_generation(*, session: AsyncSession) -> int:
+    return (await session.exec(catalog_generation_statement())).one()
+
+
+async def count_products(
+    *,
+    session: AsyncSession,
+    filters: ProductFilters | None = None
+) -> int:
+    return (await session.exec(count_products_statement(filters))).one()
+
+
+async def estimate_products_count(*, session: AsyncSession) -> int:
+    if session.bind.dialect.name == "postgresql":
+        estimate = (await session.exec(ESTIMATE_PRODUCTS_COUNT_SQL)).scalar()
+        if estimate is not None and estimate >= 0:
+            return estimate
+    return await count_products(session=session)
+
+
+async def get_product_by_id(
+    *,
+    session: AsyncSession,
+    product_id: uuid.UUID
+) -> Product | None:
+    product = await session.get(Product, product_id)
+    return product
+
+
+async def get_product_fields(
+    *,
+    session: AsyncSession,
+    product_id: uuid.UUID,
+    fields: list[str]
+) -> Row | None:
+    statement = product_fields_statement(product_id=product_id, fields=fields)
+    return (await session.exec(statement)).first()
+
+
+async def get_products_by_ids(
+    *,
+    session: AsyncSession,
+    product_ids: list[uuid.UUID],
+    fields: list[str] | None = None
+) -> list[Product] | list[Row]:
+    statement = products_by_ids_statement(
+        product_ids=product_ids,
+        dialect_name=session.bind.dialect.name,
+        fields=fields
+    )
+    return (await session.exec(statement)).all()
@@ -1,27 +1,286 @@
+from concurrent.futures import Future
+from typing import NamedTuple
 from dotenv import load_dotenv
+import threading
+import logging
+import msgpack
+import queue
+import json
 import pika
 import os
 
-from app.schemas.schemas import AuditEvent
+from app.utils.circuit_breaker import CircuitBreaker
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 RABBITMQ_HOST = os.getenv("RABBITMQ_HOST")
 RABBITMQ_PORT = os.getenv("RABBITMQ_PORT")
 RABBITMQ_USER = os.getenv("RABBITMQ_USER")
 RABBITMQ_PASS = os.getenv("RABBITMQ_PASS")
-RABBITMQ_QUEUE = os.getenv("RABBITMQ_QUEUE")
-
-
-def emit_crud_event(event: AuditEvent) -> None:
-    rabbitmq_url = f"amqp://{RABBITMQ_USER}:{RABBITMQ_PASS}@{RABBITMQ_HOST}:{RABBITMQ_PORT}/"
-    connection_params = pika.URLParameters(rabbitmq_url)
-    connection = pika.BlockingConnection(connection_params)
-    channel = connection.channel()
-    message = event.model_dump_json()
-    channel.basic_publish(
-        exchange='',
-        routing_key=RABBITMQ_QUEUE,
-        body=message
-    )
-    connection.close()
+# Durable topic exchange events are published to. Consumers declare and
+# bind their own queues.
+RABBITMQ_EXCHANGE = os.getenv("RABBITMQ_EXCHANGE", "audit_events")
+RABBITMQ_PUBLISH_QUEUE_SIZE = int(
+    os.getenv("RABBITMQ_PUBLISH_QUEUE_SIZE", "10000")
+)
+RABBITMQ_PUBLISH_BATCH_SIZE = int(
+    os.getenv("RABBITMQ_PUBLISH_BATCH_SIZE", "100")
+)
+RABBITMQ_CONNECT_TIMEOUT_SECONDS = float(
+    os.getenv("RABBITMQ_CONNECT_TIMEOUT_SECONDS", "5")
+)
+# How long a publish may stay blocked by broker flow control before the
+# connection is dropped.
+RABBITMQ_PUBLISH_TIMEOUT_SECONDS = float(
+    os.getenv("RABBITMQ_PUBLISH_TIMEOUT_SECONDS", "10")
+)
+RABBITMQ_BREAKER_FAILURE_THRESHOLD = int(
+    os.getenv("RABBITMQ_BREAKER_FAILURE_THRESHOLD", "3")
+)
+RABBITMQ_BREAKER_RESET_SECONDS = float(
+    os.getenv("RABBITMQ_BREAKER_RESET_SECONDS", "30")
+)
+RABBITMQ_DRAIN_TIMEOUT_SECONDS = float(
+    os.getenv("RABBITMQ_DRAIN_TIMEOUT_SECONDS", "5")
+)
+
+# Wire format of published events, sent as the AMQP content_type so
+# consumers know how to decode them.
+RABBITMQ_CONTENT_TYPE = os.getenv("RABBITMQ_CONTENT_TYPE", "application/json")
+CONTENT_TYPE_JSON = "application/json"
+CONTENT_TYPE_MSGPACK = "application/msgpack"
+
+# For events staged before routing keys were stored.
+DEFAULT_ROUTING_KEY = "product.event"
+
+RABBITMQ_URL = f"amqp://{RABBITMQ_USER}:{RABBITMQ_PASS}@{RABBITMQ_HOST}:{RABBITMQ_PORT}/"
+
+
+def encode_message(message: str, content_type: str) -> bytes:
+    """
+    Encode a JSON message for the wire. Events are stored as JSON, so only
+    msgpack needs a conversion.
+    """
+    if content_type == CONTENT_TYPE_JSON:
+        return message.encode()
+    if content_type == CONTENT_TYPE_MSGPACK:
+        return msgpack.packb(json.loads(message))
+    raise ValueError(f"Unsupported content type {content_type}")
+
+
+class QueuedMessage(NamedTuple):
+    body: str
+    routing_key: str
+
+
+class EventPublisher:
+    """
+    Publishes messages over one long-lived connection owned by a dedicated
+    thread. Callers only enqueue, so request latency never includes a broker
+    handshake. Messages are published in batches inside an AMQP transaction,
+    which gives one broker acknowledgement per batch instead of per message.
+
+    A batch is tried once, failures are left to the caller to retry. The
+    circuit breaker refuses new messages while the broker keeps failing,
+    then lets one message through as a probe.
+    """
+
+    def __init__(
+        self,
+        *,
+        url: str,
+        exchange: str,
+        max_queue_size: int,
+        batch_size: int,
+        drain_timeout: float,
+        content_type: str = CONTENT_TYPE_JSON,
+        connect_timeout: float = RABBITMQ_CONNECT_TIMEOUT_SECONDS,
+        publish_timeout: float = RABBITMQ_PUBLISH_TIMEOUT_SECONDS,
+        breaker: CircuitBreaker | None = None
+    ) -> None:
+        if content_type not in (CONTENT_TYPE_JSON, CONTENT_TYPE_MSGPACK):
+            raise ValueError(f"Unsupported content type {content_type}")
+        self.url = url
+        self.exchange = exchange
+        self.content_type = content_type
+        self.connect_timeout = connect_timeout
+        self.publish_timeout = publish_timeout
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=RABBITMQ_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=RABBITMQ_BREAKER_RESET_SECONDS
+        )
+        self.batch_size = batch_size
+        self.drain_timeout = drain_timeout
+        self._queue: queue.Queue[tuple[QueuedMessage, Future]] = queue.Queue(
+            maxsize=max_queue_size)
+        self._connection: pika.BlockingConnection | None = None
+        self._channel = None
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, message: str, routing_key: str | None = None) -> Future:
+        """
+        Queue message for publishing under routing_key, DEFAULT_ROUTING_KEY
+        if None. Raises queue.Full when the publisher is falling behind and
+        CircuitOpenError while the broker is down.
+        """
+        self.start()
+        self.breaker.check()
+        future: Future = Future()
+        queued = QueuedMessage(message, routing_key or DEFAULT_ROUTING_KEY)
+        try:
+            self._queue.put_nowait((queued, future))
+        except queue.Full:
+            self.breaker.release()
+            raise
+        return future
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(
+                target=self._run,
+                name="event-publisher",
+                daemon=True
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Drain queued messages for up to drain_timeout seconds, then fail
+        whatever is still pending.
+        """
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(self.drain_timeout)
+            if self._thread.is_alive():
+                logger.warning("Event publisher did not drain in time")
+            self._thread = None
+        self._fail_pending()
+
+    def _run(self) -> None:
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                self._heartbeat()
+                continue
+            self._publish(batch)
+        self._disconnect()
+
+    def _next_batch(self) -> list[tuple[QueuedMessage, Future]]:
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _publish(self, batch: list[tuple[QueuedMessage, Future]]) -> None:
+        # Callers may cancel messages they stopped waiting for.
+        batch = [
+            (message, future) for message, future in batch
+            if future.set_running_or_notify_cancel()
+        ]
+        if not batch:
+            # Nothing was sent, a cancelled probe must not hold the
+            # circuit half open.
+            self.breaker.release()
+            return
+        try:
+            self._publish_batch(batch)
+        except Exception as exc:
+            logger.exception("Could not publish %d events", len(batch))
+            self.breaker.record_failure()
+            self._disconnect()
+            for _, future in batch:
+                future.set_exception(
+                    ConnectionError(f"Could not publish: {exc}"))
+            return
+        self.breaker.record_success()
+
+    def _publish_batch(self, batch: list[tuple[QueuedMessage, Future]]) -> None:
+        channel = self._get_channel()
+        properties = pika.BasicProperties(
+            content_type=self.content_type,
+            delivery_mode=pika.DeliveryMode.Persistent
+        )
+        for message, _ in batch:
+            channel.basic_publish(
+                exchange=self.exchange,
+                routing_key=message.routing_key,
+                body=encode_message(message.body, self.content_type),
+                properties=properties
+            )
+        # One round trip confirms the whole batch, see _get_channel.
+        channel.tx_commit()
+        for _, future in batch:
+            future.set_result(None)
+
+    def _get_channel(self):
+        if self._channel is None or not self._channel.is_open:
+            self._disconnect()
+            parameters = pika.URLParameters(self.url)
+            parameters.socket_timeout = self.connect_timeout
+            parameters.stack_timeout = self.connect_timeout
+            parameters.blocked_connection_timeout = self.publish_timeout
+            self._connection = pika.BlockingConnection(parameters)
+            self._channel = self._connection.channel()
+            self._channel.exchange_declare(
+                exchange=self.exchange,
+                exchange_type="topic",
+                durable=True
+            )
+            # Transactions rather than publisher confirms: with
+            # confirm_delivery() a BlockingChannel waits for the ack of
+            # every basic_publish, a round trip per message. pika only
+            # batches confirms on its asynchronous connections, so
+            # tx_commit is the one way to get a single acknowledgement
+            # per batch on a blocking connection.
+            self._channel.tx_select()
+        return self._channel
+
+    def _heartbeat(self) -> None:
+        if self._connection is None or not self._connection.is_open:
+            return
+        try:
+            self._connection.process_data_events(time_limit=0)
+        except Exception:
+            logger.exception("Lost connection to the event broker")
+            self._disconnect()
+
+    def _disconnect(self) -> None:
+        connection, self._connection, self._channel = self._connection, None, None
+        if connection is not None and connection.is_open:
+            try:
+                connection.close()
+            except Exception:
+                logger.exception("Could not close the event broker connection")
+
+    def _fail_pending(self) -> None:
+        while True:
+            try:
+                _, future = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            future.set_exception(
+                ConnectionError("Publisher stopped before publishing"))
+
+
+event_publisher = EventPublisher(
+    url=RABBITMQ_URL,
+    exchange=RABBITMQ_EXCHANGE,
+    max_queue_size=RABBITMQ_PUBLISH_QUEUE_SIZE,
+    batch_size=RABBITMQ_PUBLISH_BATCH_SIZE,
+    drain_timeout=RABBITMQ_DRAIN_TIMEOUT_SECONDS,
+    content_type=RABBITMQ_CONTENT_TYPE
+)
+
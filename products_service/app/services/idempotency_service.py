@@ -0,0 +1,401 @@
+from collections.abc import Callable
+from datetime import datetime, timedelta, timezone
+from typing import BinaryIO
+from dotenv import load_dotenv
+from jwt.exceptions import InvalidTokenError
+from sqlalchemy import and_, delete, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import tempfile
+import uuid
+import hashlib
+import time
+import jwt
+import os
+
+from app.dependencies.dependencies import async_session_factory
+from app.models.idempotency_models import IdempotencyKey
+from app.utils.security import ALGORITHM, SECRET_KEY
+
+load_dotenv()
+
+IDEMPOTENCY_KEY_TTL_SECONDS = int(
+    os.getenv("IDEMPOTENCY_KEY_TTL_SECONDS", str(24 * 60 * 60))
+)
+IDEMPOTENCY_PURGE_INTERVAL_SECONDS = int(
+    os.getenv("IDEMPOTENCY_PURGE_INTERVAL_SECONDS", "300")
+)
+# How long a request may hold its key before a retry can take it over,
+# in case it crashed or was cancelled. Keep it above the request timeout.
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+IDEMPOTENT_METHODS = ("POST", "PATCH", "DELETE")
+# Request bodies larger than this are spooled to disk while the request
+# is fingerprinted, so large uploads are never held in memory.
+REQUEST_SPOOL_MAX_MEMORY_BYTES = 1024 * 1024
+REQUEST_SPOOL_CHUNK_BYTES = 64 * 1024
+REPLAYED_HEADER = (b"idempotent-replayed", b"true")
+
+
+async def get_idempotency_key(
+    *,
+    session: AsyncSession,
+    principal: str,
+    key: str
+) -> IdempotencyKey | None:
+    now = datetime.now(timezone.utc)
+    statement = select(IdempotencyKey).where(
+        IdempotencyKey.principal == principal,
+        IdempotencyKey.key == key,
+        IdempotencyKey.expires_at > now,
+        or_(
+            IdempotencyKey.status_code.is_not(None),
+            IdempotencyKey.locked_until > now
+        )
+    )
+    return (await session.exec(statement)).first()
+
+
+async def reserve_idempotency_key(
+    *,
+    session: AsyncSession,
+    principal: str,
+    key: str,
+    fingerprint: str,
+    ttl_seconds: int = IDEMPOTENCY_KEY_TTL_SECONDS,
+    lock_seconds: int = IDEMPOTENCY_LOCK_SECONDS
+) -> str | None:
+    """
+    Record key as in progress and return the lease the request holds it
+    by. Returns None when another request holds it or its response is
+    stored, which is how concurrent first attempts are told apart. A
+    reservation whose lock ran out without a response is taken over.
+    """
+    now = datetime.now(timezone.utc)
+    await session.exec(delete(IdempotencyKey).where(
+        IdempotencyKey.principal == principal,
+        IdempotencyKey.key == key,
+        or_(
+            IdempotencyKey.expires_at <= now,
+            and_(
+                IdempotencyKey.status_code.is_(None),
+                IdempotencyKey.locked_until <= now
+            )
+        )
+    ))
+    lease = uuid.uuid4().hex
+    session.add(IdempotencyKey(
+        principal=principal,
+        key=key,
+        fingerprint=fingerprint,
+        lease=lease,
+        locked_until=now + timedelta(seconds=lock_seconds),
+        expires_at=now + timedelta(seconds=ttl_seconds)
+    ))
+    try:
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        return None
+    return lease
+
+
+async def complete_idempotency_key(
+    *,
+    session: AsyncSession,
+    principal: str,
+    key: str,
+    lease: str,
+    status_code: int,
+    headers: list[list[str]],
+    body: bytes
+) -> None:
+    # A request whose key was taken over leaves the new holder alone.
+    await session.exec(update(IdempotencyKey).where(
+        IdempotencyKey.principal == principal,
+        IdempotencyKey.key == key,
+        IdempotencyKey.lease == lease
+    ).values(status_code=status_code, headers=headers, body=body))
+    await session.commit()
+
+
+async def release_idempotency_key(
+    *,
+    session: AsyncSession,
+    principal: str,
+    key: str,
+    lease: str
+) -> None:
+    await session.exec(delete(IdempotencyKey).where(
+        IdempotencyKey.principal == principal,
+        IdempotencyKey.key == key,
+        IdempotencyKey.lease == lease
+    ))
+    await session.commit()
+
+
+async def purge_expired_idempotency_keys(*, session: AsyncSession) -> int:
+    result = await session.exec(delete(IdempotencyKey).where(
+        IdempotencyKey.expires_at <= datetime.now(timezone.utc)))
+    await session.commit()
+    return result.rowcount
+
+
+class IdempotencyKeys:
+    """
+    Idempotency key storage used by IdempotencyMiddleware. Expired keys are
+    ignored right away and deleted at most every purge_interval_seconds,
+    when a new key is reserved.
+    """
+
+    def __init__(
+        self,
+        *,
+        session_factory: Callable[[], AsyncSession],
+        ttl_seconds: int,
+        lock_seconds: int,
+        purge_interval_seconds: int
+    ) -> None:
+        self.session_factory = session_factory
+        self.ttl_seconds = ttl_seconds
+        self.lock_seconds = lock_seconds
+        self.purge_interval_seconds = purge_interval_seconds
+        self._next_purge_at = 0.0
+
+    async def get(self, principal: str, key: str) -> IdempotencyKey | None:
+        async with self.session_factory() as session:
+            return await get_idempotency_key(
+                session=session, principal=principal, key=key)
+
+    async def reserve(
+        self,
+        principal: str,
+        key: str,
+        fingerprint: str
+    ) -> str | None:
+        async with self.session_factory() as session:
+            if time.monotonic() >= self._next_purge_at:
+                self._next_purge_at = (
+                    time.monotonic() + self.purge_interval_seconds)
+                await purge_expired_idempotency_keys(session=session)
+            return await reserve_idempotency_key(
+                session=session,
+                principal=principal,
+                key=key,
+                fingerprint=fingerprint,
+                ttl_seconds=self.ttl_seconds,
+                lock_seconds=self.lock_seconds
+            )
+
+    async def complete(
+        self,
+        principal: str,
+        key: str,
+        lease: str,
+        *,
+        status_code: int,
+        headers: list[list[str]],
+        body: bytes
+    ) -> None:
+        async with self.session_factory() as session:
+            await complete_idempotency_key(
+                session=session,
+                principal=principal,
+                key=key,
+                lease=lease,
+                status_code=status_code,
+                headers=headers,
+                body=body
+            )
+
+    async def release(self, principal: str, key: str, lease: str) -> None:
+        async with self.session_factory() as session:
+            await release_idempotency_key(
+                session=session, principal=principal, key=key, lease=lease)
+
+
+idempotency_keys = IdempotencyKeys(
+    session_factory=async_session_factory,
+    ttl_seconds=IDEMPOTENCY_KEY_TTL_SECONDS,
+    lock_seconds=IDEMPOTENCY_LOCK_SECONDS,
+    purge_interval_seconds=IDEMPOTENCY_PURGE_INTERVAL_SECONDS
+)
+
+
+class IdempotencyMiddleware:
+    """
+    Makes POST, PATCH and DELETE requests sent with an Idempotency-Key
+    header safe to retry. The first response below 500 is stored with a
+    fingerprint of the request, and retries get it back from one primary
+    key lookup instead of running the endpoint again. Keys are scoped to
+    the token subject, requests without a valid token pass through.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        keys: IdempotencyKeys = idempotency_keys
+    ) -> None:
+        self.app = app
+        self.keys = keys
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in IDEMPOTENT_METHODS:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        key = headers.get("idempotency-key")
+        principal = _token_subject(headers.get("authorization"))
+        if key is None or principal is None:
+            await self.app(scope, receive, send)
+            return
+        if not 0 < len(key) <= IDEMPOTENCY_KEY_MAX_LENGTH:
+            response = JSONResponse(
+                {"detail": "Invalid Idempotency-Key header"}, status_code=400)
+            await response(scope, receive, send)
+            return
+
+        with tempfile.SpooledTemporaryFile(
+            max_size=REQUEST_SPOOL_MAX_MEMORY_BYTES
+        ) as body:
+            spooled = await _spool_request(scope, receive, body)
+            if spooled is None:
+                return
+            fingerprint, size = spooled
+            stored = await self.keys.get(principal, key)
+            lease = None
+            if stored is None:
+                lease = await self.keys.reserve(principal, key, fingerprint)
+            if lease is not None:
+                body.seek(0)
+                await self._run(
+                    scope, receive, send,
+                    principal=principal, key=key, lease=lease,
+                    body=body, size=size
+                )
+                return
+        await _stored_response(stored, fingerprint)(scope, receive, send)
+
+    async def _run(
+        self,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+        *,
+        principal: str,
+        key: str,
+        lease: str,
+        body: BinaryIO,
+        size: int
+    ) -> None:
+        more_body = True
+        status_code = 500
+        response_headers: list[list[str]] = []
+        chunks: list[bytes] = []
+
+        async def receive_spooled() -> Message:
+            nonlocal more_body
+            if not more_body:
+                return await receive()
+            chunk = body.read(REQUEST_SPOOL_CHUNK_BYTES)
+            more_body = body.tell() < size
+            return {"type": "http.request", "body": chunk, "more_body": more_body}
+
+        async def send_captured(message: Message) -> None:
+            nonlocal status_code, response_headers
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                response_headers = [
+                    [name.decode("latin-1"), value.decode("latin-1")]
+                    for name, value in message.get("headers", [])
+                ]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_spooled, send_captured)
+        except BaseException:
+            await self.keys.release(principal, key, lease)
+            raise
+        # Server errors are not stored, so the request can be retried.
+        if status_code >= 500:
+            await self.keys.release(principal, key, lease)
+            return
+        await self.keys.complete(
+            principal,
+            key,
+            lease,
+            status_code=status_code,
+            headers=response_headers,
+            body=b"".join(chunks)
+        )
+
+
+def _token_subject(authorization: str | None) -> str | None:
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except InvalidTokenError:
+        return None
+    subject = payload.get("sub")
+    return str(subject) if subject is not None else None
+
+
+async def _spool_request(
+    scope: Scope,
+    receive: Receive,
+    file: BinaryIO
+) -> tuple[str, int] | None:
+    """
+    Copy the request body into file. Returns the request fingerprint and
+    the body size, or None if the client disconnected. The fingerprint
+    covers If-Match, so a retry expecting another version is a different
+    request.
+    """
+    digest = hashlib.sha256()
+    if_match = Headers(scope=scope).get("if-match", "")
+    for part in (scope["method"], scope["path"], if_match):
+        digest.update(part.encode() + b"\n")
+    digest.update(scope["query_string"] + b"\n")
+    size = 0
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunk = message.get("body", b"")
+        digest.update(chunk)
+        file.write(chunk)
+        size += len(chunk)
+        more_body = message.get("more_body", False)
+    return digest.hexdigest(), size
+
+
+def _stored_response(
+    stored: IdempotencyKey | None,
+    fingerprint: str
+) -> Response:
+    if stored is not None and stored.fingerprint != fingerprint:
+        return JSONResponse(
+            {"detail": "Idempotency-Key was used for a different request"},
+            status_code=422
+        )
+    if stored is None or stored.status_code is None:
+        return JSONResponse(
+            {"detail": "A request with this Idempotency-Key is in progress"},
+            status_code=409
+        )
+    response = Response(content=stored.body, status_code=stored.status_code)
+    response.raw_headers = [
+        (name.encode("latin-1"), value.encode("latin-1"))
+        for name, value in stored.headers
+    ]
+    response.raw_headers.append(REPLAYED_HEADER)
+    return response
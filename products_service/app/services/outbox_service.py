@@ -0,0 +1,239 @@
+from collections.abc import Callable
+from concurrent.futures import Future, wait
+from datetime import datetime, timedelta, timezone
+from typing import Protocol
+from dotenv import load_dotenv
+from sqlalchemy import delete
+from sqlmodel import Session, select
+import threading
+import logging
+import queue
+import time
+import uuid
+import os
+
+from app.db.connection import engine
+from app.models.outbox_models import OutboxEvent
+from app.schemas.schemas import AuditEvent
+from app.services.event_publisher_service import event_publisher
+from app.utils.circuit_breaker import CircuitOpenError
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_RELAY_ENABLED = os.getenv(
+    "OUTBOX_RELAY_ENABLED", "true").lower() == "true"
+OUTBOX_RELAY_BATCH_SIZE = int(os.getenv("OUTBOX_RELAY_BATCH_SIZE", "100"))
+OUTBOX_RELAY_POLL_INTERVAL_MS = int(
+    os.getenv("OUTBOX_RELAY_POLL_INTERVAL_MS", "500")
+)
+OUTBOX_PUBLISH_TIMEOUT_SECONDS = float(
+    os.getenv("OUTBOX_PUBLISH_TIMEOUT_SECONDS", "10")
+)
+# Sent events are kept this long, for replays and debugging, then deleted.
+OUTBOX_RETENTION_SECONDS = int(
+    os.getenv("OUTBOX_RETENTION_SECONDS", str(7 * 24 * 60 * 60))
+)
+OUTBOX_PURGE_INTERVAL_SECONDS = int(
+    os.getenv("OUTBOX_PURGE_INTERVAL_SECONDS", "300")
+)
+OUTBOX_PURGE_BATCH_SIZE = int(os.getenv("OUTBOX_PURGE_BATCH_SIZE", "1000"))
+
+
+class Publisher(Protocol):
+    def submit(self, message: str, routing_key: str | None = None) -> Future: ...
+
+
+def event_routing_key(event: AuditEvent) -> str:
+    """
+    Topic routing key for event, "<model>.<action>" with the words of the
+    action joined by underscores, e.g. product.soft_delete.
+    """
+    action = "_".join(event.action.lower().split())
+    return f"{event.model.lower()}.{action}"
+
+
+def add_event(*, session: Session, event: AuditEvent) -> OutboxEvent:
+    """
+    Stage event in the caller's transaction, it is only published once that
+    transaction commits.
+    """
+    db_obj = OutboxEvent(
+        payload=event.model_dump_json(),
+        routing_key=event_routing_key(event)
+    )
+    session.add(db_obj)
+    return db_obj
+
+
+def relay_pending_events(
+    *,
+    session: Session,
+    publisher: Publisher,
+    batch_size: int = OUTBOX_RELAY_BATCH_SIZE,
+    publish_timeout: float = OUTBOX_PUBLISH_TIMEOUT_SECONDS
+) -> int:
+    """
+    Publish one batch of unsent events and mark the confirmed ones as sent.
+    Rows are locked with SKIP LOCKED, so concurrent relays work on disjoint
+    batches. Delivery is at least once: an event whose publish was already
+    in progress when publish_timeout ran out is published again later.
+    Returns the number of events sent.
+    """
+    statement = (
+        select(OutboxEvent)
+        .where(OutboxEvent.sent_at == None)
+        .order_by(OutboxEvent.created_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    events = session.exec(statement).all()
+    if not events:
+        session.commit()
+        return 0
+
+    futures: dict[uuid.UUID, Future] = {}
+    for event in events:
+        try:
+            futures[event.id] = publisher.submit(
+                event.payload, event.routing_key)
+        except (queue.Full, CircuitOpenError):
+            # Left pending, the outbox is the spool while the broker is
+            # unavailable.
+            break
+    wait(futures.values(), timeout=publish_timeout)
+    for future in futures.values():
+        # Not yet handed to the broker, the next relay run picks it up again.
+        future.cancel()
+
+    sent_at = datetime.now(timezone.utc)
+    sent = 0
+    for event in events:
+        future = futures.get(event.id)
+        if future is None:
+            continue
+        event.attempts += 1
+        if (
+            future.done() and not future.cancelled()
+            and future.exception() is None
+        ):
+            event.sent_at = sent_at
+            sent += 1
+        session.add(event)
+    session.commit()
+    return sent
+
+
+def purge_sent_events(
+    *,
+    session: Session,
+    retention_seconds: int = OUTBOX_RETENTION_SECONDS,
+    batch_size: int = OUTBOX_PURGE_BATCH_SIZE
+) -> int:
+    """
+    Delete events sent more than retention_seconds ago, batch_size rows per
+    transaction so the purge never holds long locks. Returns the number of
+    events deleted.
+    """
+    sent_before = datetime.now(timezone.utc) - timedelta(
+        seconds=retention_seconds)
+    purged = 0
+    while True:
+        expired = (
+            select(OutboxEvent.id)
+            .where(OutboxEvent.sent_at < sent_before)
+            .limit(batch_size)
+        )
+        deleted = session.exec(
+            delete(OutboxEvent).where(OutboxEvent.id.in_(expired))).rowcount
+        session.commit()
+        purged += deleted
+        if deleted < batch_size:
+            return purged
+
+
+class OutboxRelay:
+    """
+    Background loop draining the outbox into the event broker. Sent events
+    older than retention_seconds are deleted at most every
+    purge_interval_seconds.
+    """
+
+    def __init__(
+        self,
+        *,
+        session_factory: Callable[[], Session],
+        publisher: Publisher,
+        enabled: bool,
+        batch_size: int,
+        poll_interval_ms: int,
+        retention_seconds: int,
+        purge_interval_seconds: int
+    ) -> None:
+        self.session_factory = session_factory
+        self.publisher = publisher
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.poll_interval_ms = poll_interval_ms
+        self.retention_seconds = retention_seconds
+        self.purge_interval_seconds = purge_interval_seconds
+        self._next_purge_at = 0.0
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            name="outbox-relay",
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                with self.session_factory() as session:
+                    sent = relay_pending_events(
+                        session=session,
+                        publisher=self.publisher,
+                        batch_size=self.batch_size
+                    )
+            except Exception:
+                logger.exception("Outbox relay failed")
+                sent = 0
+            if time.monotonic() >= self._next_purge_at:
+                self._next_purge_at = (
+                    time.monotonic() + self.purge_interval_seconds)
+                self._purge()
+            # A full batch means there is probably more waiting.
+            if sent < self.batch_size:
+                self._stopped.wait(self.poll_interval_ms / 1000)
+
+    def _purge(self) -> None:
+        try:
+            with self.session_factory() as session:
+                purge_sent_events(
+                    session=session, retention_seconds=self.retention_seconds)
+        except Exception:
+            logger.exception("Outbox purge failed")
+
+
+outbox_relay = OutboxRelay(
+    session_factory=lambda: Session(engine),
+    publisher=event_publisher,
+    enabled=OUTBOX_RELAY_ENABLED,
+    batch_size=OUTBOX_RELAY_BATCH_SIZE,
+    poll_interval_ms=OUTBOX_RELAY_POLL_INTERVAL_MS,
+    retention_seconds=OUTBOX_RETENTION_SECONDS,
+    purge_interval_seconds=OUTBOX_PURGE_INTERVAL_SECONDS
+)
@@ -1,40 +1,200 @@
+from collections.abc import Callable, Iterable
 from sqlmodel import Session, select
+from dotenv import load_dotenv
+import threading
+import logging
+import os
 
-from app.models.product_analytics_models import ProductAnalyticsCreate, ProductAnalytics
+from app.db.connection import engine
+from app.db.upsert import dialect_insert
+from app.models.product_analytics_models import ProductAnalytics
 from datetime import datetime, timezone
 import uuid
 
+load_dotenv()
 
-def init_product_analytics(
+logger = logging.getLogger(__name__)
+
+QUERY_COUNT_FLUSH_INTERVAL_MS = int(
+    os.getenv("QUERY_COUNT_FLUSH_INTERVAL_MS", "1000")
+)
+QUERY_COUNT_FLUSH_THRESHOLD = int(
+    os.getenv("QUERY_COUNT_FLUSH_THRESHOLD", "1000")
+)
+
+
+def init_products_analytics(
     *,
     session: Session,
-    product_id: str
-) -> ProductAnalytics:
-    db_obj = ProductAnalytics.model_validate(
-        ProductAnalyticsCreate(product_id=product_id, query_count=0))
-    session.add(db_obj)
-    session.commit()
-    session.refresh(db_obj)
-    return db_obj
+    product_ids: list[uuid.UUID]
+) -> None:
+    """
+    Create the missing analytics rows for product_ids in one statement,
+    without committing.
+    """
+    if not product_ids:
+        return
+    insert = dialect_insert(session)
+    table = ProductAnalytics.__table__
+    statement = insert(table).values([
+        {"id": uuid.uuid4(), "product_id": product_id, "query_count": 0}
+        for product_id in sorted(product_ids)
+    ]).on_conflict_do_nothing(index_elements=[table.c.product_id])
+    session.exec(statement)
 
 
-def increment_anonymous_query_count(
+def upsert_query_counts(
     *,
     session: Session,
-    product_id: uuid.UUID
+    counts: dict[uuid.UUID, tuple[int, datetime]]
 ) -> None:
-    statement = select(ProductAnalytics).where(
-        ProductAnalytics.product_id == product_id)
-    product_analytics = session.exec(statement).first()
-    if product_analytics:
-        new_count = product_analytics.query_count + 1
-        product_analytics.sqlmodel_update(
-            {"query_count": new_count, "last_queried_at": datetime.now(timezone.utc)})
-        session.add(product_analytics)
-        session.commit()
-        session.refresh(product_analytics)
-    else:
-        init_product_analytics(session=session, product_id=product_id)
+    """
+    Add the buffered deltas to product_query_logs with a single multi-row
+    INSERT ... ON CONFLICT (product_id) DO UPDATE.
+    """
+    if not counts:
+        return
+    insert = dialect_insert(session)
+    table = ProductAnalytics.__table__
+    # Rows go in a stable order so concurrent flushes from several workers
+    # lock them in the same sequence and cannot deadlock.
+    rows = [
+        {
+            "id": uuid.uuid4(),
+            "product_id": product_id,
+            "query_count": delta,
+            "last_queried_at": last_queried_at,
+        }
+        for product_id, (delta, last_queried_at) in sorted(counts.items())
+    ]
+    statement = insert(table).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.product_id],
+        set_={
+            "query_count": table.c.query_count + statement.excluded.query_count,
+            "last_queried_at": statement.excluded.last_queried_at,
+        }
+    )
+    session.exec(statement)
+    session.commit()
+
+
+class QueryCountBuffer:
+    """
+    Aggregates anonymous query increments in memory and writes them behind
+    the request, every flush_interval_ms or once flush_threshold increments
+    are pending, whichever comes first.
+    """
+
+    def __init__(
+        self,
+        *,
+        session_factory: Callable[[], Session],
+        flush_interval_ms: int,
+        flush_threshold: int
+    ) -> None:
+        self.session_factory = session_factory
+        self.flush_interval_ms = flush_interval_ms
+        self.flush_threshold = flush_threshold
+        self._counts: dict[uuid.UUID, tuple[int, datetime]] = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def add(self, product_id: uuid.UUID, count: int = 1) -> None:
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            delta, _ = self._counts.get(product_id, (0, now))
+            self._counts[product_id] = (delta + count, now)
+            self._pending += count
+            if self._pending >= self.flush_threshold:
+                self._wakeup.set()
+
+    def add_many(self, product_ids: Iterable[uuid.UUID]) -> None:
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            for product_id in product_ids:
+                delta, _ = self._counts.get(product_id, (0, now))
+                self._counts[product_id] = (delta + 1, now)
+                self._pending += 1
+            if self._pending >= self.flush_threshold:
+                self._wakeup.set()
+
+    def pending(self, product_id: uuid.UUID) -> int:
+        with self._lock:
+            delta, _ = self._counts.get(product_id, (0, None))
+            return delta
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._lock:
+                counts, self._counts = self._counts, {}
+                self._pending = 0
+            if not counts:
+                return
+            try:
+                with self.session_factory() as session:
+                    upsert_query_counts(session=session, counts=counts)
+            except Exception:
+                logger.exception("Could not flush %d query counts", len(counts))
+                self._restore(counts)
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            name="query-count-flusher",
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval_ms / 1000)
+            self._wakeup.clear()
+            self.flush()
+
+    def _restore(self, counts: dict[uuid.UUID, tuple[int, datetime]]) -> None:
+        with self._lock:
+            for product_id, (delta, last_queried_at) in counts.items():
+                pending_delta, pending_at = self._counts.get(
+                    product_id, (0, last_queried_at))
+                self._counts[product_id] = (
+                    pending_delta + delta,
+                    max(pending_at, last_queried_at)
+                )
+                self._pending += delta
+
+
+query_count_buffer = QueryCountBuffer(
+    session_factory=lambda: Session(engine),
+    flush_interval_ms=QUERY_COUNT_FLUSH_INTERVAL_MS,
+    flush_threshold=QUERY_COUNT_FLUSH_THRESHOLD
+)
+
+
+def increment_anonymous_query_count(*, product_id: uuid.UUID) -> None:
+    query_count_buffer.add(product_id)
+
+
+def increment_anonymous_query_counts(
+    *,
+    product_ids: Iterable[uuid.UUID]
+) -> None:
+    query_count_buffer.add_many(product_ids)
 
 
 def get_product_analytics_by_product_id(*, session: Session, product_id: uuid.UUID) -> ProductAnalytics | None:
@@ -0,0 +1,127 @@
+from typing import NamedTuple
+from dotenv import load_dotenv
+import json
+from sqlmodel.ext.asyncio.session import AsyncSession
+import uuid
+import os
+
+from app.models.product_models import Product, ProductPublic
+from app.services import async_product_service
+from app.utils.cache import LRUCache
+from app.utils.fieldsets import dump_fields
+
+load_dotenv()
+
+PRODUCT_CACHE_MAX_BYTES = int(
+    os.getenv("PRODUCT_CACHE_MAX_BYTES", str(16 * 1024 * 1024))
+)
+PRODUCT_CACHE_TTL_SECONDS = float(
+    os.getenv("PRODUCT_CACHE_TTL_SECONDS", "60")
+)
+
+product_cache = LRUCache(
+    max_bytes=PRODUCT_CACHE_MAX_BYTES,
+    ttl_seconds=PRODUCT_CACHE_TTL_SECONDS
+)
+
+
+class ProductPayload(NamedTuple):
+    payload: bytes
+    version: int
+
+
+async def get_product_payload(
+    *,
+    session: AsyncSession,
+    product_id: uuid.UUID,
+    fields: list[str] | None = None
+) -> ProductPayload | None:
+    """
+    Serialized ProductPublic for product_id and its version, read from the
+    cache and loaded from the database on a miss. With fields only those
+    keys are returned, and a miss selects only those columns without
+    filling the cache.
+    """
+    cached = product_cache.get(product_id)
+    if cached is not None:
+        if fields is None:
+            return cached
+        return ProductPayload(
+            dump_fields(json.loads(cached.payload), fields), cached.version)
+
+    if fields is not None:
+        row = await async_product_service.get_product_fields(
+            session=session,
+            product_id=product_id,
+            fields=[*fields, "version"]
+        )
+        if row is None:
+            return None
+        return ProductPayload(dump_fields(row._mapping, fields), row.version)
+
+    product = await async_product_service.get_product_by_id(
+        session=session,
+        product_id=product_id
+    )
+    if not product:
+        return None
+    return _cache_product(product)
+
+
+async def get_product_payloads(
+    *,
+    session: AsyncSession,
+    product_ids: list[uuid.UUID],
+    fields: list[str] | None = None
+) -> dict[uuid.UUID, bytes]:
+    """
+    Serialized products for those of product_ids that exist. Cached ones
+    are read from the cache, all the misses are loaded with one query.
+    """
+    payloads = {}
+    misses = []
+    for product_id in product_ids:
+        cached = product_cache.get(product_id)
+        if cached is None:
+            misses.append(product_id)
+        elif fields is None:
+            payloads[product_id] = cached.payload
+        else:
+            payloads[product_id] = dump_fields(
+                json.loads(cached.payload), fields)
+    if not misses:
+        return payloads
+
+    products = await async_product_service.get_products_by_ids(
+        session=session,
+        product_ids=misses,
+        fields=fields
+    )
+    for product in products:
+        if fields is None:
+            payload = _cache_product(product).payload
+        else:
+            payload = dump_fields(product._mapping, fields)
+        payloads[product.id] = payload
+    return payloads
+
+
+def _cache_product(product: Product) -> ProductPayload:
+    cached = ProductPayload(
+        ProductPublic.model_validate(product).model_dump_json().encode(),
+        product.version
+    )
+    product_cache.set(product.id, cached, size=len(cached.payload))
+    return cached
+
+
+def invalidate_product(product_id: uuid.UUID) -> None:
+    product_cache.delete(product_id)
+
+
+def get_cache_stats() -> dict[str, int]:
+    return product_cache.stats()
+
+
+def invalidate_all_products() -> None:
+    product_cache.clear()
@@ -0,0 +1,567 @@
+from collections.abc import AsyncIterable, Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, BinaryIO
+from annotated_types import MaxLen
+from dotenv import load_dotenv
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Float,
+    Integer,
+    MetaData,
+    Table,
+    Text,
+    and_,
+    case,
+    cast,
+    false,
+    func,
+    literal,
+    null,
+    or_,
+    select,
+    true
+)
+from sqlalchemy.sql.elements import ColumnElement
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+import tempfile
+import threading
+import logging
+import csv
+import io
+import uuid
+import os
+
+from app.db.connection import engine
+from app.db.upsert import dialect_insert
+from app.models.import_models import ImportJob
+from app.models.product_analytics_models import ProductAnalytics
+from app.models.product_models import Product, ProductBase, ProductPublic
+from app.schemas.schemas import AuditEvent
+from app.services import outbox_service, product_cache_service
+from app.services.product_service import bump_catalog_generation
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_IMPORT_SPOOL_DIR = os.getenv("PRODUCT_IMPORT_SPOOL_DIR") or None
+PRODUCT_IMPORT_MAX_WORKERS = int(os.getenv("PRODUCT_IMPORT_MAX_WORKERS", "1"))
+PRODUCT_IMPORT_COPY_CHUNK_BYTES = int(
+    os.getenv("PRODUCT_IMPORT_COPY_CHUNK_BYTES", str(1024 * 1024))
+)
+PRODUCT_IMPORT_PROGRESS_BYTES = int(
+    os.getenv("PRODUCT_IMPORT_PROGRESS_BYTES", str(16 * 1024 * 1024))
+)
+PRODUCT_IMPORT_MAX_REPORTED_ERRORS = int(
+    os.getenv("PRODUCT_IMPORT_MAX_REPORTED_ERRORS", "100")
+)
+
+# The export columns, so an export can be imported back. Ids and versions
+# are ignored, products are matched by sku.
+IMPORT_FIELDS = list(ProductPublic.model_fields)
+REQUIRED_FIELDS = ["sku", "name", "price", "brand"]
+TEXT_FIELDS = ["sku", "name", "brand", "description"]
+# At most 30 digits, so the float cast can neither overflow nor underflow
+# and abort the whole import.
+PRICE_PATTERN = r"^\s*[0-9]{0,15}\.?[0-9]{1,15}\s*$"
+TRUE_VALUES = ["true", "t", "1"]
+BOOLEAN_VALUES = TRUE_VALUES + ["false", "f", "0"]
+# Rows per INSERT when the database has no COPY.
+STAGING_INSERT_BATCH_SIZE = 1000
+
+
+class ImportFileError(ValueError):
+    pass
+
+
+async def spool_upload(chunks: AsyncIterable[bytes]) -> tuple[str, int]:
+    """
+    Write the request body to a temporary file chunk by chunk, so the
+    upload never has to fit in memory. Returns the path and size in bytes.
+    Disk writes run in the thread pool, batched to
+    PRODUCT_IMPORT_COPY_CHUNK_BYTES, to keep them off the event loop.
+    """
+    size = 0
+    buffer = bytearray()
+    spool = await run_in_threadpool(
+        tempfile.NamedTemporaryFile,
+        dir=PRODUCT_IMPORT_SPOOL_DIR,
+        suffix=".csv",
+        delete=False
+    )
+    try:
+        with spool:
+            async for chunk in chunks:
+                buffer += chunk
+                size += len(chunk)
+                if len(buffer) >= PRODUCT_IMPORT_COPY_CHUNK_BYTES:
+                    await run_in_threadpool(spool.write, bytes(buffer))
+                    buffer.clear()
+            await run_in_threadpool(spool.write, bytes(buffer))
+            await run_in_threadpool(spool.flush)
+    except BaseException:
+        os.unlink(spool.name)
+        raise
+    return spool.name, size
+
+
+async def create_import_job(
+    *,
+    session: AsyncSession,
+    filename: str | None,
+    created_by: str | None,
+    bytes_total: int
+) -> ImportJob:
+    db_obj = ImportJob(
+        filename=filename,
+        created_by=created_by,
+        bytes_total=bytes_total
+    )
+    session.add(db_obj)
+    await session.commit()
+    await session.refresh(db_obj)
+    return db_obj
+
+
+async def get_import_job(
+    *,
+    session: AsyncSession,
+    job_id: uuid.UUID
+) -> ImportJob | None:
+    return await session.get(ImportJob, job_id)
+
+
+def read_header(file: BinaryIO) -> list[str]:
+    line = file.readline()
+    if not line.strip():
+        raise ImportFileError("The file has no header row.")
+    columns = [
+        column.strip()
+        for column in next(csv.reader([line.decode("utf-8-sig")]))
+    ]
+    unknown = [column for column in columns if column not in IMPORT_FIELDS]
+    if unknown:
+        raise ImportFileError(f"Unknown columns: {', '.join(unknown)}.")
+    missing = [field for field in REQUIRED_FIELDS if field not in columns]
+    if missing:
+        raise ImportFileError(f"Missing columns: {', '.join(missing)}.")
+    if len(set(columns)) != len(columns):
+        raise ImportFileError("The header repeats a column.")
+    return columns
+
+
+def staging_table(columns: list[str]) -> Table:
+    """
+    Temporary table holding the raw CSV values as text, so that bad values
+    are reported per row instead of aborting the load.
+    """
+    return Table(
+        "product_import_staging",
+        MetaData(),
+        # Position of the record in the file, not its line: quoted values
+        # may span lines.
+        Column("row_index", Integer, primary_key=True),
+        Column("error", Text),
+        *(Column(column, Text) for column in columns),
+        prefixes=["TEMPORARY"],
+        postgresql_on_commit="DROP"
+    )
+
+
+def copy_into_staging(
+    *,
+    session: Session,
+    staging: Table,
+    file: BinaryIO,
+    report_progress: Callable[[int], None]
+) -> int:
+    """
+    Stream the rest of file into staging and return the number of rows.
+    PostgreSQL gets the bytes as they are through COPY FROM STDIN, other
+    databases fall back to batched inserts.
+    """
+    columns = [column.name for column in staging.columns][2:]
+    connection = session.connection()
+    if connection.dialect.name != "postgresql":
+        return _insert_into_staging(
+            session=session,
+            staging=staging,
+            columns=columns,
+            file=file,
+            report_progress=report_progress
+        )
+
+    preparer = connection.dialect.identifier_preparer
+    statement = "COPY {} ({}) FROM STDIN WITH (FORMAT csv)".format(
+        preparer.format_table(staging),
+        ", ".join(preparer.quote(column) for column in columns)
+    )
+    cursor = connection.connection.cursor()
+    bytes_read = file.tell()
+    with cursor.copy(statement) as copy:
+        while chunk := file.read(PRODUCT_IMPORT_COPY_CHUNK_BYTES):
+            copy.write(chunk)
+            bytes_read += len(chunk)
+            report_progress(bytes_read)
+    return cursor.rowcount
+
+
+def _insert_into_staging(
+    *,
+    session: Session,
+    staging: Table,
+    columns: list[str],
+    file: BinaryIO,
+    report_progress: Callable[[int], None]
+) -> int:
+    reader = csv.reader(io.TextIOWrapper(file, encoding="utf-8", newline=""))
+    staged = 0
+    rows: list[dict[str, str | None]] = []
+    for values in reader:
+        if len(values) != len(columns):
+            raise ImportFileError(
+                f"Row {staged + len(rows) + 1}: expected {len(columns)} "
+                f"columns, got {len(values)}."
+            )
+        # COPY reads unquoted empty values as NULL.
+        rows.append({
+            column: value or None for column, value in zip(columns, values)
+        })
+        if len(rows) == STAGING_INSERT_BATCH_SIZE:
+            session.exec(staging.insert(), params=rows)
+            staged += len(rows)
+            rows = []
+            report_progress(file.tell())
+    if rows:
+        session.exec(staging.insert(), params=rows)
+        staged += len(rows)
+    return staged
+
+
+def validate_staged_rows(*, session: Session, staging: Table) -> None:
+    """
+    Set error on every staged row ProductCreate would reject, in one
+    UPDATE.
+    """
+    checks: list[tuple[ColumnElement[bool], str]] = []
+    for field in TEXT_FIELDS:
+        if field not in staging.c:
+            continue
+        column = staging.c[field]
+        if field in REQUIRED_FIELDS:
+            checks.append((
+                or_(column.is_(None), func.trim(column) == ""),
+                f"{field} is required"
+            ))
+        max_length = _max_length(field)
+        checks.append((
+            func.length(column) > max_length,
+            f"{field} must be at most {max_length} characters"
+        ))
+
+    price = staging.c.price
+    checks.append((
+        or_(price.is_(None), ~price.regexp_match(PRICE_PATTERN)),
+        "price must be a number"
+    ))
+    checks.append((cast(price, Float) <= 0, "price must be greater than 0"))
+
+    if "is_discontinued" in staging.c:
+        is_discontinued = staging.c.is_discontinued
+        checks.append((
+            and_(
+                is_discontinued.is_not(None),
+                func.lower(func.trim(is_discontinued)).not_in(BOOLEAN_VALUES)
+            ),
+            "is_discontinued must be true or false"
+        ))
+
+    session.exec(staging.update().values(error=case(*checks, else_=null())))
+
+
+def get_staged_errors(
+    *,
+    session: Session,
+    staging: Table
+) -> tuple[int, list[dict[str, Any]]]:
+    rejected = session.exec(
+        select(func.count())
+        .select_from(staging)
+        .where(staging.c.error.is_not(None))
+    ).scalar_one()
+    rows = session.exec(
+        select(staging.c.row_index, staging.c.sku, staging.c.error)
+        .where(staging.c.error.is_not(None))
+        .order_by(staging.c.row_index)
+        .limit(PRODUCT_IMPORT_MAX_REPORTED_ERRORS)
+    ).all()
+    errors = [
+        {"row": row, "sku": sku, "message": error}
+        for row, sku, error in rows
+    ]
+    return rejected, errors
+
+
+def merge_staged_rows(*, session: Session, staging: Table) -> tuple[int, int]:
+    """
+    Upsert the valid staged rows into product with one INSERT ... SELECT
+    ... ON CONFLICT (sku) DO UPDATE. When a sku appears on several rows
+    the last one wins. Columns missing from the file keep their current
+    values. Returns the number of created and updated products.
+    """
+    dialect_name = session.connection().dialect.name
+    table = Product.__table__
+    latest_rows = (
+        select(func.max(staging.c.row_index))
+        .where(staging.c.error.is_(None))
+        .group_by(staging.c.sku)
+    )
+    is_merged = staging.c.row_index.in_(latest_rows)
+
+    updated = session.exec(
+        select(func.count())
+        .select_from(staging.join(table, table.c.sku == staging.c.sku))
+        .where(is_merged)
+    ).scalar_one()
+
+    values: dict[str, Any] = {
+        "id": _new_uuid(dialect_name),
+        "name": staging.c.name,
+        "description": (
+            staging.c.description if "description" in staging.c else null()
+        ),
+        "sku": staging.c.sku,
+        "price": cast(staging.c.price, Float),
+        "brand": staging.c.brand,
+        "is_discontinued": (
+            case(
+                (
+                    func.lower(func.trim(staging.c.is_discontinued))
+                    .in_(TRUE_VALUES),
+                    true()
+                ),
+                else_=false()
+            )
+            if "is_discontinued" in staging.c else false()
+        ),
+        "updated_at": literal(
+            datetime.now(timezone.utc), DateTime(timezone=True)),
+        "version": literal(1),
+    }
+    insert = dialect_insert(session)
+    statement = insert(table).from_select(
+        list(values),
+        select(*values.values()).where(is_merged)
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.sku],
+        set_={
+            **{
+                column: statement.excluded[column]
+                for column in values
+                if column == "updated_at"
+                or (column in staging.c and column not in ("id", "sku"))
+            },
+            "version": table.c.version + 1
+        }
+    )
+    merged = session.exec(statement).rowcount
+
+    analytics = ProductAnalytics.__table__
+    session.exec(
+        insert(analytics).from_select(
+            ["id", "product_id", "query_count"],
+            select(_new_uuid(dialect_name), table.c.id, literal(0))
+            .select_from(table.join(staging, staging.c.sku == table.c.sku))
+            .where(is_merged)
+        ).on_conflict_do_nothing(index_elements=[analytics.c.product_id])
+    )
+    return merged - updated, updated
+
+
+def run_import(
+    *,
+    session_factory: Callable[[], Session],
+    job_id: uuid.UUID,
+    path: str,
+    user: str | None
+) -> None:
+    """
+    Load the spooled CSV at path into product and record the outcome on
+    the job. The file is removed afterwards.
+    """
+    try:
+        _run_import(
+            session_factory=session_factory,
+            job_id=job_id,
+            path=path,
+            user=user
+        )
+    except Exception as exc:
+        logger.exception("Product import %s failed", job_id)
+        _update_job(
+            session_factory,
+            job_id,
+            status="failed",
+            error=str(getattr(exc, "orig", None) or exc),
+            finished_at=datetime.now(timezone.utc)
+        )
+    finally:
+        os.unlink(path)
+
+
+def _run_import(
+    *,
+    session_factory: Callable[[], Session],
+    job_id: uuid.UUID,
+    path: str,
+    user: str | None
+) -> None:
+    _update_job(
+        session_factory,
+        job_id,
+        status="staging",
+        started_at=datetime.now(timezone.utc)
+    )
+    reported = 0
+
+    def report_progress(bytes_read: int) -> None:
+        nonlocal reported
+        if bytes_read - reported >= PRODUCT_IMPORT_PROGRESS_BYTES:
+            _update_job(session_factory, job_id, bytes_read=bytes_read)
+            reported = bytes_read
+
+    with session_factory() as session, open(path, "rb") as file:
+        staging = staging_table(read_header(file))
+        connection = session.connection()
+        staging.drop(connection, checkfirst=True)
+        staging.create(connection)
+        staged = copy_into_staging(
+            session=session,
+            staging=staging,
+            file=file,
+            report_progress=report_progress
+        )
+        _update_job(
+            session_factory,
+            job_id,
+            status="merging",
+            bytes_read=os.path.getsize(path),
+            rows_staged=staged
+        )
+
+        validate_staged_rows(session=session, staging=staging)
+        rejected, errors = get_staged_errors(session=session, staging=staging)
+        created, updated = merge_staged_rows(session=session, staging=staging)
+        outbox_service.add_event(session=session, event=AuditEvent(
+            user=user,
+            action="import",
+            timestamp=datetime.now(timezone.utc),
+            model="Product",
+            record_id=job_id,
+            changes={
+                "created": {"old": None, "new": created},
+                "updated": {"old": None, "new": updated},
+            }
+        ))
+        if created or updated:
+            bump_catalog_generation(session=session)
+        session.commit()
+        staging.drop(session.connection(), checkfirst=True)
+        session.commit()
+
+    product_cache_service.invalidate_all_products()
+    _update_job(
+        session_factory,
+        job_id,
+        status="succeeded",
+        rows_created=created,
+        rows_updated=updated,
+        rows_rejected=rejected,
+        errors=errors,
+        finished_at=datetime.now(timezone.utc)
+    )
+
+
+def _update_job(
+    session_factory: Callable[[], Session],
+    job_id: uuid.UUID,
+    **fields: Any
+) -> None:
+    with session_factory() as session:
+        job = session.get(ImportJob, job_id)
+        job.sqlmodel_update(fields)
+        session.add(job)
+        session.commit()
+
+
+def _max_length(field: str) -> int:
+    for constraint in ProductBase.model_fields[field].metadata:
+        if isinstance(constraint, MaxLen):
+            return constraint.max_length
+    raise ValueError(f"{field} has no max_length")
+
+
+def _new_uuid(dialect_name: str) -> ColumnElement[Any]:
+    if dialect_name == "postgresql":
+        return func.gen_random_uuid()
+    # SQLAlchemy stores uuids as 32 hex characters where there is no uuid
+    # type.
+    return func.lower(func.hex(func.randomblob(16)))
+
+
+class ImportJobRunner:
+    """
+    Runs import jobs on a small thread pool, off the request path.
+    """
+
+    def __init__(
+        self,
+        *,
+        session_factory: Callable[[], Session],
+        max_workers: int
+    ) -> None:
+        self.session_factory = session_factory
+        self.max_workers = max_workers
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        *,
+        job_id: uuid.UUID,
+        path: str,
+        user: str | None
+    ) -> Future:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="product-import"
+                )
+            return self._executor.submit(
+                run_import,
+                session_factory=self.session_factory,
+                job_id=job_id,
+                path=path,
+                user=user
+            )
+
+    def stop(self) -> None:
+        """
+        Wait for the accepted jobs to finish.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+import_job_runner = ImportJobRunner(
+    session_factory=lambda: Session(engine),
+    max_workers=PRODUCT_IMPORT_MAX_WORKERS
+)
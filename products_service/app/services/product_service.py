@@ -1,41 +1,324 @@
-from sqlmodel import Session, select
+from collections.abc import Callable, Iterator
+from datetime import datetime, timezone
+from typing import Any
+from sqlalchemy import (
+    REAL,
+    Float,
+    Numeric,
+    Row,
+    Select,
+    and_,
+    any_,
+    cast,
+    literal,
+    or_,
+    tuple_,
+    update
+)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy import select as sa_select
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlmodel import Session, select, func, text
+from sqlalchemy.sql.elements import ColumnElement
+from sqlmodel.sql.expression import SelectOfScalar
+from dotenv import load_dotenv
+import uuid
+import os
 
-from app.models.product_models import ProductCreate, Product
+from app.db.upsert import dialect_insert
+from app.models.product_models import (
+    PRODUCT_SEARCH_CONFIG,
+    PRODUCT_SEARCH_VECTOR,
+    ProductBulkUpdate,
+    ProductCreate,
+    ProductFilters,
+    ProductSort,
+    ProductUpsert,
+    CatalogGeneration,
+    Product
+)
+from app.schemas.schemas import AuditEvent
+from app.services import outbox_service
+from app.services.product_analytics_service import init_products_analytics
+
+# Pairs of (product before the write or None if it was created, product after).
+ProductChanges = list[tuple[Product | None, Product]]
+BatchAuditEventBuilder = Callable[[ProductChanges], AuditEvent]
+
+# Builds the audit event for a written product from its values before the
+# write (None if it was created) and after. The event is committed
+# atomically with the product row.
+AuditEventBuilder = Callable[[Product | None, Product], AuditEvent]
+
+load_dotenv()
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+EXPORT_BATCH_SIZE = 1000
+PRODUCT_BATCH_CHUNK_SIZE = int(os.getenv("PRODUCT_BATCH_CHUNK_SIZE", "500"))
+# Most products one bulk update may change, all of them stay locked until
+# it commits and they share a single audit event.
+PRODUCT_BULK_UPDATE_MAX_ROWS = int(
+    os.getenv("PRODUCT_BULK_UPDATE_MAX_ROWS", "10000"))
+# Fields a batch item needs to create a product, and those it may clear.
+REQUIRED_CREATE_FIELDS = [
+    field for field, info in ProductCreate.model_fields.items()
+    if info.is_required()
+]
+NULLABLE_FIELDS = ["description"]
+
+
+class SkuConflictError(ValueError):
+    pass
+
+
+class VersionConflictError(ValueError):
+    pass
+
+
+class BulkUpdateTooLargeError(ValueError):
+    pass
+
+
+# Keyset columns of each sort order, the page key of a product is its values
+# for these columns.
+PRODUCT_SORT_COLUMNS = {
+    "id": [Product.id],
+    "price": [Product.price, Product.id],
+    "-price": [Product.price, Product.id],
+    "name": [Product.name, Product.id],
+}
 
 
 def create_product(
     *,
     session: Session,
-    product_create: ProductCreate
-) -> Product:
+    product_create: ProductCreate,
+    event_builder: AuditEventBuilder | None = None
+) -> Product | None:
+    """
+    Insert the product, its analytics row and its audit event in one
+    transaction. Returns None when the sku is already taken.
+    """
+    table = Product.__table__
+    insert = dialect_insert(session)
+    statement = insert(table).values(
+        **Product.model_validate(product_create).model_dump()
+    ).on_conflict_do_nothing(
+        index_elements=[table.c.sku]
+    ).returning(*table.c)
+    row = session.exec(statement).first()
+    if row is None:
+        session.rollback()
+        return None
 
-    db_obj = Product.model_validate(product_create)
-    session.add(db_obj)
+    product = Product.model_validate(row._asdict())
+    init_products_analytics(session=session, product_ids=[product.id])
+    _stage_event(
+        session=session,
+        original=None,
+        updated=product,
+        event_builder=event_builder
+    )
+    bump_catalog_generation(session=session)
     session.commit()
-    session.refresh(db_obj)
-    return db_obj
+    return product
 
 
 def update_product(
     *,
     session: Session,
-    db_product: Product,
-    product_in: ProductCreate
-) -> Product:
+    product_id: uuid.UUID,
+    product_in: ProductCreate,
+    expected_version: int | None = None,
+    event_builder: AuditEventBuilder | None = None
+) -> Product | None:
+    """
+    Update the product with UPDATE ... RETURNING. Returns None when it
+    does not exist, raises SkuConflictError when the new sku is taken and
+    VersionConflictError when expected_version is given and is no longer
+    the product's version.
+    """
     product_data = product_in.model_dump(exclude_unset=True)
-    db_product.sqlmodel_update(product_data)
-    session.add(db_product)
+    try:
+        changes = _update_returning_original(
+            session=session,
+            product_id=product_id,
+            values={**product_data, "updated_at": datetime.now(timezone.utc)},
+            expected_version=expected_version
+        )
+    except IntegrityError as exc:
+        session.rollback()
+        if "sku" in product_data:
+            raise SkuConflictError(product_data["sku"]) from exc
+        raise
+    return _finish_update(
+        session=session, changes=changes, event_builder=event_builder)
+
+
+def delete_product(
+    *,
+    session: Session,
+    product_id: uuid.UUID,
+    expected_version: int | None = None,
+    event_builder: AuditEventBuilder | None = None
+) -> Product | None:
+    """
+    Soft delete the product. Returns None when it does not exist and
+    raises VersionConflictError like update_product.
+    """
+    changes = _update_returning_original(
+        session=session,
+        product_id=product_id,
+        values={
+            "is_discontinued": True,
+            "updated_at": datetime.now(timezone.utc)
+        },
+        expected_version=expected_version
+    )
+    return _finish_update(
+        session=session, changes=changes, event_builder=event_builder)
+
+
+def upsert_products(
+    *,
+    session: Session,
+    products_in: list[ProductUpsert],
+    chunk_size: int = PRODUCT_BATCH_CHUNK_SIZE,
+    event_builder: BatchAuditEventBuilder | None = None
+) -> ProductChanges:
+    """
+    Insert or update products by sku with one INSERT ... ON CONFLICT per
+    chunk and set of fields sent, all in a single transaction. Existing
+    products only get the fields their item sets. Items missing a field
+    ProductCreate requires are skipped when their sku does not exist.
+    products_in must not repeat a sku.
+    """
+    table = Product.__table__
+    insert = dialect_insert(session)
+    changes: ProductChanges = []
+    now = datetime.now(timezone.utc)
+    for start in range(0, len(products_in), chunk_size):
+        chunk = products_in[start:start + chunk_size]
+        existing = {
+            product.sku: product.model_copy()
+            for product in session.exec(select(Product).where(
+                Product.sku.in_([product_in.sku for product_in in chunk])))
+        }
+        groups: dict[frozenset[str], list[dict[str, Any]]] = {}
+        for product_in in chunk:
+            fields = _upsert_fields(product_in)
+            original = existing.get(product_in.sku)
+            if original is not None:
+                # The insert half needs a full row even when it conflicts.
+                row = {
+                    **original.model_dump(
+                        include=set(ProductCreate.model_fields)),
+                    **fields
+                }
+            elif set(REQUIRED_CREATE_FIELDS) <= fields.keys():
+                row = ProductCreate.model_validate(fields).model_dump()
+            else:
+                continue
+            groups.setdefault(frozenset(fields), []).append(row)
+
+        for fields_set, rows in groups.items():
+            statement = insert(table).values([
+                {**row, "id": uuid.uuid4(), "updated_at": now, "version": 1}
+                for row in rows
+            ])
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.sku],
+                set_={
+                    **{
+                        column: statement.excluded[column]
+                        for column in (*fields_set, "updated_at")
+                        if column != "sku"
+                    },
+                    "version": table.c.version + 1
+                }
+            ).returning(*table.c)
+            for row in session.exec(statement):
+                updated = Product.model_validate(row._asdict())
+                changes.append((existing.get(updated.sku), updated))
+
+    init_products_analytics(
+        session=session,
+        product_ids=[updated.id for original, updated in changes
+                     if original is None]
+    )
+    if event_builder is not None and changes:
+        outbox_service.add_event(session=session, event=event_builder(changes))
+    if changes:
+        bump_catalog_generation(session=session)
     session.commit()
-    session.refresh(db_product)
-    return db_product
+    return changes
 
 
-def delete_product(*, session: Session, db_product: Product) -> Product:
-    db_product.sqlmodel_update({"is_discontinued": True})
-    session.add(db_product)
+def _upsert_fields(product_in: ProductUpsert) -> dict[str, Any]:
+    """
+    The fields product_in sets, leaving out nulls for columns that cannot
+    be null.
+    """
+    return {
+        field: value
+        for field, value in product_in.model_dump(exclude_unset=True).items()
+        if value is not None or field in NULLABLE_FIELDS
+    }
+
+
+def bulk_update_products(
+    *,
+    session: Session,
+    bulk_in: ProductBulkUpdate,
+    max_rows: int = PRODUCT_BULK_UPDATE_MAX_ROWS,
+    event_builder: BatchAuditEventBuilder | None = None
+) -> ProductChanges:
+    """
+    Apply bulk_in to every matching product with one UPDATE ... RETURNING
+    and stage a single event for all of them. Products whose price would
+    not stay positive, and products the change would leave as they are,
+    are not updated. Raises BulkUpdateTooLargeError, and changes nothing,
+    when more than max_rows products would be updated.
+    """
+    conditions = _filter_conditions(bulk_in.filters)
+    if bulk_in.ids is not None:
+        conditions.append(Product.id.in_(bulk_in.ids))
+
+    values: dict[str, Any] = {"updated_at": datetime.now(timezone.utc)}
+    changed: list[ColumnElement[bool]] = []
+    price = None
+    if bulk_in.price_percent is not None:
+        price = Product.price * (1 + bulk_in.price_percent / 100)
+    elif bulk_in.price_amount is not None:
+        price = Product.price + bulk_in.price_amount
+    if price is not None:
+        price = cast(func.round(cast(price, Numeric), 2), Float)
+        conditions.append(price > 0)
+        values["price"] = price
+        changed.append(price != Product.price)
+    if bulk_in.is_discontinued is not None:
+        values["is_discontinued"] = bulk_in.is_discontinued
+        changed.append(Product.is_discontinued != bulk_in.is_discontinued)
+    conditions.append(or_(*changed))
+
+    # One row past the maximum is enough to tell it was exceeded.
+    changes = _update_returning_originals(
+        session=session,
+        condition=and_(*conditions),
+        values=values,
+        limit=max_rows + 1
+    )
+    if len(changes) > max_rows:
+        session.rollback()
+        raise BulkUpdateTooLargeError(max_rows)
+    if event_builder is not None and changes:
+        outbox_service.add_event(session=session, event=event_builder(changes))
+    if changes:
+        bump_catalog_generation(session=session)
     session.commit()
-    session.refresh(db_product)
-    return db_product
+    return changes
 
 
 def get_product_by_sku(*, session: Session, sku: str) -> Product | None:
@@ -44,12 +327,426 @@ def get_product_by_sku(*, session: Session, sku: str) -> Product | None:
     return session_product
 
 
-def get_products(*, session: Session) -> list[Product]:
+def products_page_statement(
+    *,
+    limit: int,
+    filters: ProductFilters | None = None,
+    sort: ProductSort = "id",
+    after: list[Any] | None = None,
+    fields: list[str] | None = None
+) -> SelectOfScalar[Product] | Select:
+    """
+    One page of active products in sort order, starting after the page
+    key of the previous page's last product. With fields only those
+    columns and the page key are selected, as rows instead of Products.
+    """
+    columns = PRODUCT_SORT_COLUMNS[sort]
+    if fields is None:
+        statement = select(Product)
+    else:
+        statement = _select_columns(
+            fields + [column.key for column in columns])
+    statement = _filter_products(statement, filters)
+    descending = sort.startswith("-")
+    if after is not None:
+        key = tuple_(*columns)
+        after_key = tuple_(*after)
+        statement = statement.where(
+            key < after_key if descending else key > after_key)
+    if descending:
+        statement = statement.order_by(*(column.desc() for column in columns))
+    else:
+        statement = statement.order_by(*columns)
+    return statement.limit(limit)
+
+
+def product_fields_statement(
+    *,
+    product_id: uuid.UUID,
+    fields: list[str]
+) -> Select:
+    return _select_columns(fields).where(Product.id == product_id)
+
+
+def products_by_ids_statement(
+    *,
+    product_ids: list[uuid.UUID],
+    dialect_name: str,
+    fields: list[str] | None = None
+) -> SelectOfScalar[Product] | Select:
+    """
+    Products with the given ids. With fields only those columns and id are
+    selected. On PostgreSQL the ids go as one array parameter to
+    id = ANY(...), so the statement text is the same for any number of ids.
+    """
+    if dialect_name == "postgresql":
+        condition = Product.id == any_(
+            literal(product_ids, ARRAY(Product.__table__.c.id.type)))
+    else:
+        condition = Product.id.in_(product_ids)
+    if fields is None:
+        return select(Product).where(condition)
+    return _select_columns(fields + ["id"]).where(condition)
+
+
+def page_key(product: Product | Row, sort: ProductSort) -> list[Any]:
+    return [
+        getattr(product, column.key) for column in PRODUCT_SORT_COLUMNS[sort]
+    ]
+
+
+def page_cursor_values(
+    product: Product | Row,
+    sort: ProductSort,
+    count: int | None = None
+) -> list[Any]:
+    """
+    Cursor contents for the page after product. A filtered list carries its
+    count, so only the first page pays for counting it.
+    """
+    values = page_key(product, sort)
+    return values if count is None else [*values, count]
+
+
+def parse_page_cursor(
+    values: list[Any],
+    sort: ProductSort
+) -> tuple[list[Any], int | None]:
+    """
+    Split cursor contents into the page key and the carried count, if any.
+    Raises ValueError or TypeError when they do not belong to sort.
+    """
+    if len(values) != len(PRODUCT_SORT_COLUMNS[sort]) + 1:
+        return parse_page_key(values, sort), None
+    *values, count = values
+    if isinstance(count, bool) or not isinstance(count, int) or count < 0:
+        raise TypeError("Count must be a non-negative integer")
+    return parse_page_key(values, sort), count
+
+
+def parse_page_key(values: list[Any], sort: ProductSort) -> list[Any]:
+    """
+    Validate a page key read from a cursor against sort. Raises ValueError
+    or TypeError when it does not belong to sort.
+    """
+    columns = PRODUCT_SORT_COLUMNS[sort]
+    if len(values) != len(columns):
+        raise ValueError("Page key does not match the sort order")
+    key = []
+    for column, value in zip(columns, values):
+        if column.key == "id":
+            key.append(uuid.UUID(value))
+        elif column.key == "price":
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise TypeError("Price must be a number")
+            key.append(float(value))
+        else:
+            if not isinstance(value, str):
+                raise TypeError(f"{column.key} must be a string")
+            key.append(value)
+    return key
+
+
+def export_products_statement(
+    *,
+    brand: str | None,
+    updated_since: datetime | None,
+    batch_size: int
+) -> SelectOfScalar[Product]:
     statement = select(Product).where(Product.is_discontinued == False)
+    if brand is not None:
+        statement = statement.where(Product.brand == brand)
+    if updated_since is not None:
+        statement = statement.where(Product.updated_at >= updated_since)
+    return statement.order_by(Product.id).execution_options(
+        yield_per=batch_size)
+
+
+def search_products_statement(
+    *,
+    query: str,
+    dialect_name: str,
+    limit: int,
+    after: tuple[float, uuid.UUID] | None
+) -> Select[tuple[Product, float]]:
+    """
+    Products matching query with their rank, best first. On PostgreSQL the
+    match is answered by the GIN index on search_vector, elsewhere every
+    term is matched as a substring and all ranks are 0.
+    """
+    if dialect_name == "postgresql":
+        tsquery = func.websearch_to_tsquery(
+            cast(PRODUCT_SEARCH_CONFIG, REGCONFIG), query)
+        matches = PRODUCT_SEARCH_VECTOR.op("@@")(tsquery)
+        rank = func.ts_rank(PRODUCT_SEARCH_VECTOR, tsquery, type_=REAL)
+    else:
+        matches = and_(*(
+            or_(
+                Product.name.icontains(term, autoescape=True),
+                Product.brand.icontains(term, autoescape=True),
+                Product.description.icontains(term, autoescape=True)
+            )
+            for term in query.split()
+        ))
+        rank = literal(0.0, REAL)
+
+    statement = select(Product, rank).where(
+        Product.is_discontinued == False,
+        matches
+    )
+    if after is not None:
+        # ts_rank is a real, compare against the cursor's rank as a real
+        # too or the page boundary is lost to float rounding.
+        after_rank, after_id = after
+        after_rank = cast(literal(after_rank), REAL)
+        statement = statement.where(or_(
+            rank < after_rank,
+            and_(rank == after_rank, Product.id > after_id)
+        ))
+    return statement.order_by(rank.desc(), Product.id).limit(limit)
+
+
+def catalog_generation_statement() -> SelectOfScalar[int]:
+    """
+    Number of catalog writes so far, 0 before the first one.
+    """
+    return select(func.coalesce(func.max(CatalogGeneration.value), 0))
+
+
+def bump_catalog_generation(*, session: Session) -> None:
+    """
+    Count a catalog write, called by every writer just before it commits.
+    The row stays locked until then, so concurrent writers take turns and
+    readers never see the new generation with the old rows.
+    """
+    table = CatalogGeneration.__table__
+    insert = dialect_insert(session)
+    statement = insert(table).values(id=1, value=1)
+    session.exec(statement.on_conflict_do_update(
+        index_elements=[table.c.id],
+        set_={"value": table.c.value + 1}
+    ))
+
+
+def count_products_statement(
+    filters: ProductFilters | None = None
+) -> SelectOfScalar[int]:
+    return _filter_products(select(func.count()).select_from(Product), filters)
+
+
+# Planner row estimate for the product table, -1 until it is analyzed.
+ESTIMATE_PRODUCTS_COUNT_SQL = text(
+    "SELECT reltuples::bigint FROM pg_class WHERE oid = 'product'::regclass"
+)
+
+
+def get_products(
+    *,
+    session: Session,
+    limit: int = DEFAULT_PAGE_SIZE,
+    filters: ProductFilters | None = None,
+    sort: ProductSort = "id",
+    after: list[Any] | None = None,
+    fields: list[str] | None = None
+) -> list[Product] | list[Row]:
+    statement = products_page_statement(
+        limit=limit,
+        filters=filters,
+        sort=sort,
+        after=after,
+        fields=fields
+    )
     products = session.exec(statement).all()
     return products
 
 
+def stream_products(
+    *,
+    session: Session,
+    brand: str | None = None,
+    updated_since: datetime | None = None,
+    batch_size: int = EXPORT_BATCH_SIZE
+) -> Iterator[list[Product]]:
+    """
+    Yield the catalog in batches read from a server-side cursor, so memory
+    stays bounded by batch_size instead of the catalog size.
+    """
+    statement = export_products_statement(
+        brand=brand,
+        updated_since=updated_since,
+        batch_size=batch_size
+    )
+    for batch in session.exec(statement).partitions():
+        yield batch
+
+
+def get_catalog_generation(*, session: Session) -> int:
+    return session.exec(catalog_generation_statement()).one()
+
+
+def count_products(
+    *,
+    session: Session,
+    filters: ProductFilters | None = None
+) -> int:
+    return session.exec(count_products_statement(filters)).one()
+
+
+def estimate_products_count(*, session: Session) -> int:
+    """
+    Planner row estimate for the product table, falls back to an exact
+    count when the table has not been analyzed yet or the database is
+    not PostgreSQL.
+    """
+    if session.get_bind().dialect.name == "postgresql":
+        estimate = session.exec(ESTIMATE_PRODUCTS_COUNT_SQL).scalar()
+        if estimate is not None and estimate >= 0:
+            return estimate
+    return count_products(session=session)
+
+
 def get_product_by_id(*, session: Session, product_id: str) -> Product | None:
     product = session.get(Product, product_id)
     return product
+
+
+def _select_columns(fields: list[str]) -> Select:
+    return sa_select(*(
+        getattr(Product, field) for field in dict.fromkeys(fields)
+    ))
+
+
+def _filter_products(
+    statement: SelectOfScalar,
+    filters: ProductFilters | None
+) -> SelectOfScalar:
+    statement = statement.where(Product.is_discontinued == False)
+    if filters is None:
+        return statement
+    return statement.where(*_filter_conditions(filters))
+
+
+def _filter_conditions(filters: ProductFilters) -> list[ColumnElement[bool]]:
+    conditions = []
+    if filters.brand is not None:
+        conditions.append(Product.brand == filters.brand)
+    if filters.min_price is not None:
+        conditions.append(Product.price >= filters.min_price)
+    if filters.max_price is not None:
+        conditions.append(Product.price <= filters.max_price)
+    if filters.sku_prefix is not None:
+        conditions.append(
+            Product.sku.startswith(filters.sku_prefix, autoescape=True))
+    return conditions
+
+
+def _update_returning_original(
+    *,
+    session: Session,
+    product_id: uuid.UUID,
+    values: dict[str, Any],
+    expected_version: int | None
+) -> tuple[Product, Product] | None:
+    """
+    Apply values to the product, bump its version and return it as it was
+    before and after. With expected_version the row only matches while it
+    still has that version, so concurrent writers are detected without
+    holding locks between the read and the write.
+    """
+    condition = Product.id == product_id
+    if expected_version is not None:
+        condition = and_(condition, Product.version == expected_version)
+    changes = _update_returning_originals(
+        session=session, condition=condition, values=values)
+    if not changes:
+        if expected_version is not None and session.get(Product, product_id):
+            session.rollback()
+            raise VersionConflictError(product_id)
+        return None
+    return changes[0]
+
+
+def _update_returning_originals(
+    *,
+    session: Session,
+    condition: ColumnElement[bool],
+    values: dict[str, Any],
+    limit: int | None = None
+) -> list[tuple[Product, Product]]:
+    """
+    Apply values to every product matching condition, or to the first
+    limit of them, bump their versions and return them as they were
+    before and after.
+
+    PostgreSQL does it in one statement, joining the locked rows as they
+    were before the update into UPDATE ... FROM ... RETURNING. Elsewhere
+    the rows are read with SELECT ... FOR UPDATE first.
+    """
+    table = Product.__table__
+    values = {**values, "version": table.c.version + 1}
+    width = len(table.c)
+
+    if session.get_bind().dialect.name == "postgresql":
+        original_rows = sa_select(table).where(
+            condition).limit(limit).with_for_update().subquery("original")
+        statement = update(table).where(
+            table.c.id == original_rows.c.id
+        ).values(values).returning(*table.c, *original_rows.c)
+        pairs = [
+            (row[width:], row[:width]) for row in session.exec(statement)
+        ]
+    else:
+        originals = {
+            row.id: row for row in session.exec(
+                sa_select(table).where(condition).limit(
+                    limit).with_for_update())
+        }
+        if not originals:
+            return []
+        updated_rows = session.exec(
+            update(table).where(table.c.id.in_(list(originals))).values(
+                values).returning(*table.c)
+        )
+        pairs = [(originals[row.id], row) for row in updated_rows]
+
+    return [
+        (
+            Product.model_validate(dict(zip(table.c.keys(), original))),
+            Product.model_validate(dict(zip(table.c.keys(), updated)))
+        )
+        for original, updated in pairs
+    ]
+
+
+def _finish_update(
+    *,
+    session: Session,
+    changes: tuple[Product, Product] | None,
+    event_builder: AuditEventBuilder | None
+) -> Product | None:
+    if changes is None:
+        session.rollback()
+        return None
+    original, updated = changes
+    _stage_event(
+        session=session,
+        original=original,
+        updated=updated,
+        event_builder=event_builder
+    )
+    bump_catalog_generation(session=session)
+    session.commit()
+    return updated
+
+
+def _stage_event(
+    *,
+    session: Session,
+    original: Product | None,
+    updated: Product,
+    event_builder: AuditEventBuilder | None
+) -> None:
+    if event_builder is None:
+        return
+    outbox_service.add_event(
+        session=session, event=event_builder(original, updated))
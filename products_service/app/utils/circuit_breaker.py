@@ -0,0 +1,91 @@
+from collections.abc import Callable
+from typing import Literal
+import threading
+import time
+
+CircuitState = Literal["closed", "open", "half_open"]
+
+
+class CircuitOpenError(ConnectionError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a failing dependency. After failure_threshold failures
+    in a row the circuit opens and every call is refused at once. After
+    reset_timeout seconds one probe call is let through: its success
+    closes the circuit, its failure opens it again. A probe that is never
+    settled, nor released, is replaced by a new one after reset_timeout.
+    """
+
+    def __init__(
+        self,
+        *,
+        failure_threshold: int,
+        reset_timeout: float,
+        clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._state: CircuitState = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        # When the probe was granted, None once it was released.
+        self._probe_at: float | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            return self._state
+
+    def allow(self) -> bool:
+        """
+        Whether a call may go ahead. Moves an open circuit whose timeout
+        ran out to half open, granting the caller the probe.
+        """
+        with self._lock:
+            if self._state == "closed":
+                return True
+            now = self.clock()
+            if self._state == "open":
+                if now - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = "half_open"
+            elif (
+                self._probe_at is not None
+                and now - self._probe_at < self.reset_timeout
+            ):
+                return False
+            self._probe_at = now
+            return True
+
+    def check(self) -> None:
+        if not self.allow():
+            raise CircuitOpenError("Circuit is open")
+
+    def release(self) -> None:
+        """
+        Give back a probe whose call never reached the dependency, so the
+        next call becomes the probe.
+        """
+        with self._lock:
+            if self._state == "half_open":
+                self._probe_at = None
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = "closed"
+            self._failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if (
+                self._state == "half_open"
+                or self._failures >= self.failure_threshold
+            ):
+                self._state = "open"
+                self._opened_at = self.clock()
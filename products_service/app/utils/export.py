@@ -0,0 +1,44 @@
+from collections.abc import AsyncIterable, AsyncIterator
+import csv
+import io
+
+from app.models.product_models import Product, ProductPublic
+
+EXPORT_FIELDS = list(ProductPublic.model_fields)
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+async def ndjson_chunks(
+    batches: AsyncIterable[list[Product]]
+) -> AsyncIterator[str]:
+    async for batch in batches:
+        yield "".join(
+            ProductPublic.model_validate(product).model_dump_json() + "\n"
+            for product in batch
+        )
+
+
+async def csv_chunks(
+    batches: AsyncIterable[list[Product]]
+) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    yield _drain(buffer)
+    async for batch in batches:
+        writer.writerows(
+            ProductPublic.model_validate(product).model_dump(mode="json")
+            for product in batch
+        )
+        yield _drain(buffer)
+
+
+def _drain(buffer: io.StringIO) -> str:
+    chunk = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate(0)
+    return chunk
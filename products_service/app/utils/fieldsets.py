@@ -0,0 +1,29 @@
+from collections.abc import Mapping
+from typing import Any
+from pydantic import TypeAdapter
+
+_fields_adapter = TypeAdapter(dict[str, Any])
+
+
+class InvalidFieldsError(ValueError):
+    pass
+
+
+def parse_fields(fields: str | None, allowed: list[str]) -> list[str] | None:
+    """
+    Parse a comma separated ?fields= value. The result keeps the order of
+    allowed, so equal requests serialize to equal bytes.
+    """
+    if fields is None:
+        return None
+    requested = {field.strip() for field in fields.split(",")} - {""}
+    if not requested:
+        raise InvalidFieldsError("No fields requested")
+    unknown = sorted(requested.difference(allowed))
+    if unknown:
+        raise InvalidFieldsError(f"Unknown fields: {', '.join(unknown)}")
+    return [field for field in allowed if field in requested]
+
+
+def dump_fields(values: Mapping[str, Any], fields: list[str]) -> bytes:
+    return _fields_adapter.dump_json({field: values[field] for field in fields})
@@ -0,0 +1,67 @@
+from dotenv import load_dotenv
+import hashlib
+import os
+
+load_dotenv()
+
+PRODUCT_MAX_AGE = int(os.getenv("PRODUCT_MAX_AGE", "0"))
+PRODUCT_STALE_WHILE_REVALIDATE = int(
+    os.getenv("PRODUCT_STALE_WHILE_REVALIDATE", "30")
+)
+PRODUCTS_LIST_MAX_AGE = int(os.getenv("PRODUCTS_LIST_MAX_AGE", "30"))
+PRODUCTS_LIST_STALE_WHILE_REVALIDATE = int(
+    os.getenv("PRODUCTS_LIST_STALE_WHILE_REVALIDATE", "60")
+)
+
+
+def cache_control(*, max_age: int, stale_while_revalidate: int) -> str:
+    return (
+        f"public, max-age={max_age}, "
+        f"stale-while-revalidate={stale_while_revalidate}"
+    )
+
+
+PRODUCT_CACHE_CONTROL = cache_control(
+    max_age=PRODUCT_MAX_AGE,
+    stale_while_revalidate=PRODUCT_STALE_WHILE_REVALIDATE
+)
+PRODUCTS_LIST_CACHE_CONTROL = cache_control(
+    max_age=PRODUCTS_LIST_MAX_AGE,
+    stale_while_revalidate=PRODUCTS_LIST_STALE_WHILE_REVALIDATE
+)
+
+
+def make_etag(content: bytes) -> str:
+    return f'"{hashlib.blake2b(content, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Weak comparison of an If-None-Match header against etag, as required
+    for GET requests by RFC 9110.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def version_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def if_match_version(if_match: str) -> int | None:
+    """
+    Version named by an If-Match header, None for "*". Raises ValueError
+    when the header is not a single strong version tag, which can never
+    match.
+    """
+    if_match = if_match.strip()
+    if if_match == "*":
+        return None
+    version = if_match.removeprefix('"').removesuffix('"')
+    if len(version) != len(if_match) - 2 or not version.isdigit():
+        raise ValueError("If-Match is not a version tag")
+    return int(version)
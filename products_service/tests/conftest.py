@@ -1,11 +1,22 @@
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
 
 import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 from fastapi.testclient import TestClient
 
 from app.main import app
-from app.dependencies.dependencies import get_db
+from app.dependencies.dependencies import (
+    get_async_db,
+    get_async_session_factory,
+    get_db
+)
+from app.services.event_publisher_service import event_publisher
+from app.services.idempotency_service import idempotency_keys
+from app.services.outbox_service import outbox_relay
+from app.services.product_analytics_service import query_count_buffer
+from app.services.product_import_service import import_job_runner
 from app.utils.security import create_access_token
 from app.models.product_models import Product
 
@@ -13,6 +24,17 @@ engine_test = create_engine(
     "sqlite:///./test.db",
     connect_args={"check_same_thread": False}
 )
+async_engine_test = create_async_engine("sqlite+aiosqlite:///./test.db")
+async_session_factory_test = async_sessionmaker(
+    async_engine_test,
+    class_=AsyncSession,
+    expire_on_commit=False
+)
+
+
+async def get_async_db_test() -> AsyncGenerator[AsyncSession, None]:
+    async with async_session_factory_test() as session:
+        yield session
 
 
 @pytest.fixture(scope="session", autouse=True)
@@ -28,9 +50,39 @@ def db(create_test_db) -> Generator[Session, None, None]:
         yield session
 
 
+@pytest.fixture(scope="session", autouse=True)
+def query_count_buffer_test_db(create_test_db) -> None:
+    query_count_buffer.session_factory = lambda: Session(engine_test)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def import_runner_test_db(create_test_db) -> None:
+    import_job_runner.session_factory = lambda: Session(engine_test)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def idempotency_keys_test_db(create_test_db) -> None:
+    idempotency_keys.session_factory = async_session_factory_test
+
+
+@pytest.fixture(scope="session", autouse=True)
+def event_publisher_no_drain() -> None:
+    # There is no broker in the test environment, so do not wait on it.
+    event_publisher.drain_timeout = 0
+
+
+@pytest.fixture(scope="session", autouse=True)
+def outbox_relay_disabled() -> None:
+    # Tests relay events themselves, with fake publishers.
+    outbox_relay.enabled = False
+
+
 @pytest.fixture()
 def client(db: Session) -> Generator[TestClient, None, None]:
     app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_async_db] = get_async_db_test
+    app.dependency_overrides[
+        get_async_session_factory] = lambda: async_session_factory_test
     with TestClient(app) as client:
         yield client
     app.dependency_overrides.clear()
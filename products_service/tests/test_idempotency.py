@@ -0,0 +1,203 @@
+from datetime import datetime, timedelta, timezone
+import hashlib
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, func, select
+
+from app.models.idempotency_models import IdempotencyKey
+from app.models.outbox_models import OutboxEvent
+from app.models.product_models import Product, ProductCreate
+from app.services.idempotency_service import idempotency_keys
+from app.services.product_service import create_product
+
+
+def count_outbox_events(db: Session) -> int:
+    return db.exec(select(func.count()).select_from(OutboxEvent)).one()
+
+
+def test_create_product_retry_is_replayed(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+    db: Session
+) -> None:
+    headers = {**admin_account_token_headers, "Idempotency-Key": "create-1"}
+    data = {"sku": "idempotent_sku", "name": "name", "price": 1.0,
+            "brand": "brand"}
+    first = client.post("/api/v1/products", headers=headers, json=data)
+    assert first.status_code == 200
+    assert "idempotent-replayed" not in first.headers
+    events = count_outbox_events(db)
+
+    retry = client.post("/api/v1/products", headers=headers, json=data)
+    assert retry.status_code == 200
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.headers["etag"] == first.headers["etag"]
+    assert retry.json() == first.json()
+    assert count_outbox_events(db) == events
+    assert db.exec(select(func.count()).select_from(Product).where(
+        Product.sku == "idempotent_sku")).one() == 1
+
+
+def test_update_product_retry_is_replayed(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+    db: Session
+) -> None:
+    product = create_product(session=db, product_create=ProductCreate(
+        sku="idempotent_update_sku", name="name", price=1.0, brand="brand"))
+    headers = {
+        **admin_account_token_headers,
+        "If-Match": f'"{product.version}"',
+        "Idempotency-Key": "update-1"
+    }
+    first = client.patch(
+        f"/api/v1/products/{product.id}", headers=headers, json={"price": 2.0})
+    assert first.status_code == 200
+
+    # Without the key the stale If-Match would fail with 412.
+    retry = client.patch(
+        f"/api/v1/products/{product.id}", headers=headers, json={"price": 2.0})
+    assert retry.status_code == 200
+    assert retry.json() == first.json()
+
+    db.expire_all()
+    assert db.get(Product, product.id).version == product.version + 1
+
+
+def test_idempotency_key_reused_with_another_if_match(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+    db: Session
+) -> None:
+    product = create_product(session=db, product_create=ProductCreate(
+        sku="idempotent_if_match_sku", name="name", price=1.0, brand="brand"))
+    headers = {
+        **admin_account_token_headers,
+        "If-Match": f'"{product.version}"',
+        "Idempotency-Key": "update-2"
+    }
+    response = client.patch(
+        f"/api/v1/products/{product.id}", headers=headers, json={"price": 2.0})
+    assert response.status_code == 200
+
+    headers["If-Match"] = f'"{product.version + 1}"'
+    response = client.patch(
+        f"/api/v1/products/{product.id}", headers=headers, json={"price": 2.0})
+    assert response.status_code == 422
+
+
+def test_idempotency_key_reused_for_another_request(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+) -> None:
+    headers = {**admin_account_token_headers, "Idempotency-Key": "create-2"}
+    data = {"sku": "idempotent_other_sku", "name": "name", "price": 1.0,
+            "brand": "brand"}
+    response = client.post("/api/v1/products", headers=headers, json=data)
+    assert response.status_code == 200
+
+    response = client.post(
+        "/api/v1/products", headers=headers, json={**data, "price": 2.0})
+    assert response.status_code == 422
+
+
+def test_idempotency_keys_are_scoped_to_the_token_subject(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+    normal_account_token_headers: dict[str, str],
+) -> None:
+    data = {"sku": "idempotent_scoped_sku", "name": "name", "price": 1.0,
+            "brand": "brand"}
+    response = client.post(
+        "/api/v1/products",
+        headers={**admin_account_token_headers, "Idempotency-Key": "shared"},
+        json=data
+    )
+    assert response.status_code == 200
+
+    response = client.post(
+        "/api/v1/products",
+        headers={**normal_account_token_headers, "Idempotency-Key": "shared"},
+        json=data
+    )
+    assert response.status_code == 403
+    assert "idempotent-replayed" not in response.headers
+
+
+def test_expired_idempotency_key_runs_again(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+    monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(idempotency_keys, "ttl_seconds", 0)
+    headers = {**admin_account_token_headers, "Idempotency-Key": "create-3"}
+    data = {"sku": "idempotent_expired_sku", "name": "name", "price": 1.0,
+            "brand": "brand"}
+    response = client.post("/api/v1/products", headers=headers, json=data)
+    assert response.status_code == 200
+
+    response = client.post("/api/v1/products", headers=headers, json=data)
+    assert response.status_code == 400
+    assert "idempotent-replayed" not in response.headers
+
+
+def fingerprint(path: str, body: bytes) -> str:
+    # Method, path, If-Match and query string, one per line.
+    digest = hashlib.sha256(b"POST\n" + path.encode() + b"\n\n\n")
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def reserve_abandoned_key(
+    db: Session,
+    key: str,
+    body: bytes,
+    locked_for: timedelta
+) -> None:
+    """A reservation left behind by a request that never finished."""
+    now = datetime.now(timezone.utc)
+    db.add(IdempotencyKey(
+        principal="admin_account@example.com",
+        key=key,
+        fingerprint=fingerprint("/api/v1/products", body),
+        lease="abandoned",
+        locked_until=now + locked_for,
+        expires_at=now + timedelta(days=1)
+    ))
+    db.commit()
+
+
+def test_abandoned_idempotency_key_is_taken_over(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+    db: Session
+) -> None:
+    body = b'{"sku": "idempotent_taken_over_sku", "name": "name", "price": 1.0, "brand": "brand"}'
+    reserve_abandoned_key(db, "abandoned", body, timedelta(seconds=-1))
+    headers = {
+        **admin_account_token_headers,
+        "Idempotency-Key": "abandoned",
+        "Content-Type": "application/json"
+    }
+    response = client.post("/api/v1/products", headers=headers, content=body)
+    assert response.status_code == 200
+    assert "idempotent-replayed" not in response.headers
+
+    retry = client.post("/api/v1/products", headers=headers, content=body)
+    assert retry.headers["idempotent-replayed"] == "true"
+
+
+def test_locked_idempotency_key_is_in_progress(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+    db: Session
+) -> None:
+    body = b'{"sku": "idempotent_locked_sku", "name": "name", "price": 1.0, "brand": "brand"}'
+    reserve_abandoned_key(db, "locked", body, timedelta(minutes=1))
+    headers = {
+        **admin_account_token_headers,
+        "Idempotency-Key": "locked",
+        "Content-Type": "application/json"
+    }
+    response = client.post("/api/v1/products", headers=headers, content=body)
+    assert response.status_code == 409
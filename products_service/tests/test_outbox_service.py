@@ -0,0 +1,200 @@
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+import json
+
+from app.models.outbox_models import OutboxEvent
+from app.models.product_models import ProductCreate
+from app.schemas.schemas import AuditEvent
+from app.services.outbox_service import (
+    add_event,
+    event_routing_key,
+    purge_sent_events,
+    relay_pending_events
+)
+from app.services.product_service import create_product
+from app.utils.circuit_breaker import CircuitOpenError
+
+
+class ConfirmingPublisher:
+    def __init__(self) -> None:
+        self.messages: list[str] = []
+        self.routing_keys: list[str | None] = []
+
+    def submit(self, message: str, routing_key: str | None = None) -> Future:
+        self.messages.append(message)
+        self.routing_keys.append(routing_key)
+        future: Future = Future()
+        future.set_result(None)
+        return future
+
+
+class FailingPublisher:
+    def submit(self, message: str, routing_key: str | None = None) -> Future:
+        future: Future = Future()
+        future.set_exception(ConnectionError("broker down"))
+        return future
+
+
+class OpenCircuitPublisher:
+    def submit(self, message: str, routing_key: str | None = None) -> Future:
+        raise CircuitOpenError("Circuit is open")
+
+
+def make_event(record_id: str) -> AuditEvent:
+    return AuditEvent(
+        user="admin_account@example.com",
+        action="update",
+        timestamp=datetime.now(timezone.utc),
+        model="Product",
+        record_id=record_id,
+        changes={}
+    )
+
+
+def test_create_product_stages_event_in_same_transaction(db: Session) -> None:
+    product_in = ProductCreate(
+        sku="outbox_sku", name="product", price=1.0, brand="brand")
+    product = create_product(
+        session=db,
+        product_create=product_in,
+        event_builder=lambda original, product: make_event(str(product.id))
+    )
+
+    events = db.exec(select(OutboxEvent)).all()
+    payloads = [json.loads(event.payload) for event in events]
+    assert str(product.id) in [payload["record_id"] for payload in payloads]
+
+
+def test_event_routing_key() -> None:
+    event = make_event("routing-key")
+    assert event_routing_key(event) == "product.update"
+    event.action = "soft delete"
+    assert event_routing_key(event) == "product.soft_delete"
+
+
+def test_relay_marks_published_events_as_sent(db: Session) -> None:
+    event = add_event(session=db, event=make_event("relay-sent"))
+    db.commit()
+    publisher = ConfirmingPublisher()
+
+    relay_pending_events(session=db, publisher=publisher, batch_size=1000)
+
+    db.refresh(event)
+    assert event.sent_at is not None
+    assert event.attempts == 1
+    assert event.payload in publisher.messages
+    assert "product.update" in publisher.routing_keys
+
+
+def test_relay_keeps_failed_events_pending(db: Session) -> None:
+    event = add_event(session=db, event=make_event("relay-failed"))
+    db.commit()
+
+    sent = relay_pending_events(
+        session=db, publisher=FailingPublisher(), batch_size=1000)
+
+    db.refresh(event)
+    assert sent == 0
+    assert event.sent_at is None
+    assert event.attempts == 1
+
+
+def test_relay_leaves_events_pending_while_circuit_is_open(
+    db: Session
+) -> None:
+    event = add_event(session=db, event=make_event("relay-circuit-open"))
+    db.commit()
+
+    sent = relay_pending_events(
+        session=db, publisher=OpenCircuitPublisher(), batch_size=1000)
+
+    db.refresh(event)
+    assert sent == 0
+    assert event.sent_at is None
+    assert event.attempts == 0
+
+
+def test_create_product_endpoint_writes_outbox_event(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+    db: Session
+) -> None:
+    data = {
+        "sku": "outbox_endpoint_sku",
+        "name": "product name",
+        "price": 10.5,
+        "brand": "brand name"
+    }
+    response = client.post(
+        "/api/v1/products",
+        headers=admin_account_token_headers,
+        json=data,
+    )
+    assert response.status_code == 200
+    product_id = response.json()["id"]
+
+    payloads = [
+        json.loads(event.payload)
+        for event in db.exec(select(OutboxEvent)).all()
+    ]
+    event = next(
+        payload for payload in payloads if payload["record_id"] == product_id)
+    assert event["action"] == "create"
+    assert event["user"] == "admin_account@example.com"
+
+
+def test_update_product_endpoint_event_has_old_values(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+    db: Session
+) -> None:
+    product = create_product(session=db, product_create=ProductCreate(
+        sku="outbox_update_sku", name="old name", price=10.5, brand="brand"))
+
+    response = client.patch(
+        f"/api/v1/products/{product.id}",
+        headers={
+            **admin_account_token_headers,
+            "If-Match": f'"{product.version}"'
+        },
+        json={"name": "new name"},
+    )
+    assert response.status_code == 200
+
+    payloads = [
+        json.loads(event.payload)
+        for event in db.exec(select(OutboxEvent)).all()
+    ]
+    event = next(
+        payload for payload in payloads
+        if payload["record_id"] == str(product.id)
+        and payload["action"] == "update"
+    )
+    assert event["schema_version"] == 2
+    assert event["event_id"]
+    assert event["changes"] == {"name": {"old": "old name", "new": "new name"}}
+
+
+def test_purge_deletes_sent_events_past_retention(db: Session) -> None:
+    now = datetime.now(timezone.utc)
+    expired = [
+        add_event(session=db, event=make_event(f"purge-expired-{index}"))
+        for index in range(3)
+    ]
+    for event in expired:
+        event.sent_at = now - timedelta(days=2)
+    recent = add_event(session=db, event=make_event("purge-recent"))
+    recent.sent_at = now
+    pending = add_event(session=db, event=make_event("purge-pending"))
+    db.commit()
+    kept = [recent.id, pending.id]
+    expired_ids = [event.id for event in expired]
+
+    purged = purge_sent_events(
+        session=db, retention_seconds=24 * 60 * 60, batch_size=2)
+    assert purged >= 3
+    remaining = db.exec(select(OutboxEvent.id)).all()
+    assert all(event_id in remaining for event_id in kept)
+    assert not any(event_id in remaining for event_id in expired_ids)
@@ -0,0 +1,86 @@
+from sqlmodel import Session, select
+import threading
+
+from app.services.product_service import create_product
+from app.services.product_analytics_service import (
+    QueryCountBuffer,
+    upsert_query_counts
+)
+from app.models.product_models import Product, ProductCreate
+from app.models.product_analytics_models import ProductAnalytics
+from tests.conftest import engine_test
+
+
+def get_query_count(product_id) -> int:
+    with Session(engine_test) as session:
+        statement = select(ProductAnalytics).where(
+            ProductAnalytics.product_id == product_id)
+        return session.exec(statement).one().query_count
+
+
+def test_buffer_flush_creates_missing_analytics_row(db: Session) -> None:
+    product_in = ProductCreate(
+        sku="buffer_new_row_sku", name="product", price=1.0, brand="brand")
+    # Added without create_product, which would create the analytics row.
+    product = Product.model_validate(product_in)
+    db.add(product)
+    db.commit()
+    buffer = QueryCountBuffer(
+        session_factory=lambda: Session(engine_test),
+        flush_interval_ms=1000,
+        flush_threshold=1000
+    )
+
+    buffer.add(product.id)
+    buffer.add(product.id)
+    assert buffer.pending(product.id) == 2
+    buffer.flush()
+
+    assert buffer.pending(product.id) == 0
+    assert get_query_count(product.id) == 2
+
+
+def test_buffer_flush_adds_to_existing_count(db: Session) -> None:
+    product_in = ProductCreate(
+        sku="buffer_existing_row_sku", name="product", price=1.0, brand="brand")
+    product = create_product(session=db, product_create=product_in)
+    with Session(engine_test) as session:
+        upsert_query_counts(
+            session=session,
+            counts={product.id: (5, product.updated_at)}
+        )
+    buffer = QueryCountBuffer(
+        session_factory=lambda: Session(engine_test),
+        flush_interval_ms=1000,
+        flush_threshold=1000
+    )
+
+    buffer.add(product.id, count=3)
+    buffer.flush()
+
+    assert get_query_count(product.id) == 8
+
+
+def test_buffer_counts_are_exact_under_concurrency(db: Session) -> None:
+    product_in = ProductCreate(
+        sku="buffer_concurrent_sku", name="product", price=1.0, brand="brand")
+    product = create_product(session=db, product_create=product_in)
+    buffer = QueryCountBuffer(
+        session_factory=lambda: Session(engine_test),
+        flush_interval_ms=5,
+        flush_threshold=50
+    )
+    buffer.start()
+
+    def read_product() -> None:
+        for _ in range(200):
+            buffer.add(product.id)
+
+    threads = [threading.Thread(target=read_product) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    buffer.stop()
+
+    assert get_query_count(product.id) == 1600
@@ -0,0 +1,83 @@
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+import time
+
+from app.services.product_service import create_product
+from app.services.product_cache_service import product_cache
+from app.models.product_models import ProductCreate
+from app.utils.cache import LRUCache
+
+
+def test_cache_hit_and_miss() -> None:
+    cache = LRUCache(max_bytes=1024, ttl_seconds=60)
+    assert cache.get("key") is None
+    cache.set("key", b"value")
+    assert cache.get("key") == b"value"
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["size_bytes"] == len(b"value")
+
+
+def test_cache_evicts_least_recently_used_by_size() -> None:
+    cache = LRUCache(max_bytes=10, ttl_seconds=60)
+    cache.set("a", b"aaaa")
+    cache.set("b", b"bbbb")
+    cache.get("a")
+    cache.set("c", b"cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"aaaa"
+    assert cache.get("c") == b"cccc"
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size_bytes"] == 8
+
+
+def test_cache_skips_values_larger_than_limit() -> None:
+    cache = LRUCache(max_bytes=4, ttl_seconds=60)
+    cache.set("a", b"too large")
+    assert cache.get("a") is None
+    assert cache.stats()["size_bytes"] == 0
+
+
+def test_cache_entries_expire() -> None:
+    cache = LRUCache(max_bytes=1024, ttl_seconds=0.01)
+    cache.set("a", b"value")
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_get_product_served_from_cache(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+    db: Session
+) -> None:
+    product_in = ProductCreate(
+        sku="cached_sku", name="product name", price=10.5, brand="brand name")
+    product = create_product(session=db, product_create=product_in)
+
+    first = client.get(f"/api/v1/products/{product.id}")
+    hits_before = product_cache.stats()["hits"]
+    second = client.get(f"/api/v1/products/{product.id}")
+
+    assert first.status_code == 200
+    assert second.json() == first.json()
+    assert product_cache.stats()["hits"] == hits_before + 1
+
+    response = client.get(
+        "/api/v1/products/cache/stats",
+        headers=admin_account_token_headers
+    )
+    assert response.status_code == 200
+    assert response.json()["entries"] >= 1
+
+
+def test_cache_stats_requires_admin(
+    client: TestClient,
+    normal_account_token_headers: dict[str, str],
+) -> None:
+    response = client.get(
+        "/api/v1/products/cache/stats",
+        headers=normal_account_token_headers
+    )
+    assert response.status_code == 403
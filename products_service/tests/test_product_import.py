@@ -0,0 +1,155 @@
+import time
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from app.models.outbox_models import OutboxEvent
+from app.models.product_analytics_models import ProductAnalytics
+from app.models.product_models import Product, ProductCreate
+from app.services.product_service import create_product
+
+
+def wait_for_import(
+    client: TestClient,
+    headers: dict[str, str],
+    job_id: str
+) -> dict:
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        response = client.get(
+            f"/api/v1/products/imports/{job_id}", headers=headers)
+        assert response.status_code == 200
+        job = response.json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError("import did not finish")
+
+
+def test_import_products_csv(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+    db: Session
+) -> None:
+    existing = create_product(session=db, product_create=ProductCreate(
+        sku="import_existing_sku",
+        name="old name",
+        description="kept",
+        price=10.5,
+        brand="brand"
+    ))
+    content = (
+        "sku,name,price,brand,is_discontinued\n"
+        "import_existing_sku,new name,12.5,brand,true\n"
+        "import_new_sku,first,1,brand,\n"
+        "import_bad_price_sku,name,free,brand,false\n"
+        ",no sku,1,brand,false\n"
+        "import_new_sku,\"second, quoted\",2.5,brand,false\n"
+    )
+    response = client.post(
+        "/api/v1/products/imports?filename=catalog.csv",
+        headers=admin_account_token_headers,
+        content=content.encode(),
+    )
+    assert response.status_code == 202
+    assert response.json()["bytes_total"] == len(content)
+
+    job = wait_for_import(
+        client, admin_account_token_headers, response.json()["id"])
+    assert job["status"] == "succeeded"
+    assert job["filename"] == "catalog.csv"
+    assert job["rows_staged"] == 5
+    assert job["rows_created"] == 1
+    assert job["rows_updated"] == 1
+    assert job["rows_rejected"] == 2
+    assert job["errors"] == [
+        {"row": 3, "sku": "import_bad_price_sku",
+         "message": "price must be a number"},
+        {"row": 4, "sku": None, "message": "sku is required"},
+    ]
+
+    db.expire_all()
+    updated = db.get(Product, existing.id)
+    assert updated.name == "new name"
+    assert updated.price == 12.5
+    assert updated.is_discontinued is True
+    assert updated.description == "kept"
+    created = db.exec(
+        select(Product).where(Product.sku == "import_new_sku")).one()
+    assert created.name == "second, quoted"
+    assert created.is_discontinued is False
+    assert db.exec(select(ProductAnalytics).where(
+        ProductAnalytics.product_id == created.id)).first()
+    assert db.exec(select(Product).where(
+        Product.sku == "import_bad_price_sku")).first() is None
+
+    event = db.exec(
+        select(OutboxEvent).order_by(OutboxEvent.created_at.desc())).first()
+    assert job["id"] in event.payload
+
+
+def test_import_products_reports_rows_across_multiline_values(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+) -> None:
+    content = (
+        "sku,name,price,brand,description\n"
+        "import_multiline_sku,name,1,brand,\"first line\nsecond line\"\n"
+        f"import_huge_price_sku,name,{'9' * 400},brand,\n"
+    )
+    response = client.post(
+        "/api/v1/products/imports",
+        headers=admin_account_token_headers,
+        content=content.encode(),
+    )
+    assert response.status_code == 202
+
+    job = wait_for_import(
+        client, admin_account_token_headers, response.json()["id"])
+    assert job["status"] == "succeeded"
+    assert job["rows_created"] == 1
+    assert job["errors"] == [
+        {"row": 2, "sku": "import_huge_price_sku",
+         "message": "price must be a number"},
+    ]
+
+
+def test_import_products_rejects_unknown_columns(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+) -> None:
+    response = client.post(
+        "/api/v1/products/imports",
+        headers=admin_account_token_headers,
+        content=b"sku,name,price,brand,colour\nsku,name,1,brand,red\n",
+    )
+    assert response.status_code == 202
+
+    job = wait_for_import(
+        client, admin_account_token_headers, response.json()["id"])
+    assert job["status"] == "failed"
+    assert job["error"] == "Unknown columns: colour."
+
+
+def test_import_products_empty_body(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+) -> None:
+    response = client.post(
+        "/api/v1/products/imports",
+        headers=admin_account_token_headers,
+        content=b"",
+    )
+    assert response.status_code == 400
+
+
+def test_import_products_unauthorized(
+    client: TestClient,
+    normal_account_token_headers: dict[str, str],
+) -> None:
+    response = client.post(
+        "/api/v1/products/imports",
+        headers=normal_account_token_headers,
+        content=b"sku,name,price,brand\n",
+    )
+    assert response.status_code == 403
@@ -1,12 +1,24 @@
+from sqlalchemy.dialects import postgresql
 from sqlmodel import Session, select, func
 import pytest
+import uuid
 
 from app.services.product_service import (
+    BulkUpdateTooLargeError,
+    bulk_update_products,
     create_product,
     update_product,
-    delete_product
+    delete_product,
+    get_catalog_generation,
+    products_page_statement,
+    search_products_statement
+)
+from app.models.product_models import (
+    Product,
+    ProductBulkUpdate,
+    ProductCreate,
+    ProductFilters
 )
-from app.models.product_models import Product, ProductCreate
 
 
 def test_create_product(db: Session) -> None:
@@ -137,7 +149,7 @@ def test_update_product(db: Session) -> None:
 
     updated_product = update_product(
         session=db,
-        db_product=product,
+        product_id=product.id,
         product_in=product_update
     )
     assert updated_product.name == new_name
@@ -178,7 +190,7 @@ def test_update_product_invalid_price(db: Session) -> None:
         )
         update_product(
             session=db,
-            db_product=product,
+            product_id=product.id,
             product_in=product_update
         )
 
@@ -217,7 +229,7 @@ def test_update_product_missing_name(db: Session) -> None:
         )
         update_product(
             session=db,
-            db_product=product,
+            product_id=product.id,
             product_in=product_update
         )
 
@@ -254,7 +266,7 @@ def test_update_product_missing_sku(db: Session) -> None:
         )
         update_product(
             session=db,
-            db_product=product,
+            product_id=product.id,
             product_in=product_update
         )
     assert db.exec(select(func.count()).select_from(
@@ -283,13 +295,53 @@ def test_delete_product(db: Session) -> None:
     assert product.is_discontinued is False
     actual_products = db.exec(select(func.count()).select_from(Product)).one()
 
-    deleted_product = delete_product(session=db, db_product=product)
+    deleted_product = delete_product(session=db, product_id=product.id)
     assert deleted_product.is_discontinued is True
     assert deleted_product.id == product.id
     assert db.exec(select(func.count()).select_from(
         Product)).one() == actual_products
 
 
+def test_catalog_generation_counts_writes(db: Session) -> None:
+    generation = get_catalog_generation(session=db)
+    product = create_product(session=db, product_create=ProductCreate(
+        name="Generation Product", price=5.0, brand="BrandG",
+        sku="SKU_GENERATION"))
+    assert get_catalog_generation(session=db) == generation + 1
+
+    update_product(
+        session=db,
+        product_id=product.id,
+        product_in=ProductCreate(
+            name="Generation Product 2", price=6.0, brand="BrandG",
+            sku="SKU_GENERATION")
+    )
+    delete_product(session=db, product_id=product.id)
+    assert get_catalog_generation(session=db) == generation + 3
+
+    assert delete_product(session=db, product_id=uuid.uuid4()) is None
+    assert get_catalog_generation(session=db) == generation + 3
+
+
+def test_bulk_update_products_over_max_rows(db: Session) -> None:
+    products = [
+        create_product(session=db, product_create=ProductCreate(
+            name="Bulk Product", price=10.0, brand="BrandBulkMax", sku=sku))
+        for sku in ("SKU_BULK_MAX_1", "SKU_BULK_MAX_2")
+    ]
+    bulk_in = ProductBulkUpdate(
+        filters=ProductFilters(brand="BrandBulkMax"), price_amount=1)
+
+    with pytest.raises(BulkUpdateTooLargeError):
+        bulk_update_products(session=db, bulk_in=bulk_in, max_rows=1)
+    db.expire_all()
+    assert [db.get(Product, product.id).price for product in products] == [
+        10.0, 10.0]
+
+    changes = bulk_update_products(session=db, bulk_in=bulk_in, max_rows=2)
+    assert len(changes) == 2
+
+
 def test_delete_already_discontinued_product(db: Session) -> None:
     name = "Already Discontinued Product"
     description = "This product is already discontinued"
@@ -307,12 +359,74 @@ def test_delete_already_discontinued_product(db: Session) -> None:
 
     product = create_product(session=db, product_create=product_in)
     product.is_discontinued = True
-    delete_product(session=db, db_product=product)
+    delete_product(session=db, product_id=product.id)
     assert product.is_discontinued is True
     actual_products = db.exec(select(func.count()).select_from(Product)).one()
 
-    deleted_product = delete_product(session=db, db_product=product)
+    deleted_product = delete_product(session=db, product_id=product.id)
     assert deleted_product.is_discontinued is True
     assert deleted_product.id == product.id
     assert db.exec(select(func.count()).select_from(
         Product)).one() == actual_products
+
+
+def test_search_products_statement_uses_search_vector() -> None:
+    statement = search_products_statement(
+        query="walnut desk",
+        dialect_name="postgresql",
+        limit=10,
+        after=None
+    )
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+    assert "product.search_vector @@ websearch_to_tsquery(" in sql
+    assert "ORDER BY ts_rank(product.search_vector, " in sql
+
+
+@pytest.mark.parametrize(
+    ("filters", "sort", "index"),
+    [
+        ({}, "id", "ix_product_active_id"),
+        ({}, "price", "ix_product_active_price"),
+        ({}, "-price", "ix_product_active_price"),
+        ({}, "name", "ix_product_active_name"),
+        ({"min_price": 10, "max_price": 20}, "price", "ix_product_active_price"),
+        ({"brand": "brand"}, "id", "ix_product_active_brand_id"),
+        ({"brand": "brand"}, "name", "ix_product_active_brand_name"),
+        ({"brand": "brand"}, "-price", "ix_product_active_brand_price"),
+        (
+            {"brand": "brand", "min_price": 10, "max_price": 20},
+            "price",
+            "ix_product_active_brand_price"
+        ),
+    ]
+)
+def test_products_page_uses_index(
+    db: Session,
+    filters: dict,
+    sort: str,
+    index: str
+) -> None:
+    statement = products_page_statement(
+        limit=10,
+        filters=ProductFilters(**filters),
+        sort=sort
+    )
+    connection = db.connection()
+    sql = str(statement.compile(
+        connection, compile_kwargs={"literal_binds": True}))
+    plan = [
+        row[-1] for row in
+        connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").all()
+    ]
+    assert len(plan) == 1
+    assert f"USING INDEX {index}" in plan[0]
+
+
+def test_products_page_statement_selects_only_fields() -> None:
+    statement = products_page_statement(
+        limit=10,
+        sort="price",
+        fields=["name"]
+    )
+    assert [column.key for column in statement.selected_columns] == [
+        "name", "price", "id"]
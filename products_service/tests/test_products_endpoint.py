@@ -1,7 +1,14 @@
+from datetime import datetime, timedelta, timezone
 from fastapi.testclient import TestClient
+import csv
+import io
+import json
 from sqlmodel import Session, select
 
+from app.services import product_cache_service
 from app.services.product_service import create_product
+from app.services.product_analytics_service import query_count_buffer
+from app.models.outbox_models import OutboxEvent
 from app.models.product_models import Product, ProductCreate
 
 
@@ -102,7 +109,10 @@ def test_update_product_success(
     data = {"name": new_name, "price": new_price}
     response = client.patch(
         f"/api/v1/products/{product.id}",
-        headers=admin_account_token_headers,
+        headers={
+            **admin_account_token_headers,
+            "If-Match": f'"{product.version}"'
+        },
         json=data,
     )
     updated_product = response.json()
@@ -112,6 +122,97 @@ def test_update_product_success(
     assert updated_product["name"] == new_name
     assert updated_product["price"] == new_price
     assert updated_product["brand"] == brand
+    assert updated_product["version"] == product.version + 1
+    assert response.headers["etag"] == f'"{product.version + 1}"'
+
+
+def test_update_product_stale_version(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+    db: Session
+) -> None:
+    product = create_product(session=db, product_create=ProductCreate(
+        sku="stale_update_sku", name="name", price=1.0, brand="brand"))
+    stale_headers = {
+        **admin_account_token_headers,
+        "If-Match": f'"{product.version}"'
+    }
+    response = client.patch(
+        f"/api/v1/products/{product.id}",
+        headers=stale_headers,
+        json={"name": "first"},
+    )
+    assert response.status_code == 200
+
+    response = client.patch(
+        f"/api/v1/products/{product.id}",
+        headers=stale_headers,
+        json={"name": "second"},
+    )
+    assert response.status_code == 412
+    response = client.delete(
+        f"/api/v1/products/{product.id}",
+        headers=stale_headers,
+    )
+    assert response.status_code == 412
+
+    db.expire_all()
+    unchanged = db.get(Product, product.id)
+    assert unchanged.name == "first"
+    assert unchanged.is_discontinued is False
+
+
+def test_update_product_requires_if_match(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+    db: Session
+) -> None:
+    product = create_product(session=db, product_create=ProductCreate(
+        sku="if_match_update_sku", name="name", price=1.0, brand="brand"))
+    response = client.patch(
+        f"/api/v1/products/{product.id}",
+        headers=admin_account_token_headers,
+        json={"name": "new name"},
+    )
+    assert response.status_code == 428
+
+    response = client.get(f"/api/v1/products/{product.id}")
+    assert response.headers["etag"] == f'"{product.version}"'
+    response = client.patch(
+        f"/api/v1/products/{product.id}",
+        headers={
+            **admin_account_token_headers,
+            "If-Match": response.headers["etag"]
+        },
+        json={"name": "new name"},
+    )
+    assert response.status_code == 200
+
+
+def test_update_product_sku_conflict(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+    db: Session
+) -> None:
+    taken = create_product(session=db, product_create=ProductCreate(
+        sku="taken_update_sku", name="name", price=1.0, brand="brand"))
+    product = create_product(session=db, product_create=ProductCreate(
+        sku="conflict_update_sku", name="name", price=1.0, brand="brand"))
+
+    response = client.patch(
+        f"/api/v1/products/{product.id}",
+        headers={
+            **admin_account_token_headers,
+            "If-Match": f'"{product.version}"'
+        },
+        json={"sku": taken.sku, "name": "new name"},
+    )
+    assert response.status_code == 409
+
+    db.expire_all()
+    unchanged = db.get(Product, product.id)
+    assert unchanged.sku == "conflict_update_sku"
+    assert unchanged.name == "name"
 
 
 def test_update_product_not_found(
@@ -124,7 +225,7 @@ def test_update_product_not_found(
     data = {"name": new_name, "price": new_price}
     response = client.patch(
         f"/api/v1/products/{non_existent_product_id}",
-        headers=admin_account_token_headers,
+        headers={**admin_account_token_headers, "If-Match": "*"},
         json=data,
     )
     updated_product = response.json()
@@ -193,7 +294,10 @@ def test_delete_product_success(
 
     response = client.delete(
         f"/api/v1/products/{product.id}",
-        headers=admin_account_token_headers,
+        headers={
+            **admin_account_token_headers,
+            "If-Match": f'"{product.version}"'
+        },
     )
     response_json = response.json()
     assert response.status_code == 200
@@ -209,7 +313,7 @@ def test_delete_product_not_found(
     non_existent_product_id = "123e4567-e89b-12d3-a456-426614174000"
     response = client.delete(
         f"/api/v1/products/{non_existent_product_id}",
-        headers=admin_account_token_headers,
+        headers={**admin_account_token_headers, "If-Match": "*"},
     )
     response_json = response.json()
     assert response.status_code == 404
@@ -252,3 +356,578 @@ def test_delete_product_no_auth(
     response_json = response.json()
     assert response.status_code == 403
     assert response_json["detail"] == "Not authenticated"
+
+
+def test_list_products_paginates_with_cursor(
+    client: TestClient,
+    db: Session
+) -> None:
+    created_ids = set()
+    for index in range(3):
+        product_in = ProductCreate(
+            sku=f"page_sku_{index}",
+            name="product name",
+            price=10.5,
+            brand="brand name"
+        )
+        created_ids.add(str(create_product(
+            session=db, product_create=product_in).id))
+
+    seen_ids = []
+    cursor = None
+    while True:
+        params = {"limit": 2, "exact_count": True}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/v1/products", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page["data"]) <= 2
+        seen_ids.extend(product["id"] for product in page["data"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(seen_ids) == len(set(seen_ids))
+    assert seen_ids == sorted(seen_ids)
+    assert created_ids <= set(seen_ids)
+    assert page["count"] == len(seen_ids)
+
+
+def test_list_products_invalid_cursor(client: TestClient) -> None:
+    response = client.get("/api/v1/products", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_list_products_filtered_and_sorted(
+    client: TestClient,
+    db: Session
+) -> None:
+    for sku, name, price in [
+        ("filter_sku_1", "Chair", 30.0),
+        ("filter_sku_2", "Armchair", 80.0),
+        ("filter_sku_3", "Bench", 55.0),
+        ("filter_sku_4", "Stool", 20.0),
+    ]:
+        create_product(session=db, product_create=ProductCreate(
+            sku=sku, name=name, price=price, brand="filter_brand"))
+    create_product(session=db, product_create=ProductCreate(
+        sku="other_filter_sku", name="Sofa", price=50.0, brand="other_brand"))
+
+    def list_skus(**params) -> list[str]:
+        skus = []
+        params = {"brand": "filter_brand", "limit": 1, **params}
+        while True:
+            response = client.get("/api/v1/products", params=params)
+            assert response.status_code == 200
+            page = response.json()
+            skus.extend(product["sku"] for product in page["data"])
+            if page["next_cursor"] is None:
+                return skus
+            params["cursor"] = page["next_cursor"]
+
+    assert list_skus(sort="price") == [
+        "filter_sku_4", "filter_sku_1", "filter_sku_3", "filter_sku_2"]
+    assert list_skus(sort="-price") == [
+        "filter_sku_2", "filter_sku_3", "filter_sku_1", "filter_sku_4"]
+    assert list_skus(sort="name") == [
+        "filter_sku_2", "filter_sku_3", "filter_sku_1", "filter_sku_4"]
+    assert list_skus(sort="price", min_price=25, max_price=60) == [
+        "filter_sku_1", "filter_sku_3"]
+    assert list_skus(sku_prefix="filter_sku_") == [
+        product.sku
+        for product in sorted(
+            db.exec(select(Product).where(Product.brand == "filter_brand")),
+            key=lambda product: product.id
+        )
+    ]
+
+    params = {"brand": "filter_brand", "min_price": 25, "limit": 2}
+    response = client.get("/api/v1/products", params=params)
+    assert response.json()["count"] == 3
+
+    # Later pages repeat the first page's count instead of counting again.
+    create_product(session=db, product_create=ProductCreate(
+        sku="filter_sku_5", name="Desk", price=90.0, brand="filter_brand"))
+    params["cursor"] = response.json()["next_cursor"]
+    response = client.get("/api/v1/products", params=params)
+    assert response.json()["count"] == 3
+    params["exact_count"] = True
+    response = client.get("/api/v1/products", params=params)
+    assert response.json()["count"] == 4
+
+
+def test_list_products_cursor_of_other_sort(client: TestClient) -> None:
+    response = client.get("/api/v1/products", params={"limit": 1})
+    cursor = response.json()["next_cursor"]
+    response = client.get(
+        "/api/v1/products", params={"cursor": cursor, "sort": "price"})
+    assert response.status_code == 400
+
+
+def test_list_products_limit_is_capped(client: TestClient) -> None:
+    response = client.get("/api/v1/products", params={"limit": 100000})
+    assert response.status_code == 422
+
+
+def test_export_products_ndjson_filtered_by_brand(
+    client: TestClient,
+    db: Session
+) -> None:
+    brand = "export brand"
+    skus = {"export_sku_1", "export_sku_2"}
+    for sku in skus:
+        product_in = ProductCreate(
+            sku=sku, name="product name", price=10.5, brand=brand)
+        create_product(session=db, product_create=product_in)
+
+    response = client.get(
+        "/api/v1/products/export",
+        params={"format": "ndjson", "brand": brand}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert {row["sku"] for row in rows} == skus
+    assert all(row["brand"] == brand for row in rows)
+
+
+def test_export_products_csv(
+    client: TestClient,
+    db: Session
+) -> None:
+    brand = "csv export brand"
+    product_in = ProductCreate(
+        sku="csv_export_sku", name="product name", price=10.5, brand=brand)
+    create_product(session=db, product_create=product_in)
+
+    response = client.get(
+        "/api/v1/products/export",
+        params={"format": "csv", "brand": brand}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 1
+    assert rows[0]["sku"] == "csv_export_sku"
+
+
+def test_export_products_updated_since(
+    client: TestClient,
+    db: Session
+) -> None:
+    brand = "updated since brand"
+    product_in = ProductCreate(
+        sku="updated_since_sku", name="product name", price=10.5, brand=brand)
+    create_product(session=db, product_create=product_in)
+
+    future = datetime.now(timezone.utc) + timedelta(days=1)
+    response = client.get(
+        "/api/v1/products/export",
+        params={"brand": brand, "updated_since": future.isoformat()}
+    )
+    assert response.status_code == 200
+    assert response.text == ""
+
+
+def test_get_product_not_modified_counts_query(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+    db: Session
+) -> None:
+    product_in = ProductCreate(
+        sku="etag_sku", name="product name", price=10.5, brand="brand name")
+    product = create_product(session=db, product_create=product_in)
+
+    response = client.get(f"/api/v1/products/{product.id}")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert "stale-while-revalidate" in response.headers["cache-control"]
+
+    response = client.get(
+        f"/api/v1/products/{product.id}",
+        headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+
+    query_count_buffer.flush()
+    analytics = client.get(
+        f"/api/v1/products/{product.id}/analytics",
+        headers=admin_account_token_headers
+    ).json()
+    assert analytics["query_count"] == 2
+
+
+def test_get_product_sparse_fields(
+    client: TestClient,
+    db: Session
+) -> None:
+    product_in = ProductCreate(
+        sku="fields_sku", name="product name", price=10.5, brand="brand name",
+        description="long description")
+    product = create_product(session=db, product_create=product_in)
+    product_cache_service.invalidate_product(product.id)
+
+    # Served by a column projection on a cache miss.
+    response = client.get(
+        f"/api/v1/products/{product.id}", params={"fields": "price,id,name"})
+    assert response.status_code == 200
+    assert response.json() == {
+        "name": "product name", "price": 10.5, "id": str(product.id)}
+    projected = response.content
+
+    # Cut from the cached full payload once it is cached.
+    client.get(f"/api/v1/products/{product.id}")
+    response = client.get(
+        f"/api/v1/products/{product.id}", params={"fields": "id,name,price"})
+    assert response.content == projected
+
+    response = client.get(
+        f"/api/v1/products/{product.id}", params={"fields": "id,colour"})
+    assert response.status_code == 400
+    response = client.get(
+        f"/api/v1/products/{product.id}", params={"fields": ","})
+    assert response.status_code == 400
+
+
+def test_list_products_sparse_fields(
+    client: TestClient,
+    db: Session
+) -> None:
+    for sku, price in [("list_fields_sku_1", 5.0), ("list_fields_sku_2", 6.0)]:
+        create_product(session=db, product_create=ProductCreate(
+            sku=sku, name="product name", price=price,
+            brand="list_fields_brand"))
+
+    params = {
+        "brand": "list_fields_brand",
+        "sort": "price",
+        "fields": "sku",
+        "limit": 1
+    }
+    response = client.get("/api/v1/products", params=params)
+    assert response.status_code == 200
+    page = response.json()
+    assert page["data"] == [{"sku": "list_fields_sku_1"}]
+
+    params["cursor"] = page["next_cursor"]
+    response = client.get("/api/v1/products", params=params)
+    assert response.json()["data"] == [{"sku": "list_fields_sku_2"}]
+
+
+def test_list_products_etag_changes_with_catalog(
+    client: TestClient,
+    db: Session
+) -> None:
+    response = client.get("/api/v1/products")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+
+    response = client.get("/api/v1/products", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    product_in = ProductCreate(
+        sku="etag_list_sku", name="product name", price=10.5, brand="brand")
+    create_product(session=db, product_create=product_in)
+
+    response = client.get("/api/v1/products", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_upsert_products_batch(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+    db: Session
+) -> None:
+    product_in = ProductCreate(
+        sku="batch_existing_sku", name="old name", price=10.5, brand="brand")
+    existing = create_product(session=db, product_create=product_in)
+    items = [
+        {"sku": "batch_existing_sku", "name": "new name", "price": 11.0,
+         "brand": "brand"},
+        {"sku": "batch_new_sku", "name": "first", "price": 1.0,
+         "brand": "brand"},
+        {"sku": "batch_new_sku", "name": "second", "price": 2.0,
+         "brand": "brand"},
+    ]
+    response = client.post(
+        "/api/v1/products/batch",
+        headers=admin_account_token_headers,
+        json={"items": items},
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["created"] == 1
+    assert body["updated"] == 1
+    statuses = [result["status"] for result in body["results"]]
+    assert statuses == ["updated", "duplicate", "created"]
+    assert body["results"][0]["id"] == str(existing.id)
+
+    db.expire_all()
+    updated = db.exec(
+        select(Product).where(Product.sku == "batch_existing_sku")).one()
+    assert updated.name == "new name"
+    created = db.exec(
+        select(Product).where(Product.sku == "batch_new_sku")).one()
+    assert created.name == "second"
+    assert created.price == 2.0
+
+
+def test_upsert_products_batch_keeps_fields_not_sent(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+    db: Session
+) -> None:
+    existing = create_product(session=db, product_create=ProductCreate(
+        sku="batch_partial_sku",
+        name="name",
+        description="kept",
+        price=10.5,
+        brand="brand",
+        is_discontinued=True
+    ))
+    items = [
+        {"sku": "batch_partial_sku", "price": 12.0},
+        {"sku": "batch_partial_missing_sku", "price": 1.0},
+    ]
+    response = client.post(
+        "/api/v1/products/batch",
+        headers=admin_account_token_headers,
+        json={"items": items},
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["updated"] == 1
+    assert body["created"] == 0
+    assert [result["status"] for result in body["results"]] == [
+        "updated", "not_found"]
+
+    db.expire_all()
+    updated = db.get(Product, existing.id)
+    assert updated.price == 12.0
+    assert updated.description == "kept"
+    assert updated.is_discontinued is True
+    assert updated.version == existing.version + 1
+
+
+def test_upsert_products_batch_validates_all_items(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+) -> None:
+    items = [
+        {"sku": "batch_valid_sku", "name": "name", "price": 1.0,
+         "brand": "brand"},
+        {"sku": "batch_invalid_sku", "name": "name", "price": -1.0,
+         "brand": "brand"},
+    ]
+    response = client.post(
+        "/api/v1/products/batch",
+        headers=admin_account_token_headers,
+        json={"items": items},
+    )
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"][:3] == ["body", "items", 1]
+
+
+def test_upsert_products_batch_unauthorized(
+    client: TestClient,
+    normal_account_token_headers: dict[str, str],
+) -> None:
+    items = [{"sku": "batch_unauth_sku", "name": "name", "price": 1.0,
+              "brand": "brand"}]
+    response = client.post(
+        "/api/v1/products/batch",
+        headers=normal_account_token_headers,
+        json={"items": items},
+    )
+    assert response.status_code == 403
+
+
+def test_bulk_update_products_price(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+    db: Session
+) -> None:
+    products = [
+        create_product(session=db, product_create=ProductCreate(
+            sku=sku, name="name", price=price, brand=brand))
+        for sku, price, brand in [
+            ("bulk_sku_1", 10.0, "bulk_brand"),
+            ("bulk_sku_2", 20.5, "bulk_brand"),
+            ("bulk_sku_3", 10.0, "bulk_other_brand"),
+        ]
+    ]
+    response = client.post(
+        "/api/v1/products:bulk-update",
+        headers=admin_account_token_headers,
+        json={"filters": {"brand": "bulk_brand"}, "price_percent": 5},
+    )
+    assert response.status_code == 200
+    assert response.json() == {"updated": 2}
+
+    db.expire_all()
+    prices = [db.get(Product, product.id).price for product in products]
+    assert prices == [10.5, 21.53, 10.0]
+    assert db.get(Product, products[0].id).version == products[0].version + 1
+
+    event = db.exec(
+        select(OutboxEvent).order_by(OutboxEvent.created_at.desc())).first()
+    payload = json.loads(event.payload)
+    assert payload["action"] == "bulk update"
+    assert payload["changes"] == {
+        f"{products[0].id}.price": {"old": 10.0, "new": 10.5},
+        f"{products[1].id}.price": {"old": 20.5, "new": 21.53},
+    }
+
+
+def test_bulk_update_products_discontinue_by_ids(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+    db: Session
+) -> None:
+    product = create_product(session=db, product_create=ProductCreate(
+        sku="bulk_discontinue_sku", name="name", price=1.0, brand="brand"))
+    body = {"ids": [str(product.id)], "is_discontinued": True}
+    response = client.post(
+        "/api/v1/products:bulk-update",
+        headers=admin_account_token_headers,
+        json=body,
+    )
+    assert response.json() == {"updated": 1}
+
+    # Already discontinued, nothing left to change.
+    response = client.post(
+        "/api/v1/products:bulk-update",
+        headers=admin_account_token_headers,
+        json=body,
+    )
+    assert response.json() == {"updated": 0}
+    db.expire_all()
+    assert db.get(Product, product.id).is_discontinued is True
+
+
+def test_bulk_update_products_invalid(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+    normal_account_token_headers: dict[str, str],
+) -> None:
+    for body in [
+        {"price_percent": 5},
+        {"filters": {"brand": "brand"}},
+        {"filters": {"brand": "brand"}, "price_percent": 5,
+         "price_amount": 1},
+    ]:
+        response = client.post(
+            "/api/v1/products:bulk-update",
+            headers=admin_account_token_headers,
+            json=body,
+        )
+        assert response.status_code == 400
+    response = client.post(
+        "/api/v1/products:bulk-update",
+        headers=normal_account_token_headers,
+        json={"filters": {"brand": "brand"}, "price_percent": 5},
+    )
+    assert response.status_code == 403
+
+
+def test_search_products(
+    client: TestClient,
+    db: Session
+) -> None:
+    for sku, name, brand, description in [
+        ("search_sku_1", "Walnut desk", "Woodworks", None),
+        ("search_sku_2", "Standing desk", "Officeline", "walnut top"),
+        ("search_sku_3", "Walnut shelf", "Woodworks", None),
+        ("search_sku_4", "Oak desk", "Woodworks", None),
+    ]:
+        create_product(session=db, product_create=ProductCreate(
+            sku=sku, name=name, price=100, brand=brand,
+            description=description))
+    discontinued = create_product(session=db, product_create=ProductCreate(
+        sku="search_sku_5", name="Walnut desk", price=100, brand="Woodworks",
+        is_discontinued=True))
+
+    response = client.get("/api/v1/products/search?q=walnut desk&limit=1")
+    assert response.status_code == 200
+    first_page = response.json()
+    assert len(first_page["data"]) == 1
+    assert first_page["next_cursor"]
+
+    response = client.get(
+        "/api/v1/products/search?q=walnut desk&limit=1"
+        f"&cursor={first_page['next_cursor']}")
+    assert response.status_code == 200
+    second_page = response.json()
+    assert second_page["next_cursor"] is None
+
+    skus = {
+        product["sku"]
+        for product in first_page["data"] + second_page["data"]
+    }
+    assert skus == {"search_sku_1", "search_sku_2"}
+    assert discontinued.sku not in skus
+
+    response = client.get("/api/v1/products/search?q=woodworks")
+    assert {product["sku"] for product in response.json()["data"]} == {
+        "search_sku_1", "search_sku_3", "search_sku_4"}
+
+
+def test_search_products_invalid_query(client: TestClient) -> None:
+    assert client.get("/api/v1/products/search").status_code == 422
+    assert client.get("/api/v1/products/search?q=%20").status_code == 400
+    response = client.get("/api/v1/products/search?q=desk&cursor=abc")
+    assert response.status_code == 400
+
+
+def test_get_products_batch(
+    client: TestClient,
+    admin_account_token_headers: dict[str, str],
+    db: Session
+) -> None:
+    first, second = (
+        create_product(session=db, product_create=ProductCreate(
+            sku=sku, name="product name", price=10.5, brand="brand name"))
+        for sku in ("multi_get_sku_1", "multi_get_sku_2")
+    )
+    missing_id = "00000000-0000-0000-0000-000000000000"
+    # Warm the cache for one of them, the other is loaded from the database.
+    client.get(f"/api/v1/products/{first.id}")
+
+    response = client.get(
+        "/api/v1/products:batch",
+        params={"ids": f"{second.id},{missing_id},{first.id},{second.id}"}
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert [product["id"] for product in body["data"]] == [
+        str(second.id), str(first.id)]
+    assert body["data"][0]["sku"] == "multi_get_sku_2"
+    assert body["missing"] == [missing_id]
+
+    response = client.get(
+        "/api/v1/products:batch",
+        params={"ids": [str(first.id), str(second.id)], "fields": "sku"}
+    )
+    assert response.json()["data"] == [
+        {"sku": "multi_get_sku_1"}, {"sku": "multi_get_sku_2"}]
+
+    query_count_buffer.flush()
+    analytics = client.get(
+        f"/api/v1/products/{second.id}/analytics",
+        headers=admin_account_token_headers
+    ).json()
+    assert analytics["query_count"] == 2
+
+
+def test_get_products_batch_invalid_ids(client: TestClient) -> None:
+    response = client.get("/api/v1/products:batch", params={"ids": "abc"})
+    assert response.status_code == 400
+    response = client.get("/api/v1/products:batch", params={"ids": ","})
+    assert response.status_code == 400
+    response = client.get("/api/v1/products:batch")
+    assert response.status_code == 422